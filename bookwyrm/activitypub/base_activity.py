@@ -17,6 +17,7 @@ from bookwyrm.models import base_model
 from bookwyrm.signatures import make_signature
 from bookwyrm.settings import DOMAIN, INSTANCE_ACTOR_USERNAME
 from bookwyrm.tasks import app, MISC
+from bookwyrm.utils.http_client import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -432,7 +433,7 @@ def get_activitypub_data(url):
         # this shouldn't happen. it would be bad if it happened.
         raise ValueError("No private key found for sender")
     try:
-        resp = requests.get(
+        resp = http_client.get_conditional(
             url,
             headers={
                 # pylint: disable=line-too-long
@@ -1,12 +1,13 @@
 """ access the activity streams stored in redis """
+from collections.abc import Sequence
 from datetime import timedelta
 from django.dispatch import receiver
 from django.db import transaction
-from django.db.models import signals, Q
+from django.db.models import signals, Exists, OuterRef, Q, Value
 from django.utils import timezone
 from opentelemetry import trace
 
-from bookwyrm import models
+from bookwyrm import models, settings
 from bookwyrm.redis_store import RedisStore, r
 from bookwyrm.tasks import app, STREAMS, IMPORT_TRIGGERED
 from bookwyrm.telemetry import open_telemetry
@@ -15,9 +16,12 @@ from bookwyrm.telemetry import open_telemetry
 tracer = open_telemetry.tracer()
 
 
+# pylint: disable=too-many-public-methods
 class ActivityStream(RedisStore):
     """a category of activity stream (like home, local, books)"""
 
+    reverse_index_ttl = settings.STREAM_INDEX_TTL
+
     def stream_id(self, user_id):
         """the redis key for this user's instance of this stream"""
         return f"{user_id}-{self.key}"
@@ -32,29 +36,43 @@ class ActivityStream(RedisStore):
         stream_id = self.stream_id(user_id)
         return f"{stream_id}-unread-by-type"
 
+    def reverse_index_id(self, obj_id):
+        """the redis key for the set of this stream's stores holding a status"""
+        return f"{obj_id}-{self.key}-stores"
+
     def get_rank(self, obj):
         """statuses are sorted by date published"""
         return obj.published_date.timestamp()
 
-    def add_status(self, status, increment_unread=False):
-        """add a status to users' feeds"""
-        audience = self.get_audience(status)
-        # the pipeline contains all the add-to-stream activities
-        pipeline = self.add_object_to_stores(
-            status, self.get_stores_for_users(audience), execute=False
-        )
+    def add_status(self, status, increment_unread=False, audience=None, created=False):
+        """add a status to users' feeds; a new status's reverse index is complete,
+        so it can be used to remove the status again"""
+        if audience is None:
+            audience = self.get_audience(status)
+        status_type = get_status_type(status)
+
+        # large audiences are sent to redis a chunk at a time
+        for start in range(0, len(audience), self.chunk_size):
+            user_ids = audience[start : start + self.chunk_size]
+            stores = self.get_stores_for_users(user_ids)
+            # the index is only complete once the last chunk is in
+            last_chunk = start + self.chunk_size >= len(audience)
+            # the pipeline contains all the add-to-stream activities
+            pipeline = self.add_object_to_stores(
+                status, stores, execute=False, fan_out=created and last_chunk
+            )
 
-        if increment_unread:
-            for user_id in audience:
-                # add to the unread status count
-                pipeline.incr(self.unread_id(user_id))
-                # add to the unread status count for status type
-                pipeline.hincrby(
-                    self.unread_by_status_type_id(user_id), get_status_type(status), 1
-                )
+            if increment_unread:
+                for user_id in user_ids:
+                    # add to the unread status count
+                    pipeline.incr(self.unread_id(user_id))
+                    # add to the unread status count for status type
+                    pipeline.hincrby(
+                        self.unread_by_status_type_id(user_id), status_type, 1
+                    )
 
-        # and go!
-        pipeline.execute()
+            # and go!
+            self.trim_stores(stores, pipeline.execute())
 
     def add_user_statuses(self, viewer, user):
         """add a user's statuses to another user's feed"""
@@ -70,25 +88,86 @@ class ActivityStream(RedisStore):
 
     def get_activity_stream(self, user):
         """load the statuses to be displayed"""
-        # clear unreads for this feed
-        r.set(self.unread_id(user.id), 0)
-        r.delete(self.unread_by_status_type_id(user.id))
+        self.clear_unread(user)
 
         statuses = self.get_store(self.stream_id(user.id))
-        return (
-            models.Status.objects.select_subclasses()
-            .filter(id__in=statuses)
-            .select_related(
-                "user",
-                "reply_parent",
-                "comment__book",
-                "review__book",
-                "quotation__book",
+        return get_statuses_by_id(statuses)
+
+    # pylint: disable=too-many-arguments
+    def get_activity_stream_page(
+        self,
+        user,
+        before=None,
+        after=None,
+        page_length=settings.PAGE_LENGTH,
+        allowed_types=None,
+    ):
+        """load a page of statuses older than `before` or newer than `after`,
+        using the store's scores (the published date) and the status ids as the
+        cursors"""
+        self.clear_unread(user)
+
+        store = self.stream_id(user.id)
+        # read one extra item so we know if there's another page
+        if allowed_types is not None and filters_status_types(allowed_types):
+            window = self.get_filtered_store(
+                store, page_length + 1, allowed_types, before=before, after=after
+            )
+        else:
+            window = self.get_store_by_score(
+                store, page_length + 1, before=before, after=after
             )
-            .prefetch_related("mention_books", "mention_users")
-            .order_by("-published_date")
+        has_more = len(window) > page_length
+        window = window[:page_length]
+        # windows are read outwards from the cursor, but feeds go newest first
+        if after is not None:
+            window.reverse()
+
+        statuses = list(get_statuses_by_id([status_id for status_id, _ in window]))
+        # an empty page has no cursors: going newer than `before` would skip the
+        # status at it
+        newest = (window[0][1], window[0][0]) if window else None
+        oldest = (window[-1][1], window[-1][0]) if window else None
+        return StreamPage(
+            statuses,
+            has_next=has_more if after is None else bool(window),
+            has_previous=before is not None if after is None else has_more,
+            next_cursor=format_stream_cursor(oldest),
+            previous_cursor=format_stream_cursor(newest),
         )
 
+    def get_filtered_store(self, store, count, allowed_types, before=None, after=None):
+        """the `count` items nearest the cursor that match the allowed status types"""
+        values = []
+        # read a few pages' worth at a time so most feeds take a single query
+        chunk_size = max(count, settings.PAGE_LENGTH) * 2
+        while len(values) < count:
+            window = self.get_store_by_score(
+                store, chunk_size, before=before, after=after
+            )
+            if not window:
+                break
+            visible = set(
+                filter_stream_by_status_type(
+                    models.Status.objects.filter(id__in=[i for i, _ in window]),
+                    allowed_types,
+                ).values_list("id", flat=True)
+            )
+            values += [(i, score) for i, score in window if i in visible]
+
+            # move the cursor past this window
+            last_id, last_score = window[-1]
+            if after is not None:
+                after = (last_score, last_id)
+            else:
+                before = (last_score, last_id)
+        return values[:count]
+
+    def clear_unread(self, user):
+        """the user has seen this feed, so reset its unread counts"""
+        r.set(self.unread_id(user.id), 0)
+        r.delete(self.unread_by_status_type_id(user.id))
+
     def get_unread_count(self, user):
         """get the unread status count for this user's feed"""
         return int(r.get(self.unread_id(user.id)) or 0)
@@ -158,6 +237,29 @@ class ActivityStream(RedisStore):
         ).values_list("id", flat=True)
         return list(set(audience) | set(status_author))
 
+    def get_audience_for_statuses(self, statuses):
+        """users who might have any of these statuses in this stream, used for
+        removal; this can be a superset, since removing a missing status is a no-op"""
+        user_ids = set()
+        for status in statuses:
+            user_ids.update(self.get_audience(status))
+        return user_ids
+
+    def remove_statuses(self, status_ids, statuses):
+        """take statuses out of every feed that might have them, in one sweep"""
+        holders = self.get_stores_for_objects(status_ids)
+        if holders:
+            self.remove_objects_from_holders(holders)
+
+        # statuses that aren't in the reverse index need an audience query
+        unindexed = [status for status in statuses if status.id not in holders]
+        if unindexed:
+            audience = self.get_audience_for_statuses(unindexed)
+            self.bulk_remove_objects_from_stores(
+                [status.id for status in unindexed],
+                self.get_stores_for_users(audience),
+            )
+
     def get_stores_for_users(self, user_ids):
         """convert a list of user ids into redis store ids"""
         return [self.stream_id(user_id) for user_id in user_ids]
@@ -191,6 +293,20 @@ class HomeStream(ActivityStream):
         ).values_list("id", flat=True)
         return list(set(audience) | set(status_author))
 
+    def get_audience_for_statuses(self, statuses):
+        # followers, mentioned users and the authors themselves
+        authors = {status.user_id for status in statuses}
+        return set(
+            models.User.objects.filter(is_active=True, local=True)
+            .filter(
+                Q(id__in=authors)
+                | Q(following__id__in=authors)
+                | Q(mention_user__id__in=[status.id for status in statuses])
+            )
+            .values_list("id", flat=True)
+            .distinct()
+        )
+
     def get_statuses_for_user(self, user):
         return models.Status.privacy_filter(
             user,
@@ -208,6 +324,9 @@ class LocalStream(ActivityStream):
     """users you follow"""
 
     key = "local"
+    # every local user has every status, so the audience is one cheap query and
+    # an index would hold every user's store for every status
+    reverse_index_ttl = None
 
     def get_audience(self, status):
         # this stream wants no part in non-public statuses
@@ -215,6 +334,18 @@ class LocalStream(ActivityStream):
             return []
         return super().get_audience(status)
 
+    def get_audience_for_statuses(self, statuses):
+        # public statuses by local users are in everyone's local stream
+        if not any(
+            status.privacy == "public" and status.user.local for status in statuses
+        ):
+            return set()
+        return set(
+            models.User.objects.filter(is_active=True, local=True).values_list(
+                "id", flat=True
+            )
+        )
+
     def get_statuses_for_user(self, user):
         # all public statuses by a local user
         return models.Status.privacy_filter(
@@ -249,6 +380,35 @@ class BooksStream(ActivityStream):
 
         return super().get_audience(status)
 
+    def get_audience_for_statuses(self, statuses):
+        # anyone with one of the books on their shelves, and the authors
+        status_ids = [status.id for status in statuses if status.privacy == "public"]
+        if not status_ids:
+            return set()
+        works = set()
+        authors = set()
+        for author, *work_ids in models.Status.objects.filter(
+            id__in=status_ids
+        ).values_list(
+            "user",
+            "comment__book__parent_work",
+            "quotation__book__parent_work",
+            "review__book__parent_work",
+            "mention_books__parent_work",
+        ):
+            work_ids = [work_id for work_id in work_ids if work_id]
+            if work_ids:
+                works.update(work_ids)
+                authors.add(author)
+        if not works:
+            return set()
+        return set(
+            models.User.objects.filter(is_active=True, local=True)
+            .filter(Q(id__in=authors) | Q(shelfbook__book__parent_work__in=works))
+            .values_list("id", flat=True)
+            .distinct()
+        )
+
     def get_statuses_for_user(self, user):
         """any public status that mentions the user's books"""
         books = user.shelfbook_set.values_list(
@@ -313,6 +473,93 @@ streams = {
 }
 
 
+def follows(user_id):
+    """subquery for whether the user in the outer query follows this user"""
+    return Exists(
+        models.UserFollows.objects.filter(
+            user_subject=OuterRef("pk"), user_object_id=user_id
+        )
+    )
+
+
+def get_status_work(status):
+    """the work a status is about, if any"""
+    if hasattr(status, "book"):
+        return status.book.parent_work
+    book = status.mention_books.first()
+    return book.parent_work if book else None
+
+
+@tracer.start_as_current_span("get_stream_audiences")
+def get_stream_audiences(status):
+    """the users who should see a status in each stream, found in one query
+    rather than one (or more) per stream"""
+    trace.get_current_span().set_attribute("status_type", status.status_type)
+    trace.get_current_span().set_attribute("status_privacy", status.privacy)
+
+    # only public statuses appear in the local and books streams
+    is_public = status.privacy == "public"
+    in_local = is_public and status.user.local
+    work = get_status_work(status) if is_public else None
+
+    # everybody who could plausibly see this status, as in _get_audience
+    audience = None
+    # direct messages don't appear in feeds, direct comments/reviews/etc do
+    if status.privacy == "direct" and status.status_type == "Note":
+        audience = Q(pk__in=[])
+    # only visible to the poster and mentioned users
+    elif status.privacy == "direct":
+        audience = Q(
+            Exists(
+                models.Status.mention_users.through.objects.filter(
+                    status_id=status.id, user_id=OuterRef("pk")
+                )
+            )
+        )
+    # don't show replies to statuses the user can't see
+    elif status.reply_parent and status.reply_parent.privacy == "followers":
+        audience = Q(id=status.reply_parent.user_id) | (
+            Q(follows(status.user_id)) & Q(follows(status.reply_parent.user_id))
+        )
+    # only visible to the poster's followers and tagged users
+    elif status.privacy == "followers":
+        audience = Q(follows(status.user_id))
+
+    users = models.User.objects.filter(is_active=True, local=True)
+    if audience is not None:
+        # the author always gets their own statuses
+        users = users.filter(audience | Q(id=status.user_id))
+    users = (
+        users.exclude(
+            Q(id__in=status.user.blocks.all()) | Q(blocks=status.user)
+        )  # not blocked
+        .annotate(
+            follows_author=follows(status.user_id),
+            shelved_work=(
+                Exists(
+                    models.ShelfBook.objects.filter(
+                        user=OuterRef("pk"), book__parent_work=work
+                    )
+                )
+                if work
+                else Value(False)
+            ),
+        )
+        .values_list("id", "follows_author", "shelved_work")
+    )
+
+    audiences = {key: [] for key in streams}
+    for user_id, follows_author, shelved_work in users:
+        is_author = user_id == status.user_id
+        if follows_author or is_author:
+            audiences["home"].append(user_id)
+        if in_local:
+            audiences["local"].append(user_id)
+        if work and (shelved_work or is_author):
+            audiences["books"].append(user_id)
+    return audiences
+
+
 @receiver(signals.post_save)
 # pylint: disable=unused-argument
 def add_status_on_create(sender, instance, created, *args, **kwargs):
@@ -356,7 +603,7 @@ def add_status_on_create_command(sender, instance, created):
 
     add_status_task.apply_async(
         args=(instance.id,),
-        kwargs={"increment_unread": created},
+        kwargs={"increment_unread": created, "created": created},
         queue=priority,
     )
 
@@ -526,25 +773,32 @@ def remove_status_task(status_ids):
     # this can take an id or a list of ids
     if not isinstance(status_ids, list):
         status_ids = [status_ids]
-    statuses = models.Status.objects.filter(id__in=status_ids)
+    statuses = list(
+        models.Status.objects.select_subclasses()
+        .filter(id__in=status_ids)
+        .select_related("user")
+    )
 
     for stream in streams.values():
-        for status in statuses:
-            stream.remove_object_from_stores(
-                status, stream.get_stores_for_users(stream.get_audience(status))
-            )
+        stream.remove_statuses(status_ids, statuses)
 
 
 @app.task(queue=STREAMS)
-def add_status_task(status_id, increment_unread=False):
+def add_status_task(status_id, increment_unread=False, created=False):
     """add a status to any stream it should be in"""
     status = models.Status.objects.select_subclasses().get(id=status_id)
     # we don't want to tick the unread count for csv import statuses, idk how better
     # to check than just to see if the states is more than a few days old
     if status.created_date < timezone.now() - timedelta(days=2):
         increment_unread = False
-    for stream in streams.values():
-        stream.add_status(status, increment_unread=increment_unread)
+    audiences = get_stream_audiences(status)
+    for key, stream in streams.items():
+        stream.add_status(
+            status,
+            increment_unread=increment_unread,
+            audience=audiences[key],
+            created=created,
+        )
 
 
 @app.task(queue=STREAMS)
@@ -580,13 +834,115 @@ def handle_boost_task(boost_id):
     )
 
     for stream in streams.values():
-        # people who should see the boost (not people who see the original status)
-        audience = stream.get_stores_for_users(stream.get_audience(instance))
+        # people who should see the boost (not people who see the original status),
+        # from the reverse index if the boost's fan out is complete
+        audience = stream.get_stores_for_objects([instance.id]).get(instance.id)
+        if audience is None:
+            audience = stream.get_stores_for_users(stream.get_audience(instance))
         stream.remove_object_from_stores(boosted, audience)
         for status in old_versions:
             stream.remove_object_from_stores(status, audience)
 
 
+def format_stream_cursor(cursor):
+    """a position in a stream, the (score, status id) pair, as it goes in urls"""
+    if cursor is None:
+        return None
+    score, status_id = cursor
+    return f"{score!r}-{status_id}"
+
+
+class StreamPage(Sequence):
+    """a page of a stream, with the parts of the Page api the templates use"""
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        object_list,
+        has_next=False,
+        has_previous=False,
+        next_cursor=None,
+        previous_cursor=None,
+    ):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        # cursors are formatted here so templates don't localize them
+        self.next_cursor = None if next_cursor is None else str(next_cursor)
+        self.previous_cursor = None if previous_cursor is None else str(previous_cursor)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return f"<Stream page before {self.next_cursor}>"
+
+    def has_next(self):
+        """is there an older page"""
+        return self._has_next and self.next_cursor is not None
+
+    def has_previous(self):
+        """is there a newer page"""
+        return self._has_previous and self.previous_cursor is not None
+
+    def has_other_pages(self):
+        """is this the only page"""
+        return self.has_previous() or self.has_next()
+
+
+def get_statuses_by_id(status_ids):
+    """the statuses for a list of ids from a store, ready for display"""
+    return (
+        models.Status.objects.select_subclasses()
+        .filter(id__in=status_ids)
+        .select_related(
+            "user",
+            "reply_parent",
+            "comment__book",
+            "review__book",
+            "quotation__book",
+        )
+        .prefetch_related("mention_books", "mention_users")
+        .order_by("-published_date")
+    )
+
+
+def filters_status_types(allowed_types):
+    """does this set of allowed types exclude anything from a feed"""
+    return not {"review", "comment", "quotation", "everything"}.issubset(
+        allowed_types or []
+    )
+
+
+def filter_stream_by_status_type(activities, allowed_types=None):
+    """filter out activities based on types"""
+    if not allowed_types:
+        allowed_types = []
+
+    if "review" not in allowed_types:
+        activities = activities.filter(
+            Q(review__isnull=True), Q(boost__boosted_status__review__isnull=True)
+        )
+    if "comment" not in allowed_types:
+        activities = activities.filter(
+            Q(comment__isnull=True), Q(boost__boosted_status__comment__isnull=True)
+        )
+    if "quotation" not in allowed_types:
+        activities = activities.filter(
+            Q(quotation__isnull=True), Q(boost__boosted_status__quotation__isnull=True)
+        )
+    if "everything" not in allowed_types:
+        activities = activities.filter(
+            Q(generatednote__isnull=True),
+            Q(boost__boosted_status__generatednote__isnull=True),
+        )
+
+    return activities
+
+
 def get_status_type(status):
     """return status type even for boosted statuses"""
     status_type = status.status_type.lower()
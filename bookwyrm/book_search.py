@@ -6,7 +6,8 @@ import operator
 from typing import Optional, Union, Any, Literal, overload
 
 from django.contrib.postgres.search import SearchRank, SearchQuery
-from django.db.models import F, Q
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
 from django.db.models.query import QuerySet
 
 from bookwyrm import models
@@ -130,39 +131,72 @@ def search_identifiers(
     return results
 
 
+def search_identifiers_many(queries) -> dict[str, models.Edition]:
+    """look up a batch of identifiers in one query, finding what
+    search_identifiers would for each of them"""
+    normalized = {}
+    for query in queries:
+        value = query.strip()
+        if connectors.maybe_isbn(value):
+            value = value.upper().rjust(10, "0")
+        normalized.setdefault(value, []).append(query)
+    if not normalized:
+        return {}
+
+    # pylint: disable=W0212
+    fields = [
+        f.name
+        for f in models.Edition._meta.get_fields()
+        if hasattr(f, "deduplication_field") and f.deduplication_field
+    ]
+    books = models.Edition.objects.filter(
+        reduce(operator.or_, (Q(**{f"{f}__in": list(normalized)}) for f in fields))
+    ).order_by("id")
+
+    found = {}
+    for book in books:
+        for field in fields:
+            value = getattr(book, field)
+            if value in normalized and value not in found:
+                found[value] = book
+    return {
+        query: found[value]
+        for value, matches in normalized.items()
+        if value in found
+        for query in matches
+    }
+
+
 def search_title_author(
     query,
     min_confidence,
     *filters,
     return_first=False,
     books=None,
-) -> QuerySet[models.Edition]:
-    """searches for title and author"""
+) -> Union[Optional[models.Edition], QuerySet[models.Edition]]:
+    """searches for title and author, with the best matching edition of
+    each work"""
     books = books or models.Edition.objects
     query = SearchQuery(query, config="simple") | SearchQuery(query, config="english")
     results = (
         books.filter(*filters, search_vector=query)
         .annotate(rank=SearchRank(F("search_vector"), query, normalization=32))
         .filter(rank__gt=min_confidence)
-        .order_by("-rank")
-    )
-
-    # when there are multiple editions of the same work, pick the closest
-    editions_of_work = results.values_list("parent_work__id", flat=True).distinct()
-
-    # filter out multiple editions of the same work
-    list_results = []
-    for work_id in editions_of_work[:30]:
-        result = (
-            results.filter(parent_work=work_id)
-            .order_by("-rank", "-edition_rank")
-            .first()
+        # when there are multiple editions of the same work, pick the closest
+        .annotate(
+            work_position=Window(
+                RowNumber(),
+                partition_by=F("parent_work_id"),
+                order_by=[F("rank").desc(), F("edition_rank").desc()],
+            )
         )
+        .filter(work_position=1)
+        .order_by("-rank", "-edition_rank", "id")
+    )
 
-        if return_first:
-            return result
-        list_results.append(result)
-    return list_results
+    if return_first:
+        return results.first()
+    return results
 
 
 @dataclass
@@ -184,7 +218,7 @@ class SearchResult:
             self.key, self.title, self.author, self.confidence
         )
 
-    def json(self):
+    def json(self) -> dict[str, Any]:
         """serialize a connector for json response"""
         serialized = asdict(self)
         del serialized["connector"]
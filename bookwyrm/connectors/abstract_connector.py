@@ -8,7 +8,6 @@ import logging
 import re
 import asyncio
 from PIL import Image, UnidentifiedImageError
-import requests
 from requests.exceptions import RequestException
 import aiohttp
 
@@ -17,6 +16,7 @@ from django.db import transaction
 
 from bookwyrm import activitypub, models, settings
 from bookwyrm.settings import USER_AGENT
+from bookwyrm.utils.http_client import http_client
 from .connector_manager import load_more_data, ConnectorException, raise_not_valid_url
 from .format_mappings import format_mappings
 from ..book_search import SearchResult
@@ -315,7 +315,7 @@ def get_data(
     raise_not_valid_url(url)
 
     try:
-        resp = requests.get(
+        resp = http_client.get_conditional(
             url,
             params=params,
             headers={  # pylint: disable=line-too-long
@@ -354,7 +354,7 @@ def get_image(
     """wrapper for requesting an image"""
     raise_not_valid_url(url)
     try:
-        resp = requests.get(
+        resp = http_client.get(
             url,
             headers={
                 "User-Agent": settings.USER_AGENT,
@@ -1,15 +1,20 @@
 """ interface with whatever connectors the app has """
 from __future__ import annotations
 import asyncio
+import concurrent.futures
+import hashlib
 import importlib
 import ipaddress
 import logging
-from asyncio import Future
+import threading
 from typing import Iterator, Any, Optional, Union, overload, Literal
 from urllib.parse import urlparse
+from uuid import uuid4
 
 import aiohttp
+from django.core.cache import cache
 from django.dispatch import receiver
+from django.db import transaction
 from django.db.models import signals
 
 from requests import HTTPError
@@ -17,7 +22,12 @@ from requests import HTTPError
 from bookwyrm import book_search, models
 from bookwyrm.book_search import SearchResult
 from bookwyrm.connectors import abstract_connector
-from bookwyrm.settings import SEARCH_TIMEOUT
+from bookwyrm.settings import (
+    SEARCH_CACHE_TIMEOUT,
+    SEARCH_CONNECTOR_CONCURRENCY,
+    SEARCH_EMPTY_CACHE_TIMEOUT,
+    SEARCH_TIMEOUT,
+)
 from bookwyrm.tasks import app, CONNECTORS
 
 logger = logging.getLogger(__name__)
@@ -27,24 +37,141 @@ class ConnectorException(HTTPError):
     """when the connector can't do what was asked"""
 
 
-async def async_connector_search(
+def get_search_cache_key(url: str, min_confidence: float) -> str:
+    """the search url is specific to the connector, and has the query in it,
+    already normalized if it's an isbn"""
+    normalized = " ".join(url.casefold().split())
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return f"connector-search-{min_confidence}-{digest}"
+
+
+def serialize_results(
+    results: Optional[abstract_connector.ConnectorResults],
+) -> Optional[list[dict[str, Any]]]:
+    """the search results without their connector, to be cached"""
+    if not results:
+        return None
+    return [result.json() for result in results["results"]]
+
+
+def deserialize_results(
+    connector: abstract_connector.AbstractConnector,
+    data: Optional[list[dict[str, Any]]],
+) -> Optional[abstract_connector.ConnectorResults]:
+    """cached search results, back with their connector"""
+    if data is None:
+        return None
+    return abstract_connector.ConnectorResults(
+        connector=connector,
+        results=[SearchResult(**result, connector=connector) for result in data],
+    )
+
+
+# searches running in this process, so that an identical search started at
+# the same time waits for the same response instead of sending its own
+in_flight: dict[str, concurrent.futures.Future[Any]] = {}
+in_flight_lock = threading.Lock()
+
+
+async def get_shared_results(
+    session: aiohttp.ClientSession,
+    connector: abstract_connector.AbstractConnector,
+    url: str,
+    min_confidence: float,
     query: str,
-    items: list[tuple[str, abstract_connector.AbstractConnector]],
+) -> Optional[abstract_connector.ConnectorResults]:
+    """get a connector's results, or wait for the same search to finish"""
+    key = get_search_cache_key(url, min_confidence)
+    with in_flight_lock:
+        future = in_flight.get(key)
+        if future is None:
+            future = in_flight[key] = concurrent.futures.Future()
+            running = True
+        else:
+            running = False
+    if not running:
+        return deserialize_results(connector, await asyncio.wrap_future(future))
+
+    results = None
+    try:
+        results = await connector.get_results(session, url, min_confidence, query)
+    finally:
+        with in_flight_lock:
+            del in_flight[key]
+        future.set_result(serialize_results(results))
+    return results
+
+
+async def async_connector_search_many(
+    searches: list[tuple[str, abstract_connector.AbstractConnector, str]],
     min_confidence: float,
 ) -> list[Optional[abstract_connector.ConnectorResults]]:
-    """Try a number of requests simultaneously"""
+    """Run lots of searches at once, a few at a time on each connector"""
+    limits = {
+        connector: asyncio.Semaphore(SEARCH_CONNECTOR_CONCURRENCY)
+        for _, connector, _ in searches
+    }
+
+    async def limited_search(
+        session: aiohttp.ClientSession,
+        query: str,
+        connector: abstract_connector.AbstractConnector,
+        url: str,
+    ) -> Optional[abstract_connector.ConnectorResults]:
+        async with limits[connector]:
+            return await get_shared_results(
+                session,
+                connector,
+                url,
+                min_confidence,
+                query,
+            )
+
     timeout = aiohttp.ClientTimeout(total=SEARCH_TIMEOUT)
     async with aiohttp.ClientSession(timeout=timeout) as session:
-        tasks: list[Future[Optional[abstract_connector.ConnectorResults]]] = []
-        for url, connector in items:
-            tasks.append(
-                asyncio.ensure_future(
-                    connector.get_results(session, url, min_confidence, query)
+        return list(
+            await asyncio.gather(
+                *(
+                    limited_search(session, query, connector, url)
+                    for query, connector, url in searches
                 )
             )
+        )
+
 
-        results = await asyncio.gather(*tasks)
-        return list(results)
+def run_searches(
+    searches: list[tuple[str, abstract_connector.AbstractConnector, str]],
+    min_confidence: float,
+) -> list[Optional[abstract_connector.ConnectorResults]]:
+    """each connector's results for each search, using results from the cache
+    where there are any, and caching the rest. searches that failed or found
+    nothing are cached too, for less time"""
+    keys = [get_search_cache_key(url, min_confidence) for _, _, url in searches]
+    cached = cache.get_many(keys)
+    missing = [
+        (key, search) for key, search in zip(keys, searches) if key not in cached
+    ]
+    if missing:
+        found = asyncio.run(
+            async_connector_search_many(
+                [search for _, search in missing], min_confidence
+            )
+        )
+        results = {}
+        empty = {}
+        for (key, _), connector_results in zip(missing, found):
+            cached[key] = serialize_results(connector_results)
+            if cached[key]:
+                results[key] = cached[key]
+            else:
+                empty[key] = cached[key]
+        cache.set_many(results, timeout=SEARCH_CACHE_TIMEOUT)
+        cache.set_many(empty, timeout=SEARCH_EMPTY_CACHE_TIMEOUT)
+
+    return [
+        deserialize_results(connector, cached[key])
+        for key, (_, connector, _) in zip(keys, searches)
+    ]
 
 
 @overload
@@ -68,7 +195,7 @@ def search(
     if not query:
         return None if return_first else []
 
-    items = []
+    searches = []
     for connector in get_connectors():
         # get the search url from the connector before sending
         url = connector.get_search_url(query)
@@ -78,15 +205,11 @@ def search(
             # if this URL is invalid we should skip it and move on
             logger.info("Request denied to blocked domain: %s", url)
             continue
-        items.append((url, connector))
+        searches.append((query, connector, url))
 
     # load as many results as we can
     # failed requests will return None, so filter those out
-    results = [
-        r
-        for r in asyncio.run(async_connector_search(query, items, min_confidence))
-        if r
-    ]
+    results = [r for r in run_searches(searches, min_confidence) if r]
 
     if return_first:
         # find the best result from all the responses and return that
@@ -97,6 +220,40 @@ def search(
     return results
 
 
+def search_many(
+    queries: list[str], min_confidence: float = 0.1
+) -> dict[str, Optional[SearchResult]]:
+    """the best remote result for each of a batch of queries, like searching
+    for each with return_first, but all at once"""
+    connectors = list(get_connectors())
+    # the urls only differ by query, so each host only needs checking once
+    allowed_hosts: dict[Optional[str], bool] = {}
+    searches = []
+    for query in queries:
+        for connector in connectors:
+            url = connector.get_search_url(query)
+            host = urlparse(url).hostname
+            if host not in allowed_hosts:
+                try:
+                    raise_not_valid_url(url)
+                    allowed_hosts[host] = True
+                except ConnectorException:
+                    logger.info("Request denied to blocked domain: %s", url)
+                    allowed_hosts[host] = False
+            if allowed_hosts[host]:
+                searches.append((query, connector, url))
+
+    best: dict[str, Optional[SearchResult]] = dict.fromkeys(queries)
+    found = run_searches(searches, min_confidence)
+    # searches are in connector priority order, so the first best result wins
+    for (query, _, _), results in zip(searches, found):
+        for result in results["results"] if results else []:
+            current = best[query]
+            if current is None or result.confidence > current.confidence:
+                best[query] = result
+    return best
+
+
 def first_search_result(
     query: str, min_confidence: float = 0.1
 ) -> Union[models.Edition, SearchResult, None]:
@@ -109,10 +266,68 @@ def first_search_result(
     return search(query, min_confidence=min_confidence, return_first=True) or None
 
 
+class ConnectorRegistry:
+    """the connectors, loaded once for each process instead of on every
+    search, and loaded again whenever any of them change"""
+
+    # changes when a connector does, so other processes know to reload
+    version_key = "connectors-version"
+
+    def __init__(self) -> None:
+        self.version: Optional[str] = None
+        self.connectors: list[abstract_connector.AbstractConnector] = []
+        self.lock = threading.Lock()
+
+    def get_version(self) -> Optional[str]:
+        """the current version, shared between processes"""
+        if (version := cache.get(self.version_key)) is None:
+            cache.add(self.version_key, uuid4().hex, timeout=None)
+            version = cache.get(self.version_key)
+        return version  # type: ignore[no-any-return]
+
+    def get_all(self) -> list[abstract_connector.AbstractConnector]:
+        """every connector, in priority order"""
+        version = self.get_version()
+        with self.lock:
+            # without a shared cache, changes in other processes can't be seen
+            if version is None or version != self.version:
+                self.connectors = [
+                    load_connector(info)
+                    for info in models.Connector.objects.order_by("priority")
+                ]
+                self.version = version
+            return self.connectors
+
+    def get(self, identifier: str) -> Optional[abstract_connector.AbstractConnector]:
+        """a connector by its identifier, if there is one"""
+        return next(
+            (c for c in self.get_all() if c.connector.identifier == identifier), None
+        )
+
+    def get_by_id(self, connector_id: int) -> abstract_connector.AbstractConnector:
+        """a connector by the id of its database entry"""
+        connector = next(
+            (c for c in self.get_all() if c.connector.id == connector_id), None
+        )
+        if connector is None:
+            return load_connector(models.Connector.objects.get(id=connector_id))
+        return connector
+
+    def invalidate(self) -> None:
+        """load the connectors again next time, in every process"""
+        with self.lock:
+            self.version = None
+        cache.set(self.version_key, uuid4().hex, timeout=None)
+
+
+connector_registry = ConnectorRegistry()
+
+
 def get_connectors() -> Iterator[abstract_connector.AbstractConnector]:
     """load all connectors"""
-    for info in models.Connector.objects.filter(active=True).order_by("priority").all():
-        yield load_connector(info)
+    for connector in connector_registry.get_all():
+        if connector.connector.active:
+            yield connector
 
 
 def get_or_create_connector(remote_id: str) -> abstract_connector.AbstractConnector:
@@ -122,6 +337,9 @@ def get_or_create_connector(remote_id: str) -> abstract_connector.AbstractConnec
     if not identifier:
         raise ValueError(f"Invalid remote id: {remote_id}")
 
+    if connector := connector_registry.get(identifier):
+        return connector
+
     base_url = f"{url.scheme}://{url.netloc}"
 
     try:
@@ -143,8 +361,7 @@ def get_or_create_connector(remote_id: str) -> abstract_connector.AbstractConnec
 @app.task(queue=CONNECTORS)
 def load_more_data(connector_id: str, book_id: str) -> None:
     """background the work of getting all 10,000 editions of LoTR"""
-    connector_info = models.Connector.objects.get(id=connector_id)
-    connector = load_connector(connector_info)
+    connector = connector_registry.get_by_id(int(connector_id))
     book = models.Book.objects.select_subclasses().get(  # type: ignore[no-untyped-call]
         id=book_id
     )
@@ -156,8 +373,7 @@ def create_edition_task(
     connector_id: int, work_id: int, data: Union[str, abstract_connector.JsonDict]
 ) -> None:
     """separate task for each of the 10,000 editions of LoTR"""
-    connector_info = models.Connector.objects.get(id=connector_id)
-    connector = load_connector(connector_info)
+    connector = connector_registry.get_by_id(connector_id)
     work = models.Work.objects.select_subclasses().get(  # type: ignore[no-untyped-call]
         id=work_id
     )
@@ -174,6 +390,17 @@ def load_connector(
     return connector.Connector(connector_info.identifier)  # type: ignore[no-any-return]
 
 
+@receiver(signals.post_save, sender="bookwyrm.Connector")
+@receiver(signals.post_delete, sender="bookwyrm.Connector")
+# pylint: disable=unused-argument
+def invalidate_connectors(
+    sender: Any, instance: models.Connector, **kwargs: Any
+) -> None:
+    """the connectors need loading again, now and once the change is saved"""
+    connector_registry.invalidate()
+    transaction.on_commit(connector_registry.invalidate)
+
+
 @receiver(signals.post_save, sender="bookwyrm.FederatedServer")
 # pylint: disable=unused-argument
 def create_connector(
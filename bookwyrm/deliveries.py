@@ -0,0 +1,290 @@
+""" outgoing activities, queued up per server """
+from collections import namedtuple
+import json
+import time
+from typing import Optional
+from urllib.parse import urlparse
+from uuid import uuid4
+
+from bookwyrm import settings
+from bookwyrm.redis_store import r
+
+Delivery = namedtuple(
+    "Delivery", ("key", "inbox", "attempt", "priority", "sender_id", "activity")
+)
+
+# lower goes first: things people are waiting to see go before bulk work
+URGENT = 0
+BULK = 1
+PRIORITIES = (URGENT, BULK)
+
+# claim the due deliveries in a queue by pushing them back until the lease runs
+# out, so they're picked up again if the worker sending them dies
+CLAIM_SCRIPT = """
+local found = redis.call("ZRANGEBYSCORE", KEYS[1], 0, ARGV[1], "LIMIT", 0, ARGV[3])
+for _, member in ipairs(found) do
+    redis.call("ZADD", KEYS[1], ARGV[2], member)
+end
+return found
+"""
+
+# hand a server's delivery task on to a new one, or release it, as long as no
+# other task has taken it over in the meantime
+RESCHEDULE_SCRIPT = """
+local current = redis.call("GET", KEYS[1])
+if current and current ~= ARGV[1] then
+    return 0
+end
+if ARGV[2] == "" then
+    redis.call("DEL", KEYS[1])
+else
+    redis.call("SET", KEYS[1], ARGV[2], "EX", ARGV[3])
+end
+return 1
+"""
+
+
+class DeliveryQueue:
+    """each activity is stored once, and each server gets a sorted set per
+    priority of the inboxes waiting for it, ranked by when they're due. one
+    delivery task at a time works through a server's queue, so a burst of
+    activities to the same shared inbox goes out over the same connections
+    instead of as thousands of separate tasks. the task that holds a server is
+    identified by a token, which also says when the task is due to run"""
+
+    # how long an activity waits to be delivered before we give up on it
+    ttl = settings.BROADCAST_QUEUE_TTL
+    # how long past its due time to trust that a delivery task is on its way
+    schedule_timeout = 60 * 2
+    # how long a delivery task has to send what it took off the queue before
+    # it's given to another task
+    lease_timeout = 60 * 10
+    # hosts' delivery stats are kept for a day after they were last updated
+    stats_ttl = 60 * 60 * 24
+    stats_id = "delivery-stats"
+
+    def payload_id(self, key):  # pylint: disable=no-self-use
+        """the stored activity and its sender"""
+        return f"delivery-{key}"
+
+    def queue_id(self, host, priority):  # pylint: disable=no-self-use
+        """inboxes on a server waiting for activities"""
+        return f"deliveries-{host}-{priority}"
+
+    def scheduled_id(self, host):  # pylint: disable=no-self-use
+        """set while there's a delivery task on its way for a server"""
+        return f"deliveries-{host}-scheduled"
+
+    def host_stats_id(self, host):  # pylint: disable=no-self-use
+        """running totals for a server"""
+        return f"delivery-stats-{host}"
+
+    def member(self, key, inbox, attempt):  # pylint: disable=no-self-use
+        """an inbox waiting for an activity, as it's stored in the queue"""
+        return json.dumps([key, inbox, attempt])
+
+    def make_token(self, due):  # pylint: disable=no-self-use
+        """a token for a delivery task that's due at a time"""
+        return f"{due} {uuid4().hex}"
+
+    def get_due(self, token):  # pylint: disable=no-self-use
+        """when the delivery task with this token is due to run"""
+        if isinstance(token, bytes):
+            token = token.decode("utf-8")
+        try:
+            return float(token.split()[0])
+        except (IndexError, ValueError):
+            return 0.0
+
+    def add(self, sender_id, activity, recipients, priority=URGENT):
+        """store an activity and queue it for each inbox, returning the servers
+        that need a delivery task started, and the tokens for those tasks"""
+        key = uuid4().hex
+        now = time.time()
+        hosts = {}
+        for inbox in recipients:
+            hosts.setdefault(urlparse(inbox).hostname, []).append(inbox)
+        if not hosts:
+            return []
+
+        pipeline = r.pipeline()
+        pipeline.set(
+            self.payload_id(key),
+            json.dumps({"sender": sender_id, "activity": activity}),
+            ex=self.ttl,
+        )
+        for host, inboxes in hosts.items():
+            pipeline.zadd(
+                self.queue_id(host, priority),
+                {self.member(key, inbox, 0): now for inbox in inboxes},
+            )
+            pipeline.expire(self.queue_id(host, priority), self.ttl)
+        for host in hosts:
+            pipeline.get(self.scheduled_id(host))
+        current = pipeline.execute()[-len(hosts) :]
+        return self.start_tasks(dict(zip(hosts, current)), now)
+
+    def start_tasks(self, current, now):
+        """claim the servers that don't have a delivery task coming up, given
+        their current tasks' tokens. a server with a task waiting out a backoff
+        gets a new one, so new deliveries don't have to wait as well; the old
+        task steps aside when it runs"""
+        idle = [
+            host
+            for host, token in current.items()
+            if token is None or self.get_due(token) > now
+        ]
+        if not idle:
+            return []
+        tokens = [self.make_token(now) for _ in idle]
+        pipeline = r.pipeline()
+        for host, token in zip(idle, tokens):
+            pipeline.set(self.scheduled_id(host), token, ex=self.schedule_timeout)
+        pipeline.execute()
+        return list(zip(idle, tokens))
+
+    def pop(self, host, count):
+        """claim up to count of a server's deliveries that are due, most urgent
+        first, dropping any whose activity has expired. they stay in the queue
+        until they're finished or retried, in case this worker dies"""
+        now = time.time()
+        members = []
+        for priority in PRIORITIES:
+            if len(members) >= count:
+                break
+            found = r.eval(
+                CLAIM_SCRIPT,
+                1,
+                self.queue_id(host, priority),
+                now,
+                now + self.lease_timeout,
+                count - len(members),
+            )
+            members += [(priority, json.loads(m)) for m in found]
+        if not members:
+            return []
+
+        keys = list({key for _, (key, _, _) in members})
+        payloads = dict(zip(keys, r.mget([self.payload_id(k) for k in keys])))
+        deliveries = []
+        expired = []
+        for priority, (key, inbox, attempt) in members:
+            if not payloads[key]:
+                expired.append(Delivery(key, inbox, attempt, priority, None, None))
+                continue
+            payload = json.loads(payloads[key])
+            deliveries.append(
+                Delivery(
+                    key,
+                    inbox,
+                    attempt,
+                    priority,
+                    payload["sender"],
+                    payload["activity"],
+                )
+            )
+        self.finish(host, expired)
+        return deliveries
+
+    def finish(self, host, deliveries):
+        """take deliveries that have been sent (or given up on) off the queue"""
+        if not deliveries:
+            return
+        pipeline = r.pipeline()
+        for delivery in deliveries:
+            pipeline.zrem(
+                self.queue_id(host, delivery.priority),
+                self.member(delivery.key, delivery.inbox, delivery.attempt),
+            )
+        pipeline.execute()
+
+    def retry(self, host, deliveries, delays):
+        """put deliveries back on the queue to try again after a delay each"""
+        if not deliveries:
+            return
+        now = time.time()
+        pipeline = r.pipeline()
+        for delivery, delay in zip(deliveries, delays):
+            queue = self.queue_id(host, delivery.priority)
+            pipeline.zrem(
+                queue, self.member(delivery.key, delivery.inbox, delivery.attempt)
+            )
+            member = self.member(delivery.key, delivery.inbox, delivery.attempt + 1)
+            pipeline.zadd(queue, {member: now + delay})
+        pipeline.execute()
+
+    def next_due(self, host) -> Optional[float]:
+        """when the server's next delivery is due, if it has any"""
+        pipeline = r.pipeline()
+        for priority in PRIORITIES:
+            pipeline.zrange(self.queue_id(host, priority), 0, 0, withscores=True)
+        scores = [found[0][1] for found in pipeline.execute() if found]
+        return min(scores) if scores else None
+
+    def clear(self, host):
+        """drop everything waiting for a server"""
+        r.delete(*[self.queue_id(host, priority) for priority in PRIORITIES])
+
+    def is_scheduled(self, host, token):
+        """is this the server's current delivery task"""
+        current = r.get(self.scheduled_id(host))
+        if isinstance(current, bytes):
+            current = current.decode("utf-8")
+        return current in (None, token)
+
+    def reschedule(self, host, token, countdown=None) -> Optional[str]:
+        """hand the server's delivery on to a task that runs after countdown
+        seconds, returning its token, or release it if there's no countdown.
+        nothing changes if another task has taken the server over"""
+        new_token = None
+        if countdown is not None:
+            new_token = self.make_token(time.time() + countdown)
+        claimed = r.eval(
+            RESCHEDULE_SCRIPT,
+            1,
+            self.scheduled_id(host),
+            token or "",
+            new_token or "",
+            int(countdown or 0) + self.schedule_timeout,
+        )
+        return new_token if claimed else None
+
+    def record(self, host, delivered, failed, seconds):
+        """add to a server's running totals"""
+        pipeline = r.pipeline()
+        stats = self.host_stats_id(host)
+        pipeline.hincrby(stats, "delivered", delivered)
+        pipeline.hincrby(stats, "failed", failed)
+        pipeline.hincrbyfloat(stats, "seconds", seconds)
+        pipeline.expire(stats, self.stats_ttl)
+        pipeline.zincrby(self.stats_id, seconds, host)
+        pipeline.expire(self.stats_id, self.stats_ttl)
+        pipeline.execute()
+
+    def get_stats(self, count=20):
+        """the servers we've spent the most time delivering to"""
+        hosts = r.zrevrange(self.stats_id, 0, count - 1)
+        pipeline = r.pipeline()
+        for host in hosts:
+            pipeline.hgetall(self.host_stats_id(host.decode()))
+        stats = []
+        for host, values in zip(hosts, pipeline.execute()):
+            if not values:
+                continue
+            delivered = int(values.get(b"delivered", 0))
+            failed = int(values.get(b"failed", 0))
+            seconds = float(values.get(b"seconds", 0))
+            total = delivered + failed
+            stats.append(
+                {
+                    "host": host.decode(),
+                    "delivered": delivered,
+                    "failed": failed,
+                    "seconds": seconds,
+                    "average": seconds / total if total else 0,
+                }
+            )
+        return stats
+
+
+delivery_queue = DeliveryQueue()
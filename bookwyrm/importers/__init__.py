@@ -8,3 +8,16 @@ from .librarything_import import LibrarythingImporter
 from .openlibrary_import import OpenLibraryImporter
 from .storygraph_import import StorygraphImporter
 from .openreads_import import OpenReadsImporter
+
+csv_importers: list[type[Importer]] = [
+    Importer,
+    BookwyrmBooksImporter,
+    CalibreImporter,
+    GoodreadsImporter,
+    LibrarythingImporter,
+    OpenLibraryImporter,
+    StorygraphImporter,
+    OpenReadsImporter,
+]
+# by the source they're saved with on import jobs
+importers = {importer.service: importer for importer in csv_importers}
@@ -1,11 +1,19 @@
 """ handle reading a csv from an external service, defaults are from Goodreads """
 import csv
+import logging
 from datetime import timedelta
-from typing import Iterable, Optional
+from io import TextIOWrapper
+from itertools import chain, islice
+from typing import Iterable, Iterator, Optional
 
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models import Sum
 from django.utils import timezone
+from django.utils.translation import ngettext
 from bookwyrm.models import ImportJob, ImportItem, SiteSettings, User
 
+logger = logging.getLogger(__name__)
+
 
 class Importer:
     """Generic class for csv data import from an outside service"""
@@ -45,6 +53,9 @@ class Importer:
         "reading": ["currently-reading", "reading", "currently reading"],
     }
 
+    # how many rows to save at a time
+    chunk_size = 500
+
     # pylint: disable=too-many-arguments
     def create_job(
         self,
@@ -56,34 +67,124 @@ class Importer:
     ) -> ImportJob:
         """check over a csv and creates a database entry for the job"""
         csv_reader = csv.DictReader(csv_file, delimiter=self.delimiter)
-        rows = list(csv_reader)
-        if len(rows) < 1:
-            raise ValueError("CSV file is empty")
-
-        mappings = (
-            self.create_row_mappings(list(fieldnames))
-            if (fieldnames := csv_reader.fieldnames)
-            else {}
+        rows = self.read_header(csv_reader)
+        job = ImportJob.objects.create(
+            user=user,
+            include_reviews=include_reviews,
+            create_shelves=create_shelves,
+            privacy=privacy,
+            mappings=self.get_mappings(csv_reader),
+            source=self.service,
         )
+        self.create_items(job, rows)
+        return job
 
-        job = ImportJob.objects.create(
+    # pylint: disable=too-many-arguments
+    def upload_job(
+        self,
+        user: User,
+        uploaded_file: UploadedFile,
+        include_reviews: bool,
+        privacy: str,
+        create_shelves: bool = True,
+    ) -> ImportJob:
+        """check the csv's header and store it, so the rows can be read in the
+        background when the job starts instead of during the request"""
+        csv_file = TextIOWrapper(uploaded_file, encoding=self.encoding)
+        try:
+            csv_reader = csv.DictReader(csv_file, delimiter=self.delimiter)
+            self.read_header(csv_reader)
+            mappings = self.get_mappings(csv_reader)
+        finally:
+            # don't let the wrapper close the upload when it's cleaned up
+            csv_file.detach()
+        uploaded_file.seek(0)
+
+        return ImportJob.objects.create(
             user=user,
             include_reviews=include_reviews,
             create_shelves=create_shelves,
             privacy=privacy,
             mappings=mappings,
             source=self.service,
+            source_file=uploaded_file,
         )
 
-        enforce_limit, allowed_imports = self.get_import_limit(user)
+    def read_job_file(self, job: ImportJob) -> None:
+        """create the items for a job from its stored csv"""
+        with job.source_file.open("rb") as source_file:
+            csv_reader = csv.DictReader(
+                TextIOWrapper(source_file, encoding=self.encoding),
+                delimiter=self.delimiter,
+            )
+            try:
+                self.create_items(job, csv_reader)
+            except (UnicodeDecodeError, csv.Error) as err:
+                # import whatever could be read, and tell the user where it stopped
+                logger.info("Stopped reading import %s: %s", job.id, err)
+                job.refresh_from_db(fields=["items_total"])
+                job.fail_reason = ngettext(
+                    "Only the first row of your file could be read (%(error)s)",
+                    "Only the first %(count)d rows of your file could be read "
+                    "(%(error)s)",
+                    job.items_total,
+                ) % {"count": job.items_total, "error": err}
+        job.source_file.delete(save=False)
+        job.save(update_fields=["source_file", "fail_reason"])
+
+    # pylint: disable=no-self-use
+    def read_header(
+        self, csv_reader: "csv.DictReader[str]"
+    ) -> Iterator[dict[str, str]]:
+        """make sure the csv has at least one row, and give back all the rows"""
+        try:
+            first_row = next(csv_reader)
+        except StopIteration as err:
+            raise ValueError("CSV file is empty") from err
+        return chain([first_row], csv_reader)
+
+    def get_mappings(
+        self, csv_reader: "csv.DictReader[str]"
+    ) -> dict[str, Optional[str]]:
+        """guess the mappings once the header has been read"""
+        if not (fieldnames := csv_reader.fieldnames):
+            return {}
+        return self.create_row_mappings(list(fieldnames))
+
+    def create_items(self, job: ImportJob, rows: Iterable[dict[str, str]]) -> None:
+        """save the rows a chunk at a time, up to the user's import limit, so
+        the progress shows as they're read and a big file isn't held in memory"""
+        enforce_limit, allowed_imports = self.get_import_limit(job.user)
+        if enforce_limit:
+            rows = islice(rows, max(allowed_imports, 0))
+        chunk = []
+        try:
+            for index, data in enumerate(rows):
+                chunk.append(self.build_item(job, index, data))
+                if len(chunk) >= self.chunk_size:
+                    self.save_items(job, chunk)
+                    chunk = []
+                    job.refresh_from_db(fields=["complete"])
+                    if job.complete:
+                        return
+        except (UnicodeDecodeError, csv.Error):
+            # keep the rows that were read before the file went bad
+            self.save_items(job, chunk)
+            raise
+        self.save_items(job, chunk)
         if enforce_limit and allowed_imports <= 0:
             job.complete_job()
-            return job
-        for index, entry in enumerate(rows):
-            if enforce_limit and index >= allowed_imports:
-                break
-            self.create_item(job, index, entry)
-        return job
+
+    def save_items(self, job: ImportJob, items: list[ImportItem]) -> None:
+        """save a chunk of items and note that the job is making progress"""
+        if not items:
+            return
+        ImportItem.objects.bulk_create(items, batch_size=self.chunk_size)
+        # bulk creating skips the signal that counts saved items, and these
+        # haven't been looked up yet
+        ImportJob.add_to_counts(
+            job.id, items_total=len(items), items_pending=len(items)
+        )
 
     def update_legacy_job(self, job: ImportJob) -> None:
         """patch up a job that was in the old format"""
@@ -95,7 +196,7 @@ class Importer:
         headers = list(first_item.data.keys())
         job.mappings = self.create_row_mappings(headers)
         job.updated_date = timezone.now()
-        job.save()
+        job.save(update_fields=["mappings", "updated_date"])
 
         for item in items.all():
             normalized = self.normalize_row(item.data, job.mappings)
@@ -116,9 +217,15 @@ class Importer:
 
     def create_item(self, job: ImportJob, index: int, data: dict[str, str]) -> None:
         """creates and saves an import item"""
+        self.build_item(job, index, data).save()
+
+    def build_item(
+        self, job: ImportJob, index: int, data: dict[str, str]
+    ) -> ImportItem:
+        """normalizes a row into an unsaved import item"""
         normalized = self.normalize_row(data, job.mappings)
         normalized["shelf"] = self.get_shelf(normalized)
-        ImportItem(job=job, index=index, data=data, normalized_data=normalized).save()
+        return ImportItem(job=job, index=index, data=data, normalized_data=normalized)
 
     def get_shelf(self, normalized_row: dict[str, Optional[str]]) -> Optional[str]:
         """determine which shelf to use"""
@@ -152,8 +259,9 @@ class Importer:
             import_jobs = ImportJob.objects.filter(
                 user=user, created_date__gte=time_range
             )
-            # pylint: disable=consider-using-generator
-            imported_books = sum([job.successful_item_count for job in import_jobs])
+            imported_books = (
+                import_jobs.aggregate(total=Sum("items_succeeded"))["total"] or 0
+            )
             allowed_imports = import_size_limit - imported_books
         return enforce_limit, allowed_imports
 
@@ -175,9 +283,10 @@ class Importer:
         if enforce_limit and allowed_imports <= 0:
             job.complete_job()
             return job
-        for index, item in enumerate(items):
-            if enforce_limit and index >= allowed_imports:
-                break
-            # this will re-normalize the raw data
-            self.create_item(job, item.index, item.data)
+        if enforce_limit:
+            items = items[:allowed_imports]
+        # this will re-normalize the raw data
+        self.save_items(
+            job, [self.build_item(job, item.index, item.data) for item in items]
+        )
         return job
@@ -1,4 +1,7 @@
 """ Use the range message from isbn-international to hyphenate ISBNs """
+from bisect import bisect_right
+import json
+import logging
 import os
 from typing import Optional
 from xml.etree import ElementTree
@@ -8,6 +11,14 @@ import requests
 
 from bookwyrm import settings
 
+logger = logging.getLogger(__name__)
+
+# the ranges in the range message are all this many digits long
+RANGE_DIGITS = 7
+
+# the (start, end, length) of each range that's in use, by prefix
+Ranges = dict[str, list[tuple[int, int, int]]]
+
 
 def _get_rules(element: Element) -> list[Element]:
     if (rules_el := element.find("Rules")) is not None:
@@ -15,6 +26,26 @@ def _get_rules(element: Element) -> list[Element]:
     return []
 
 
+def compile_ranges(root: Element) -> Ranges:
+    """the ranges for each EAN.UCC prefix and registration group, sorted so
+    they can be searched by bisection"""
+    ranges: Ranges = {}
+    for path in ("EAN.UCCPrefixes/EAN.UCC", "RegistrationGroups/Group"):
+        for prefix_el in root.iterfind(path):
+            if not (prefix := prefix_el.findtext("Prefix")) or prefix in ranges:
+                continue
+            rules = []
+            for rule_el in _get_rules(prefix_el):
+                length = int(rule_el.findtext("Length") or 0)
+                # a length of zero means the range isn't in use yet
+                if not length or not (range_text := rule_el.findtext("Range")):
+                    continue
+                start, end = (int(x) for x in range_text.split("-"))
+                rules.append((start, end, length))
+            ranges[prefix] = sorted(rules)
+    return ranges
+
+
 class IsbnHyphenator:
     """Class to manage the range message xml file and use it to hyphenate ISBNs"""
 
@@ -22,34 +53,70 @@ class IsbnHyphenator:
     __range_file_path = os.path.join(
         settings.BASE_DIR, "bookwyrm", "isbn", "RangeMessage.xml"
     )
-    __element_tree = None
+    # the compiled ranges, so the xml doesn't need parsing in every process
+    __ranges_file_path = os.path.join(
+        settings.BASE_DIR, "bookwyrm", "isbn", "RangeMessage.json"
+    )
+    __ranges: Optional[Ranges] = None
+    __starts: dict[str, list[int]] = {}
 
     def update_range_message(self) -> None:
         """Download the range message xml file and save it locally"""
         response = requests.get(self.__range_message_url, timeout=15)
         with open(self.__range_file_path, "w", encoding="utf-8") as file:
             file.write(response.text)
-        self.__element_tree = None
+        self.__ranges = None
+        self.__load_ranges()
+
+    def __load_ranges(self) -> Ranges:
+        """the compiled ranges, from the cache file if it's up to date"""
+        if self.__ranges is not None:
+            return self.__ranges
+
+        ranges = None
+        try:
+            if os.path.getmtime(self.__ranges_file_path) >= os.path.getmtime(
+                self.__range_file_path
+            ):
+                with open(self.__ranges_file_path, encoding="utf-8") as file:
+                    ranges = {
+                        prefix: [(rule[0], rule[1], rule[2]) for rule in rules]
+                        for prefix, rules in json.load(file).items()
+                    }
+        except (OSError, ValueError):
+            pass
+
+        if ranges is None:
+            ranges = compile_ranges(ElementTree.parse(self.__range_file_path).getroot())
+            # written to the side first, so no other process reads half of it
+            temp_path = f"{self.__ranges_file_path}.{os.getpid()}"
+            try:
+                with open(temp_path, "w", encoding="utf-8") as file:
+                    json.dump(ranges, file, separators=(",", ":"))
+                os.replace(temp_path, self.__ranges_file_path)
+            except OSError as err:
+                # it'll just be compiled again next time
+                logger.info("Unable to save ISBN ranges: %s", err)
+
+        self.__starts = {
+            prefix: [start for start, _, _ in rules] for prefix, rules in ranges.items()
+        }
+        self.__ranges = ranges
+        return ranges
 
     def hyphenate(self, isbn_13: Optional[str]) -> Optional[str]:
         """hyphenate the given ISBN-13 number using the range message"""
         if isbn_13 is None:
             return None
 
-        if self.__element_tree is None:
-            self.__element_tree = ElementTree.parse(self.__range_file_path)
-
         gs1_prefix = isbn_13[:3]
-        try:
-            reg_group = self.__find_reg_group(isbn_13, gs1_prefix)
-        except ValueError:
-            # if the reg groups are invalid, just return the original isbn
-            return isbn_13
-
+        reg_group = self.__find_part(isbn_13, gs1_prefix, len(gs1_prefix))
         if reg_group is None:
             return isbn_13  # failed to hyphenate
 
-        registrant = self.__find_registrant(isbn_13, gs1_prefix, reg_group)
+        registrant = self.__find_part(
+            isbn_13, "-".join((gs1_prefix, reg_group)), len(gs1_prefix + reg_group)
+        )
         if registrant is None:
             return isbn_13  # failed to hyphenate
 
@@ -57,72 +124,25 @@ class IsbnHyphenator:
         check_digit = isbn_13[-1:]
         return "-".join((gs1_prefix, reg_group, registrant, publication, check_digit))
 
-    def __find_reg_group(self, isbn_13: str, gs1_prefix: str) -> Optional[str]:
-        if self.__element_tree is None:
-            self.__element_tree = ElementTree.parse(self.__range_file_path)
-
-        ucc_prefixes_el = self.__element_tree.find("EAN.UCCPrefixes")
-        if ucc_prefixes_el is None:
+    def __find_part(self, isbn_13: str, prefix: str, from_ind: int) -> Optional[str]:
+        """the registration group or registrant that starts at from_ind"""
+        rules = self.__load_ranges().get(prefix)
+        if not rules:
             return None
 
-        for ean_ucc_el in ucc_prefixes_el.findall("EAN.UCC"):
-            if (
-                prefix_el := ean_ucc_el.find("Prefix")
-            ) is not None and prefix_el.text == gs1_prefix:
-                for rule_el in _get_rules(ean_ucc_el):
-                    length_el = rule_el.find("Length")
-                    if length_el is None:
-                        continue
-                    length = int(text) if (text := length_el.text) else 0
-                    if length == 0:
-                        continue
-
-                    range_el = rule_el.find("Range")
-                    if range_el is None or range_el.text is None:
-                        continue
-
-                    reg_grp_range = [int(x[:length]) for x in range_el.text.split("-")]
-                    reg_group = isbn_13[len(gs1_prefix) : len(gs1_prefix) + length]
-                    if reg_grp_range[0] <= int(reg_group) <= reg_grp_range[1]:
-                        return reg_group
-                return None
-        return None
-
-    def __find_registrant(
-        self, isbn_13: str, gs1_prefix: str, reg_group: str
-    ) -> Optional[str]:
-        from_ind = len(gs1_prefix) + len(reg_group)
-
-        if self.__element_tree is None:
-            self.__element_tree = ElementTree.parse(self.__range_file_path)
-
-        reg_groups_el = self.__element_tree.find("RegistrationGroups")
-        if reg_groups_el is None:
+        digits = isbn_13[from_ind : from_ind + RANGE_DIGITS]
+        if not digits.isdigit():
+            # not a valid isbn
             return None
+        number = int(digits.ljust(RANGE_DIGITS, "0"))
 
-        for group_el in reg_groups_el.findall("Group"):
-            if (
-                prefix_el := group_el.find("Prefix")
-            ) is not None and prefix_el.text == "-".join((gs1_prefix, reg_group)):
-                for rule_el in _get_rules(group_el):
-                    length_el = rule_el.find("Length")
-                    if length_el is None:
-                        continue
-                    length = int(text) if (text := length_el.text) else 0
-                    if length == 0:
-                        continue
-
-                    range_el = rule_el.find("Range")
-                    if range_el is None or range_el.text is None:
-                        continue
-                    registrant_range = [
-                        int(x[:length]) for x in range_el.text.split("-")
-                    ]
-                    registrant = isbn_13[from_ind : from_ind + length]
-                    if registrant_range[0] <= int(registrant) <= registrant_range[1]:
-                        return registrant
-                return None
-        return None
+        index = bisect_right(self.__starts[prefix], number) - 1
+        if index < 0:
+            return None
+        _, end, length = rules[index]
+        if number > end:
+            return None
+        return digits[:length]
 
 
 hyphenator_singleton = IsbnHyphenator()
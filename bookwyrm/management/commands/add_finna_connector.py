@@ -2,6 +2,7 @@
 from django.core.management.base import BaseCommand
 
 from bookwyrm import models
+from bookwyrm.connectors.connector_manager import connector_registry
 
 
 def enable_finna_connector():
@@ -30,6 +31,8 @@ def remove_finna_connector():
     models.Connector.objects.filter(identifier="api.finna.fi").update(
         active=False, deactivation_reason="Disabled by management command"
     )
+    # updating doesn't send the signal that reloads connectors
+    connector_registry.invalidate()
     print("Finna connector deactivated")
 
 
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookwyrm", "0219_datamigration_fix_isbn10_20251017_1810"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="federatedserver",
+            name="delivery_failures",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="federatedserver",
+            name="delivery_paused_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
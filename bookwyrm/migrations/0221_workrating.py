@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:36
+
+import bookwyrm.models.rating
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookwyrm", "0220_federatedserver_delivery"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WorkRating",
+            fields=[
+                (
+                    "work",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="aggregate_rating",
+                        serialize=False,
+                        to="bookwyrm.work",
+                    ),
+                ),
+                ("rating_count", models.IntegerField(default=0)),
+                (
+                    "rating_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "histogram",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.IntegerField(),
+                        default=bookwyrm.models.rating.empty_histogram,
+                        size=None,
+                    ),
+                ),
+                ("updated_date", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
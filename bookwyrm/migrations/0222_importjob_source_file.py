@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:41
+
+import bookwyrm.models.import_job
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookwyrm", "0221_workrating"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="source_file",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                storage=bookwyrm.models.import_job.select_imports_storage,
+                upload_to="",
+            ),
+        ),
+    ]
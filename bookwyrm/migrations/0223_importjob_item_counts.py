@@ -0,0 +1,61 @@
+# Generated by Django 5.2.3 on 2026-10-18 22:01
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_items(apps, schema_editor):
+    """fill in the running totals for existing jobs"""
+    db_alias = schema_editor.connection.alias
+    ImportJob = apps.get_model("bookwyrm", "ImportJob")
+    ImportItem = apps.get_model("bookwyrm", "ImportItem")
+
+    def count(**filters):
+        items = (
+            ImportItem.objects.using(db_alias)
+            .filter(job=OuterRef("pk"), **filters)
+            .order_by()
+            .values("job")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        return Coalesce(Subquery(items), 0)
+
+    ImportJob.objects.using(db_alias).update(
+        items_total=count(),
+        items_pending=count(book__isnull=True, fail_reason__isnull=True),
+        items_succeeded=count(book__isnull=False),
+        items_failed=count(fail_reason__isnull=False),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookwyrm", "0222_importjob_source_file"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="items_failed",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="importjob",
+            name="items_pending",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="importjob",
+            name="items_succeeded",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="importjob",
+            name="items_total",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_items, reverse_code=migrations.RunPython.noop),
+    ]
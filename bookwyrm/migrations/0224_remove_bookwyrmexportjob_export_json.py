@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 22:08
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookwyrm", "0223_importjob_item_counts"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="bookwyrmexportjob",
+            name="export_json",
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 22:57
+
+import bookwyrm.models.import_job
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookwyrm", "0224_remove_bookwyrmexportjob_export_json"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="fail_reason",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="importjob",
+            name="source_file",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                storage=bookwyrm.models.import_job.select_imports_storage,
+                upload_to="imports/",
+            ),
+        ),
+    ]
@@ -13,6 +13,7 @@ from .list import List, ListItem
 from .status import Status, GeneratedNote, Comment, Quotation
 from .status import Review, ReviewRating
 from .status import Boost
+from .rating import WorkRating
 from .attachment import Image
 from .favorite import Favorite
 from .readthrough import ReadThrough, ProgressUpdate, ProgressMode
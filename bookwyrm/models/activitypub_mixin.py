@@ -4,25 +4,34 @@ from base64 import b64encode
 from collections import namedtuple
 from functools import reduce
 import json
+import math
 import operator
 import logging
+import time
 from typing import Any, Optional
 from uuid import uuid4
 from typing_extensions import Self
 
 import aiohttp
-from Crypto.PublicKey import RSA
-from Crypto.Signature import pkcs1_15
 from Crypto.Hash import SHA256
 from django.apps import apps
 from django.core.paginator import Paginator
 from django.db.models import Q
+from django.utils import timezone
 from django.utils.http import http_date
 
 from bookwyrm import activitypub
-from bookwyrm.settings import USER_AGENT, PAGE_LENGTH
-from bookwyrm.signatures import make_signature, make_digest
+from bookwyrm.deliveries import delivery_queue, Delivery, BULK, URGENT
+from bookwyrm.settings import (
+    BROADCAST_BATCH_SIZE,
+    BROADCAST_MAX_RETRIES,
+    USER_AGENT,
+    PAGE_LENGTH,
+)
+from bookwyrm.signatures import get_signer, make_signature, make_digest
 from bookwyrm.tasks import app, BROADCAST
+from bookwyrm.utils.async_client import broadcast_pool
+from bookwyrm.utils.cache import get_or_set
 from bookwyrm.models.fields import ImageField, ManyToManyField
 
 logger = logging.getLogger(__name__)
@@ -148,6 +157,7 @@ class ActivitypubMixin:
                 json.dumps(activity, cls=activitypub.ActivityEncoder),
                 self.get_recipients(software=software),
             ),
+            kwargs={"queue": queue},
             queue=queue,
         )
 
@@ -171,32 +181,27 @@ class ActivitypubMixin:
 
         # unless it's a dm, all the followers should receive the activity
         if privacy != "direct":
-            # we will send this out to a subset of all remote users
-            queryset = (
-                user_model.viewer_aware_objects(user)
-                .filter(
-                    local=False,
-                )
-                .distinct()
-            )
-            # filter users first by whether they're using the desired software
-            # this lets us send book updates only to other bw servers
-            if software:
-                queryset = queryset.filter(bookwyrm_user=software == "bookwyrm")
-            # if there's a user, we only want to send to the user's followers
             if user:
-                queryset = queryset.filter(following=user)
-
-            # as above, we prefer shared inboxes if available
-            recipients.update(
-                queryset.filter(shared_inbox__isnull=False).values_list(
-                    "shared_inbox", flat=True
+                # the user's followers are looked up for nearly everything they
+                # do, so they're cached until someone follows, unfollows, or
+                # blocks them, or one of the followers moves their inbox
+                followers = get_or_set(
+                    f"follower-inboxes-{user.id}",
+                    get_follower_inboxes,
+                    user,
+                    timeout=60 * 60 * 24 * 7,
                 )
-            )
+            else:
+                # we will send this out to a subset of all remote users
+                followers = get_follower_inboxes(None)
+
+            # filter users by whether they're using the desired software, which
+            # lets us send book updates only to other bw servers, and as above,
+            # we prefer shared inboxes if available
             recipients.update(
-                queryset.filter(shared_inbox__isnull=True).values_list(
-                    "inbox", flat=True
-                )
+                shared_inbox or inbox
+                for shared_inbox, inbox, bookwyrm_user in followers
+                if not software or bookwyrm_user == (software == "bookwyrm")
             )
         return list(recipients)
 
@@ -284,7 +289,7 @@ class ObjectMixin(ActivitypubMixin):
         signature = None
         create_id = self.remote_id + "/activity"
         if hasattr(activity_object, "content") and activity_object.content:
-            signer = pkcs1_15.new(RSA.import_key(user.key_pair.private_key))
+            signer = get_signer(user.key_pair.private_key, user.key_pair.id)
             content = activity_object.content
             signed_message = signer.sign(SHA256.new(content.encode("utf8")))
 
@@ -525,32 +530,133 @@ def unfurl_related_field(related_field, sort_field=None):
     return related_field.remote_id
 
 
+def get_follower_inboxes(user) -> list[tuple[Optional[str], str, bool]]:
+    """the shared and personal inboxes of a user's remote followers, and whether
+    they're on bookwyrm; or all remote users', if there's no user"""
+    user_model = apps.get_model("bookwyrm.User", require_ready=True)
+    queryset = user_model.viewer_aware_objects(user).filter(local=False)
+    if user:
+        queryset = queryset.filter(following=user)
+    return list(
+        queryset.distinct().values_list("shared_inbox", "inbox", "bookwyrm_user")
+    )
+
+
+# the server is up, but would like us to try again later
+RETRY_STATUSES = (408, 429)
+
+
+@app.task(queue=BROADCAST)
+def broadcast_task(
+    sender_id: int, activity: str, recipients: list[str], queue: str = BROADCAST
+):
+    """queue up an activity for each server it's going to"""
+    priority = URGENT if queue == BROADCAST else BULK
+    for host, token in delivery_queue.add(sender_id, activity, recipients, priority):
+        deliver_task.apply_async(args=(host, token), queue=BROADCAST)
+
+
 @app.task(queue=BROADCAST)
-def broadcast_task(sender_id: int, activity: str, recipients: list[str]):
-    """the celery task for broadcast"""
+def deliver_task(host: str, token: Optional[str] = None):
+    """send a batch of the activities waiting for a server"""
+    if token and not delivery_queue.is_scheduled(host, token):
+        # another task has taken over this server
+        return
+
+    server_model = apps.get_model("bookwyrm.FederatedServer", require_ready=True)
+    undeliverable = server_model.get_undeliverable_hosts([host])
+    if host in undeliverable:
+        paused_until = undeliverable[host]
+        if paused_until is None:
+            # the server is blocked, so nothing is going to it
+            delivery_queue.clear(host)
+            delivery_queue.reschedule(host, token)
+            return
+        # keep everything for when the pause is over
+        countdown = max(0, math.ceil((paused_until - timezone.now()).total_seconds()))
+        schedule_delivery(host, token, countdown)
+        return
+
+    deliveries = delivery_queue.pop(host, BROADCAST_BATCH_SIZE)
+    if deliveries:
+        send_deliveries(host, deliveries)
+        delivery_queue.finish(host, deliveries)
+
+    # hand over to the next task if there's more to do
+    next_due = delivery_queue.next_due(host)
+    if next_due is None:
+        delivery_queue.reschedule(host, token)
+        return
+    schedule_delivery(host, token, max(0, math.ceil(next_due - time.time())))
+
+
+def schedule_delivery(host: str, token: Optional[str], countdown: int):
+    """start the server's next delivery task, unless another has taken over"""
+    next_token = delivery_queue.reschedule(host, token, countdown)
+    if next_token:
+        deliver_task.apply_async(
+            args=(host, next_token), countdown=countdown, queue=BROADCAST
+        )
+
+
+def send_deliveries(host: str, deliveries: list[Delivery]):
+    """send deliveries to one server, and retry or give up on the ones that fail"""
     user_model = apps.get_model("bookwyrm.User", require_ready=True)
-    sender = user_model.objects.select_related("key_pair").get(id=sender_id)
-    asyncio.run(async_broadcast(recipients, sender, activity))
-
-
-async def async_broadcast(recipients: list[str], sender, data: str):
-    """Send all the broadcasts simultaneously"""
-    timeout = aiohttp.ClientTimeout(total=10)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        tasks = []
-        for recipient in recipients:
-            tasks.append(
-                asyncio.ensure_future(sign_and_send(session, sender, data, recipient))
+    server_model = apps.get_model("bookwyrm.FederatedServer", require_ready=True)
+    senders = user_model.objects.select_related("key_pair").in_bulk(
+        {d.sender_id for d in deliveries}
+    )
+    deliveries = [d for d in deliveries if d.sender_id in senders]
+
+    start = time.monotonic()
+    statuses = broadcast_pool.run(
+        async_broadcast(
+            [(d.inbox, senders[d.sender_id], d.activity) for d in deliveries]
+        )
+    )
+    elapsed = time.monotonic() - start
+
+    retry = []
+    for delivery, status in zip(deliveries, statuses):
+        if status is None or status >= 500 or status in RETRY_STATUSES:
+            retry.append(delivery)
+    # any answer at all means the server is up
+    if any(status is not None and status < 500 for status in statuses):
+        server_model.record_deliveries({host}, set())
+    elif statuses:
+        server_model.record_deliveries(set(), {host})
+
+    failed = sum(1 for status in statuses if status is None or status >= 400)
+    delivery_queue.record(host, len(statuses) - failed, failed, elapsed)
+
+    retry = [d for d in retry if d.attempt < BROADCAST_MAX_RETRIES]
+    if len(retry) < failed:
+        logger.info("Giving up on %d deliveries to %s", failed - len(retry), host)
+    delivery_queue.retry(
+        host, retry, [server_model.get_backoff(d.attempt) for d in retry]
+    )
+
+
+async def async_broadcast(deliveries: list[tuple[str, Any, str]]):
+    """Send all the broadcasts simultaneously, over the worker's shared session"""
+    session = await broadcast_pool.get_session()
+    tasks = []
+    for recipient, sender, data in deliveries:
+        tasks.append(
+            asyncio.ensure_future(
+                broadcast_pool.limited(sign_and_send(session, sender, data, recipient))
             )
+        )
 
-        results = await asyncio.gather(*tasks)
-        return results
+    results = await asyncio.gather(*tasks)
+    return results
 
 
 async def sign_and_send(
     session: aiohttp.ClientSession, sender, data: str, destination: str, **kwargs
-):
-    """Sign the messages and send them in an asynchronous bundle"""
+) -> Optional[int]:
+    """Sign the message and send it, returning the response status, or None if
+    the server couldn't be reached at all"""
     now = http_date()
 
     if not sender.key_pair.private_key:
@@ -577,23 +683,29 @@ async def sign_and_send(
 
     try:
         async with session.post(destination, data=data, headers=headers) as response:
+            status = response.status
             if not response.ok:
-                logger.exception(
+                logger.info(
                     "Failed to send broadcast to %s: %s", destination, response.reason
                 )
-                if kwargs.get("use_legacy_key") is not True:
-                    logger.info("Trying again with legacy keyId header value")
-                    asyncio.ensure_future(
-                        sign_and_send(
-                            session, sender, data, destination, use_legacy_key=True
-                        )
-                    )
-
-            return response
     except asyncio.TimeoutError:
         logger.info("Connection timed out for url: %s", destination)
+        return None
     except aiohttp.ClientError as err:
-        logger.exception(err)
+        logger.info("Connection failed for url %s: %s", destination, err)
+        return None
+
+    # a rejected signature may be for a server that expects the old keyId
+    if (
+        400 <= status < 500
+        and status not in RETRY_STATUSES
+        and kwargs.get("use_legacy_key") is not True
+    ):
+        logger.info("Trying again with legacy keyId header value")
+        return await sign_and_send(
+            session, sender, data, destination, use_legacy_key=True
+        )
+    return status
 
 
 # pylint: disable=unused-argument
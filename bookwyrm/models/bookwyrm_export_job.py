@@ -1,14 +1,17 @@
 """Export user account to tar.gz file for import into another Bookwyrm instance"""
 
+from collections import defaultdict
 import logging
 import os
+from tempfile import TemporaryFile
+from typing import IO
 
 from boto3.session import Session as BotoSession
 from s3_tar import S3Tar
 
-from django.db.models import FileField, JSONField
+from django.db.models import FileField
 from django.core.serializers.json import DjangoJSONEncoder
-from django.core.files.base import ContentFile
+from django.core.files import File
 from django.core.files.storage import storages
 
 from bookwyrm import settings
@@ -23,6 +26,9 @@ from bookwyrm.utils.tar import BookwyrmTarFile
 
 logger = logging.getLogger(__name__)
 
+# how many books' data is looked up together
+EXPORT_BATCH_SIZE = 100
+
 
 class BookwyrmAwsSession(BotoSession):
     """a boto session that always uses settings.AWS_S3_ENDPOINT_URL"""
@@ -41,44 +47,12 @@ class BookwyrmExportJob(ParentJob):
     """entry for a specific request to export a bookwyrm user"""
 
     export_data = FileField(null=True, storage=select_exports_storage)
-    export_json = JSONField(null=True, encoder=DjangoJSONEncoder)
 
     def start_job(self):
         """schedule the first task"""
 
         self.set_status("active")
-        create_export_json_task.delay(job_id=self.id)
-
-
-@app.task(queue=IMPORTS, base=ParentTask)
-def create_export_json_task(**kwargs):
-    """create the JSON data for the export"""
-
-    job = BookwyrmExportJob.objects.get(id=kwargs["job_id"])
-    # don't start the job if it was stopped from the UI
-    if job.status == "stopped":
-        return
-
-    try:
-        # generate JSON
-        data = export_user(job.user)
-        data["settings"] = export_settings(job.user)
-        data["goals"] = export_goals(job.user)
-        data["books"] = export_books(job.user)
-        data["saved_lists"] = export_saved_lists(job.user)
-        data["follows"] = export_follows(job.user)
-        data["blocks"] = export_blocks(job.user)
-        job.export_json = data
-        job.save(update_fields=["export_json"])
-
-        # trigger task to create tar file
-        create_archive_task.delay(job_id=job.id)
-
-    except Exception as err:  # pylint: disable=broad-except
-        logger.exception(
-            "create_export_json_task for job %s failed with error: %s", job.id, err
-        )
-        job.set_status("failed")
+        create_archive_task.delay(job_id=self.id)
 
 
 def archive_file_location(file, directory="") -> str:
@@ -110,56 +84,58 @@ def create_archive_task(**kwargs):
     try:
         export_task_id = str(job.task_id)
         archive_filename = f"{export_task_id}.tar.gz"
-        export_json_bytes = DjangoJSONEncoder().encode(job.export_json).encode("utf-8")
         user = job.user
 
-        if settings.USE_S3:
-            # Storage for writing temporary files
-            exports_storage = storages["exports"]
-
-            # Handle for creating the final archive
-            s3_tar = S3Tar(
-                exports_storage.bucket_name,
-                os.path.join(exports_storage.location, archive_filename),
-                session=BookwyrmAwsSession(),
-            )
-
-            # Save JSON file to a temporary location
-            export_json_tmp_file = os.path.join(export_task_id, "archive.json")
-            exports_storage.save(
-                export_json_tmp_file,
-                ContentFile(export_json_bytes),
-            )
-            s3_tar.add_file(
-                os.path.join(exports_storage.location, export_json_tmp_file)
-            )
-
-            # Add avatar to TAR
-            images_storage = storages["default"]
-
-            if user.avatar:
-                add_file_to_s3_tar(s3_tar, images_storage, user.avatar)
-
-            # Create archive and store file name
-            s3_tar.tar()
-            job.export_data = archive_filename
-            job.save(update_fields=["export_data"])
-
-            # Delete temporary files
-            exports_storage.delete(export_json_tmp_file)
-
-        else:
-            job.export_data = archive_filename
-            with job.export_data.open("wb") as tar_file:
-                with BookwyrmTarFile.open(mode="w:gz", fileobj=tar_file) as tar:
-                    # save json file
-                    tar.write_bytes(export_json_bytes)
-
-                    # Add avatar image if present
-                    if user.avatar:
-                        tar.add_image(user.avatar)
-
-            job.save(update_fields=["export_data"])
+        # the json goes to a temporary file on disk as it's generated, and is
+        # copied into the archive from there
+        with TemporaryFile() as export_json_file:
+            write_export_json(user, export_json_file)
+
+            if settings.USE_S3:
+                # Storage for writing temporary files
+                exports_storage = storages["exports"]
+
+                # Handle for creating the final archive
+                s3_tar = S3Tar(
+                    exports_storage.bucket_name,
+                    os.path.join(exports_storage.location, archive_filename),
+                    session=BookwyrmAwsSession(),
+                )
+
+                # Save JSON file to a temporary location
+                export_json_tmp_file = os.path.join(export_task_id, "archive.json")
+                export_json_file.seek(0)
+                exports_storage.save(export_json_tmp_file, File(export_json_file))
+                s3_tar.add_file(
+                    os.path.join(exports_storage.location, export_json_tmp_file)
+                )
+
+                # Add avatar to TAR
+                images_storage = storages["default"]
+
+                if user.avatar:
+                    add_file_to_s3_tar(s3_tar, images_storage, user.avatar)
+
+                # Create archive and store file name
+                s3_tar.tar()
+                job.export_data = archive_filename
+                job.save(update_fields=["export_data"])
+
+                # Delete temporary files
+                exports_storage.delete(export_json_tmp_file)
+
+            else:
+                job.export_data = archive_filename
+                with job.export_data.open("wb") as tar_file:
+                    with BookwyrmTarFile.open(mode="w:gz", fileobj=tar_file) as tar:
+                        # save json file
+                        tar.write_file(export_json_file)
+
+                        # Add avatar image if present
+                        if user.avatar:
+                            tar.add_image(user.avatar)
+
+                job.save(update_fields=["export_data"])
 
         job.complete_job()
 
@@ -170,6 +146,27 @@ def create_archive_task(**kwargs):
         job.set_status("failed")
 
 
+def write_export_json(user: User, output: IO[bytes]):
+    """write the export JSON a book at a time, so that it doesn't all have to
+    be held in memory for accounts with a lot of books"""
+    encoder = DjangoJSONEncoder()
+    data = export_user(user)
+    data["settings"] = export_settings(user)
+    data["goals"] = export_goals(user)
+    data["saved_lists"] = export_saved_lists(user)
+    data["follows"] = export_follows(user)
+    data["blocks"] = export_blocks(user)
+
+    # everything but the books is small, so the books go in before the last brace
+    output.write(encoder.encode(data)[:-1].encode("utf-8"))
+    output.write(b', "books": [')
+    for index, book in enumerate(export_books(user)):
+        if index:
+            output.write(b", ")
+        output.write(encoder.encode(book).encode("utf-8"))
+    output.write(b"]}")
+
+
 def export_user(user: User):
     """export user data"""
     data = user.to_activity()
@@ -220,12 +217,76 @@ def export_goals(user: User):
 
 
 def export_books(user: User):
-    """add books to export JSON"""
-    editions = get_books_for_user(user)
-    return [export_book(user, edition) for edition in editions]
+    """the export JSON for each of the user's books, looking them up in batches"""
+    edition_ids = list(get_books_for_user(user).values_list("id", flat=True))
+    for start in range(0, len(edition_ids), EXPORT_BATCH_SIZE):
+        batch = edition_ids[start : start + EXPORT_BATCH_SIZE]
+        editions = (
+            Edition.objects.filter(id__in=batch)
+            .select_related("parent_work", "parent_work__last_edited_by")
+            .select_related("last_edited_by")
+            .prefetch_related("authors")
+            .order_by("id")
+        )
+        related = get_related_for_books(user, batch)
+        for edition in editions:
+            yield export_book(
+                edition, **{key: rows[edition.id] for key, rows in related.items()}
+            )
 
 
-def export_book(user: User, edition: Edition):
+def get_related_for_books(user: User, edition_ids):
+    """everything the user has done with a batch of books, by edition id, in one
+    query for each kind of thing instead of one per book"""
+    statuses = {"deleted": False, "user": user, "book__in": edition_ids}
+    status_related = ("user", "book", "reply_parent")
+    status_prefetch = (
+        "mention_users",
+        "mention_books",
+        "mention_hashtags",
+        "attachments",
+    )
+    querysets = {
+        "shelf_books": ShelfBook.objects.select_related("shelf", "shelf__user").filter(
+            user=user, book__in=edition_ids
+        ),
+        "list_items": ListItem.objects.select_related(
+            "book_list", "book_list__user", "book", "user"
+        ).filter(user=user, book__in=edition_ids),
+        "comments": Comment.objects.filter(**statuses)
+        .select_related(*status_related)
+        .prefetch_related(*status_prefetch),
+        "quotations": Quotation.objects.filter(**statuses)
+        .select_related(*status_related)
+        .prefetch_related(*status_prefetch),
+        "reviews": Review.objects.filter(**statuses)
+        .select_related(*status_related)
+        .prefetch_related(*status_prefetch),
+    }
+    related = {key: defaultdict(list) for key in [*querysets, "readthroughs"]}
+    for key, queryset in querysets.items():
+        for row in queryset:
+            related[key][row.book_id].append(row)
+
+    # readthroughs can't be serialized to activity
+    for readthrough in ReadThrough.objects.filter(
+        user=user, book__in=edition_ids
+    ).values():
+        related["readthroughs"][readthrough["book_id"]].append(readthrough)
+    return related
+
+
+# pylint: disable=too-many-arguments
+def export_book(
+    edition: Edition,
+    *,
+    shelf_books,
+    list_items,
+    comments,
+    quotations,
+    reviews,
+    readthroughs,
+):
     """add book to export JSON"""
     data = {}
     data["work"] = edition.parent_work.to_activity()
@@ -241,18 +302,11 @@ def export_book(user: User, edition: Edition):
 
     # Shelves this book is on
     # Every ShelfItem is this book so we don't other serializing
-    shelf_books = (
-        ShelfBook.objects.select_related("shelf")
-        .filter(user=user, book=edition)
-        .distinct()
-    )
     data["shelves"] = [shelfbook.shelf.to_activity() for shelfbook in shelf_books]
 
     # Lists and ListItems
     # ListItems include "notes" and "approved" so we need them
     # even though we know it's this book
-    list_items = ListItem.objects.filter(book=edition, user=user).distinct()
-
     data["lists"] = []
     for item in list_items:
         list_info = item.book_list.to_activity()
@@ -263,35 +317,24 @@ def export_book(user: User, edition: Edition):
         data["lists"].append(list_info)
 
     # Statuses
-    # Can't use select_subclasses here because
-    # we need to filter on the "book" value,
-    # which is not available on an ordinary Status
-    for status in ["comments", "quotations", "reviews"]:
-        data[status] = []
-
-    comments = Comment.objects.filter(user=user, book=edition, deleted=False).all()
+    data["comments"] = []
     for status in comments:
         obj = status.to_activity()
         obj["progress"] = status.progress
         obj["progress_mode"] = status.progress_mode
         data["comments"].append(obj)
 
-    quotes = Quotation.objects.filter(user=user, book=edition, deleted=False).all()
-    for status in quotes:
+    data["quotations"] = []
+    for status in quotations:
         obj = status.to_activity()
         obj["position"] = status.position
         obj["endposition"] = status.endposition
         obj["position_mode"] = status.position_mode
         data["quotations"].append(obj)
 
-    reviews = Review.objects.filter(user=user, book=edition, deleted=False).all()
     data["reviews"] = [status.to_activity() for status in reviews]
 
-    # readthroughs can't be serialized to activity
-    book_readthroughs = (
-        ReadThrough.objects.filter(user=user, book=edition).distinct().values()
-    )
-    data["readthroughs"] = list(book_readthroughs)
+    data["readthroughs"] = readthroughs
     return data
 
 
@@ -1,12 +1,28 @@
 """ connections to external ActivityPub servers """
+from datetime import datetime, timedelta
+from typing import Optional
 from urllib.parse import urlparse
 
 from django.apps import apps
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from bookwyrm import settings
 from .base_model import BookWyrmModel
 
+
+def reload_connectors():
+    """updating connectors doesn't send the signal that reloads them, so every
+    process is told to now and once the change is saved"""
+    # pylint: disable-next=import-outside-toplevel
+    from bookwyrm.connectors.connector_manager import connector_registry
+
+    connector_registry.invalidate()
+    transaction.on_commit(connector_registry.invalidate)
+
+
 FederationStatus = [
     ("federated", _("Federated")),
     ("blocked", _("Blocked")),
@@ -24,6 +40,9 @@ class FederatedServer(BookWyrmModel):
     application_type = models.CharField(max_length=255, null=True, blank=True)
     application_version = models.CharField(max_length=255, null=True, blank=True)
     notes = models.TextField(null=True, blank=True)
+    # broadcasts in a row that the server didn't accept, and when to try again
+    delivery_failures = models.IntegerField(default=0)
+    delivery_paused_until = models.DateTimeField(null=True, blank=True)
 
     def block(self):
         """block a server"""
@@ -34,6 +53,7 @@ class FederatedServer(BookWyrmModel):
         self.user_set.filter(is_active=True).update(
             is_active=False, deactivation_reason="domain_block"
         )
+        apps.get_model("bookwyrm.User").clear_follower_inboxes(self.user_set.all())
 
         # check for related connectors
         if self.application_type == "bookwyrm":
@@ -41,6 +61,7 @@ class FederatedServer(BookWyrmModel):
             connector_model.objects.filter(
                 identifier=self.server_name, active=True
             ).update(active=False, deactivation_reason="domain_block")
+            reload_connectors()
 
     def unblock(self):
         """unblock a server"""
@@ -50,6 +71,7 @@ class FederatedServer(BookWyrmModel):
         self.user_set.filter(deactivation_reason="domain_block").update(
             is_active=True, deactivation_reason=None
         )
+        apps.get_model("bookwyrm.User").clear_follower_inboxes(self.user_set.all())
 
         # check for related connectors
         if self.application_type == "bookwyrm":
@@ -59,9 +81,60 @@ class FederatedServer(BookWyrmModel):
                 active=False,
                 deactivation_reason="domain_block",
             ).update(active=True, deactivation_reason=None)
+            reload_connectors()
 
     @classmethod
     def is_blocked(cls, url: str) -> bool:
         """look up if a domain is blocked"""
         url = urlparse(url)
         return cls.objects.filter(server_name=url.hostname, status="blocked").exists()
+
+    @classmethod
+    def get_undeliverable_hosts(cls, hosts) -> dict[str, Optional[datetime]]:
+        """which of these servers aren't being delivered to: blocked servers, with
+        no end, and paused ones, with when they can be tried again"""
+        return {
+            server_name: None if status == "blocked" else paused_until
+            for server_name, status, paused_until in cls.objects.filter(
+                server_name__in=hosts
+            )
+            .filter(Q(status="blocked") | Q(delivery_paused_until__gt=timezone.now()))
+            .values_list("server_name", "status", "delivery_paused_until")
+        }
+
+    @classmethod
+    def record_deliveries(cls, reachable, unreachable):
+        """reset the servers that answered, and count another failure for the
+        servers that didn't, pausing delivery to any that keep failing"""
+        if reachable:
+            cls.objects.filter(server_name__in=reachable).filter(
+                Q(delivery_failures__gt=0) | Q(delivery_paused_until__isnull=False)
+            ).update(delivery_failures=0, delivery_paused_until=None)
+
+        unreachable = set(unreachable) - set(reachable)
+        if not unreachable:
+            return
+        cls.objects.filter(server_name__in=unreachable).update(
+            delivery_failures=F("delivery_failures") + 1
+        )
+        now = timezone.now()
+        paused = []
+        for server in cls.objects.filter(
+            server_name__in=unreachable,
+            delivery_failures__gte=settings.BROADCAST_FAILURE_THRESHOLD,
+        ):
+            # each failure once the circuit is open doubles the pause
+            attempt = server.delivery_failures - settings.BROADCAST_FAILURE_THRESHOLD
+            server.delivery_paused_until = now + timedelta(
+                seconds=cls.get_backoff(attempt)
+            )
+            paused.append(server)
+        cls.objects.bulk_update(paused, ["delivery_paused_until"])
+
+    @staticmethod
+    def get_backoff(attempt: int) -> int:
+        """seconds to wait before the next try, doubling with every attempt"""
+        return min(
+            settings.BROADCAST_RETRY_DELAY * 2 ** min(attempt, 32),
+            settings.BROADCAST_MAX_BACKOFF,
+        )
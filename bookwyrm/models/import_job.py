@@ -1,14 +1,20 @@
 """ track progress of goodreads imports """
 from datetime import datetime
+import logging
 import math
 import re
 import dateutil.parser
 
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.files.storage import storages
 from django.db import models
+from django.db.models import F
+from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from model_utils import FieldTracker
 
+from bookwyrm import book_search
 from bookwyrm.connectors import connector_manager
 from bookwyrm.models import (
     User,
@@ -24,6 +30,11 @@ from bookwyrm.models import (
 from bookwyrm.tasks import app, IMPORT_TRIGGERED, IMPORTS
 from .fields import PrivacyLevels
 
+logger = logging.getLogger(__name__)
+
+# how many items each import task resolves together
+IMPORT_BATCH_SIZE = 50
+
 
 def unquote_string(text):
     """resolve csv quote weirdness"""
@@ -45,6 +56,20 @@ def construct_search_term(title, author):
     return " ".join([title, author])
 
 
+def get_item_counts(book_id, fail_reason):
+    """which of a job's running totals an item counts towards"""
+    return {
+        "items_succeeded": int(book_id is not None),
+        "items_failed": int(fail_reason is not None),
+        "items_pending": int(book_id is None and fail_reason is None),
+    }
+
+
+def select_imports_storage():
+    """callable to allow for dependency on runtime configuration"""
+    return storages["exports"]
+
+
 ImportStatuses = [
     ("pending", _("Pending")),
     ("active", _("Active")),
@@ -66,12 +91,24 @@ class ImportJob(models.Model):
     privacy = models.CharField(max_length=255, default="public", choices=PrivacyLevels)
     retry = models.BooleanField(default=False)
     task_id = models.CharField(max_length=200, null=True, blank=True)
+    # an uploaded csv that hasn't been read into items yet
+    source_file = models.FileField(
+        null=True, blank=True, storage=select_imports_storage, upload_to="imports/"
+    )
+    # why the file couldn't all be read
+    fail_reason = models.TextField(null=True, blank=True)
 
     complete = models.BooleanField(default=False)
     status = models.CharField(
         max_length=50, choices=ImportStatuses, default="pending", null=True
     )
 
+    # running totals of the items, so progress doesn't mean counting them
+    items_total = models.IntegerField(default=0)
+    items_pending = models.IntegerField(default=0)
+    items_succeeded = models.IntegerField(default=0)
+    items_failed = models.IntegerField(default=0)
+
     def start_job(self):
         """Report that the job has started"""
         task = start_import_task.delay(self.id)
@@ -83,7 +120,7 @@ class ImportJob(models.Model):
         """Report that the job has completed"""
         self.status = "complete"
         self.complete = True
-        self.pending_items.update(fail_reason=_("Import stopped"))
+        self.stop_pending_items()
         self.save(update_fields=["status", "complete"])
 
     def stop_job(self):
@@ -91,15 +128,30 @@ class ImportJob(models.Model):
         self.status = "stopped"
         self.complete = True
         self.save(update_fields=["status", "complete"])
-        self.pending_items.update(fail_reason=_("Import stopped"))
+        self.stop_pending_items()
 
         # stop starting
         app.control.revoke(self.task_id, terminate=True)
-        tasks = self.pending_items.filter(task_id__isnull=False).values_list(
-            "task_id", flat=True
+        tasks = (
+            self.pending_items.filter(task_id__isnull=False)
+            .values_list("task_id", flat=True)
+            .distinct()
         )
         app.control.revoke(list(tasks))
 
+    def stop_pending_items(self):
+        """give up on the items that haven't been processed yet"""
+        stopped = self.pending_items.update(fail_reason=_("Import stopped"))
+        ImportJob.add_to_counts(self.id, items_pending=-stopped, items_failed=stopped)
+
+    @classmethod
+    def add_to_counts(cls, job_id: int, **counts: int) -> None:
+        """atomically change a job's running totals as its items are saved, so
+        tasks working on the same job don't overwrite each other's progress"""
+        changes = {field: F(field) + value for field, value in counts.items() if value}
+        if changes:
+            cls.objects.filter(id=job_id).update(updated_date=timezone.now(), **changes)
+
     @property
     def pending_items(self):
         """items that haven't been processed yet"""
@@ -108,7 +160,7 @@ class ImportJob(models.Model):
     @property
     def item_count(self):
         """How many books do you want to import???"""
-        return self.items.count()
+        return self.items_total
 
     @property
     def percent_complete(self):
@@ -121,17 +173,17 @@ class ImportJob(models.Model):
     @property
     def pending_item_count(self):
         """And how many pending items??"""
-        return self.pending_items.count()
+        return self.items_pending
 
     @property
     def successful_item_count(self):
         """How many found a book?"""
-        return self.items.filter(book__isnull=False).count()
+        return self.items_succeeded
 
     @property
     def failed_item_count(self):
         """How many found a book?"""
-        return self.items.filter(fail_reason__isnull=False).count()
+        return self.items_failed
 
 
 class ImportItem(models.Model):
@@ -155,15 +207,17 @@ class ImportItem(models.Model):
     )
     task_id = models.CharField(max_length=200, null=True, blank=True)
 
+    field_tracker = FieldTracker(fields=["book", "fail_reason"])
+
     def update_job(self):
         """let the job know when the items get work done"""
         job = self.job
         if job.complete:
             return
 
-        job.updated_date = timezone.now()
-        job.save()
-        if not job.pending_items.exists() and not job.complete:
+        # the totals are kept up to date as items are saved
+        job.refresh_from_db(fields=["complete", "items_pending"])
+        if not job.items_pending and not job.complete:
             job.complete_job()
 
     def resolve(self):
@@ -345,6 +399,27 @@ class ImportItem(models.Model):
         )
 
 
+# pylint: disable=unused-argument
+@receiver(models.signals.post_save, sender=ImportItem)
+def update_job_counts(sender, instance, created, *args, **kwargs):
+    """keep the job's running totals in step with its items"""
+    counts = get_item_counts(instance.book_id, instance.fail_reason)
+    if created:
+        ImportJob.add_to_counts(instance.job_id, items_total=1, **counts)
+        return
+
+    tracker = instance.field_tracker
+    if not tracker.has_changed("book") and not tracker.has_changed("fail_reason"):
+        return
+    previous = get_item_counts(
+        tracker.previous("book"), tracker.previous("fail_reason")
+    )
+    ImportJob.add_to_counts(
+        instance.job_id,
+        **{field: count - previous[field] for field, count in counts.items()},
+    )
+
+
 @app.task(queue=IMPORTS)
 def start_import_task(job_id):
     """trigger the child tasks for each row"""
@@ -355,13 +430,122 @@ def start_import_task(job_id):
     if job.complete:
         return
 
-    # these are sub-tasks so that one big task doesn't use up all the memory in celery
-    for item in job.items.all():
-        task = import_item_task.delay(item.id)
-        item.task_id = task.id
+    if job.source_file:
+        # pylint: disable-next=import-outside-toplevel
+        from bookwyrm.importers import importers
+
+        importers[job.source]().read_job_file(job)
+        if job.complete:
+            return
+
+    # these are sub-tasks so that one big task doesn't use up all the memory in
+    # celery, and each resolves a batch of items so their searches can be shared
+    item_ids = list(job.items.order_by("index").values_list("id", flat=True))
+    for start in range(0, len(item_ids), IMPORT_BATCH_SIZE):
+        batch = item_ids[start : start + IMPORT_BATCH_SIZE]
+        task = import_items_task.delay(batch)
+        ImportItem.objects.filter(id__in=batch).update(task_id=task.id)
+
+
+@app.task(queue=IMPORTS)
+def import_items_task(item_ids):
+    """resolve a batch of rows into books"""
+    items = list(
+        ImportItem.objects.filter(id__in=item_ids)
+        .select_related("job", "job__user")
+        .order_by("index")
+    )
+    # make sure the job has not been stopped
+    if not items or items[0].job.complete:
+        return
+
+    try:
+        errors = resolve_items(items)
+    except Exception:  # pylint: disable=broad-except
+        # the whole batch's searches failed, so whatever wasn't found already
+        # is an error, and the job carries on
+        logger.exception("Error resolving import items %s", item_ids)
+        errors = {item for item in items if not item.book}
+    for item in items:
+        if item in errors:
+            item.fail_reason = _("Error loading book")
+        elif item.book:
+            # shelves book and handles reviews
+            try:
+                handle_imported_book(item)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Error importing item %s", item.id)
+                item.fail_reason = _("Error loading book")
+        else:
+            item.fail_reason = _("Could not find a match for book")
         item.save()
-    job.status = "active"
-    job.save()
+    items[0].update_job()
+
+
+def resolve_items(items):
+    """look up the books for a batch of items together, like resolve: all the
+    identifiers locally in one query, then the rest remotely all at once.
+    returns the items that couldn't be loaded"""
+    identifiers, titles = resolve_items_locally(items)
+
+    remote = {}
+    if identifiers:
+        remote.update(
+            connector_manager.search_many(
+                list(set(identifiers.values())), min_confidence=0.999
+            )
+        )
+    if titles:
+        remote.update(
+            connector_manager.search_many(
+                list(set(titles.values())), min_confidence=0.1
+            )
+        )
+
+    errors = set()
+    for item, query in [*identifiers.items(), *titles.items()]:
+        if not (search_result := remote.get(query)):
+            continue
+        try:
+            book = search_result.connector.get_or_create_book(search_result.key)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Error loading book for import item %s", item.id)
+            errors.add(item)
+            continue
+        # only a confident title match counts, otherwise it's just a guess
+        if item in identifiers or search_result.confidence > 0.999:
+            item.book = book
+        else:
+            item.book_guess = book
+    return errors
+
+
+def resolve_items_locally(items):
+    """find what books we can for the items in the database, and give back the
+    searches still to be done for the rest, by identifier and by title"""
+    identifiers = {}
+    titles = {}
+    for item in items:
+        if item.book:
+            continue
+        if identifier := item.isbn or item.openlibrary_key:
+            identifiers[item] = identifier
+        elif item.title:
+            search_term = construct_search_term(item.title, item.author)
+            # title searches can't be batched locally
+            if book := book_search.search(
+                search_term, min_confidence=0.1, return_first=True
+            ):
+                item.book = book
+            else:
+                titles[item] = search_term
+
+    local = book_search.search_identifiers_many(identifiers.values())
+    for item, identifier in list(identifiers.items()):
+        if identifier in local:
+            item.book = local[identifier]
+            del identifiers[item]
+    return identifiers, titles
 
 
 @app.task(queue=IMPORTS)
@@ -1,7 +1,12 @@
 """ alert a user to activity """
 from django.db import models, transaction
+from django.db.models import Count, Q
 from django.dispatch import receiver
+from model_utils import FieldTracker
+import redis
+
 from bookwyrm.models.bookwyrm_export_job import BookwyrmExportJob
+from bookwyrm.redis_store import r
 from .base_model import BookWyrmModel
 from . import (
     Boost,
@@ -56,6 +61,15 @@ class NotificationType(models.TextChoices):
     MOVE = "MOVE"
 
 
+# unread notifications of these types get the notification badge highlighted
+MENTION_TYPES = [
+    NotificationType.REPLY,
+    NotificationType.MENTION,
+    NotificationType.TAG,
+    NotificationType.REPORT,
+]
+
+
 class Notification(BookWyrmModel):
     """a notification object"""
 
@@ -83,6 +97,85 @@ class Notification(BookWyrmModel):
     related_link_domains = models.ManyToManyField("LinkDomain")
     related_invite_requests = models.ManyToManyField("InviteRequest")
 
+    field_tracker = FieldTracker(fields=["read"])
+
+    # unread counts are kept in redis so that polling for them doesn't touch
+    # the database, and they expire so any drift is counted away within a day
+    unread_count_ttl = 60 * 60 * 24
+
+    @staticmethod
+    def unread_count_ids(user_id):
+        """the redis keys for a user's unread total and unread mentions"""
+        return [f"{user_id}-unread-notifications", f"{user_id}-unread-mentions"]
+
+    @classmethod
+    def count_unread(cls, user_id):
+        """the user's unread notifications and mentions, from the database"""
+        counts = cls.objects.filter(user_id=user_id, read=False).aggregate(
+            total=Count("id"),
+            mentions=Count("id", filter=Q(notification_type__in=MENTION_TYPES)),
+        )
+        return counts["total"], counts["mentions"]
+
+    @classmethod
+    def get_unread_counts(cls, user_id):
+        """the user's unread notifications and mentions"""
+        try:
+            counts = r.mget(cls.unread_count_ids(user_id))
+        except redis.exceptions.ConnectionError:
+            return cls.count_unread(user_id)
+        if None in counts:
+            return cls.refresh_unread_counts(user_id)
+        return tuple(max(int(count), 0) for count in counts)
+
+    @classmethod
+    def refresh_unread_counts(cls, user_id):
+        """count the user's unread notifications again"""
+        counts = cls.count_unread(user_id)
+        pipeline = r.pipeline()
+        for key, count in zip(cls.unread_count_ids(user_id), counts):
+            pipeline.set(key, count, ex=cls.unread_count_ttl)
+        pipeline.execute()
+        return counts
+
+    @classmethod
+    def change_unread_counts(cls, user_id, total, mentions=0):
+        """add to or take away from a user's unread counts"""
+        changes = [
+            (key, amount)
+            for key, amount in zip(cls.unread_count_ids(user_id), (total, mentions))
+            if amount
+        ]
+        if not changes:
+            return
+        keys = [key for key, _ in changes]
+        pipeline = r.pipeline()
+        for key, amount in changes:
+            pipeline.incrby(key, amount)
+            pipeline.ttl(key)
+        results = pipeline.execute()
+        # a key with no expiry was just created by incrby, which means it had
+        # expired, so it's only counting this one change. it'll be recounted
+        stale = [key for key, ttl in zip(keys, results[1::2]) if ttl == -1]
+        if stale:
+            r.delete(*stale)
+
+    @classmethod
+    def mark_read(cls, notifications):
+        """mark a user's notifications read, without the signals for each one"""
+        unread = [n for n in notifications if not n.read]
+        if not unread:
+            return
+        mention_ids = [n.id for n in unread if n.notification_type in MENTION_TYPES]
+        other_ids = [n.id for n in unread if n.notification_type not in MENTION_TYPES]
+        # count what actually changed, in case another request got there first
+        mentions = cls.objects.filter(id__in=mention_ids, read=False).update(read=True)
+        others = cls.objects.filter(id__in=other_ids, read=False).update(read=True)
+        user_id = unread[0].user_id
+        transaction.on_commit(
+            lambda: cls.change_unread_counts(user_id, -mentions - others, -mentions)
+        )
+
     @classmethod
     @transaction.atomic
     def notify(cls, user, related_user, **kwargs):
@@ -129,6 +222,37 @@ class Notification(BookWyrmModel):
             notification.delete()
 
 
+@receiver(models.signals.post_save, sender=Notification)
+# pylint: disable=unused-argument
+def update_unread_counts_on_save(sender, instance, created, *args, **kwargs):
+    """a new notification, or one that's been read or unread"""
+    # the tracker has no previous value until the save that created the
+    # notification is done, including any saves nested in its signals
+    previous = instance.field_tracker.previous("read")
+    if created and not instance.read:
+        amount = 1
+    elif previous is not None and previous != instance.read:
+        amount = -1 if instance.read else 1
+    else:
+        return
+    mentions = amount if instance.notification_type in MENTION_TYPES else 0
+    transaction.on_commit(
+        lambda: Notification.change_unread_counts(instance.user_id, amount, mentions)
+    )
+
+
+@receiver(models.signals.post_delete, sender=Notification)
+# pylint: disable=unused-argument
+def update_unread_counts_on_delete(sender, instance, *args, **kwargs):
+    """an unread notification went away"""
+    if instance.read:
+        return
+    mentions = -1 if instance.notification_type in MENTION_TYPES else 0
+    transaction.on_commit(
+        lambda: Notification.change_unread_counts(instance.user_id, -1, mentions)
+    )
+
+
 @receiver(models.signals.post_save, sender=Favorite)
 # pylint: disable=unused-argument
 def notify_on_fav(sender, instance, *args, **kwargs):
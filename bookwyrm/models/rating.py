@@ -0,0 +1,157 @@
+""" the overall rating of a work, kept up to date as reviews change """
+from decimal import Decimal
+
+from django.contrib.postgres.fields import ArrayField
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Count
+from django.dispatch import receiver
+
+from .status import Review
+
+# ratings are in half stars, from 0.5 to 5
+HISTOGRAM_SIZE = 10
+# averages are kept in the cache too, since every book in the feed shows one
+RATING_CACHE_TIMEOUT = 15552000
+
+
+def get_rating_cache_key(work_id):
+    """where a work's average rating is cached"""
+    return f"book-rating-{work_id}"
+
+
+def empty_histogram():
+    """no ratings in any half star"""
+    return [0] * HISTOGRAM_SIZE
+
+
+class WorkRating(models.Model):
+    """how people have rated a work, across all its editions, so the average
+    doesn't have to be worked out from every review each time it's shown"""
+
+    work = models.OneToOneField(
+        "Work",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="aggregate_rating",
+    )
+    rating_count = models.IntegerField(default=0)
+    rating_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # how many ratings there are of each half star
+    histogram = ArrayField(models.IntegerField(), default=empty_histogram)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    @property
+    def average(self):
+        """the mean rating, or 0 if no one has rated it"""
+        if not self.rating_count:
+            return 0
+        return self.rating_total / self.rating_count
+
+    @classmethod
+    def refresh(cls, work_ids):
+        """count up the ratings of these works again"""
+        ratings = {
+            work_id: cls(work_id=work_id, rating_total=Decimal(0))
+            for work_id in set(work_ids)
+        }
+        if not ratings:
+            return {}
+        counts = (
+            Review.objects.filter(
+                book__parent_work_id__in=ratings.keys(),
+                deleted=False,
+                rating__gt=0,
+            )
+            .order_by()
+            .values_list("book__parent_work_id", "rating")
+            .annotate(count=Count("id"))
+        )
+        for work_id, rating, count in counts:
+            work_rating = ratings[work_id]
+            work_rating.rating_count += count
+            work_rating.rating_total += rating * count
+            star = min(max(int(rating * 2), 1), HISTOGRAM_SIZE)
+            work_rating.histogram[star - 1] += count
+
+        cls.objects.bulk_create(
+            ratings.values(),
+            update_conflicts=True,
+            unique_fields=["work"],
+            update_fields=["rating_count", "rating_total", "histogram", "updated_date"],
+        )
+        cache.set_many(
+            {
+                get_rating_cache_key(work_id): rating.average
+                for work_id, rating in ratings.items()
+            },
+            timeout=RATING_CACHE_TIMEOUT,
+        )
+        return ratings
+
+    @classmethod
+    def get_ratings(cls, books):
+        """the average ratings of a page of books, by book id, from the cache
+        or the database, counting up any works that haven't been yet"""
+        work_ids = {
+            book.id: book.parent_work_id
+            for book in books
+            if getattr(book, "parent_work_id", None)
+        }
+        keys = {get_rating_cache_key(work_id): work_id for work_id in work_ids.values()}
+        averages = {keys[key]: value for key, value in cache.get_many(keys).items()}
+
+        if missing := set(keys.values()) - averages.keys():
+            ratings = cls.objects.in_bulk(missing)
+            for work_id, rating in ratings.items():
+                # added rather than set, so this can't overwrite a newer refresh
+                cache.add(
+                    get_rating_cache_key(work_id),
+                    rating.average,
+                    timeout=RATING_CACHE_TIMEOUT,
+                )
+            if uncounted := missing - ratings.keys():
+                ratings.update(cls.refresh(uncounted))
+            averages.update(
+                {work_id: rating.average for work_id, rating in ratings.items()}
+            )
+        return {book_id: averages[work_id] for book_id, work_id in work_ids.items()}
+
+
+# pylint: disable=unused-argument
+@receiver(models.signals.post_save)
+def update_rating_on_save(sender, instance, created, *args, **kwargs):
+    """a rating was added, changed, or deleted"""
+    if not issubclass(sender, Review):
+        return
+    if created:
+        if not instance.rating:
+            return
+    # statuses save a second time while they're created, which isn't a change
+    elif instance.field_tracker.previous("deleted") is None or not any(
+        instance.field_tracker.has_changed(field) for field in ("rating", "deleted")
+    ):
+        return
+    refresh_rating_on_commit(instance)
+
+
+@receiver(models.signals.post_delete)
+def update_rating_on_delete(sender, instance, *args, **kwargs):
+    """a rating went away entirely"""
+    if not issubclass(sender, Review) or not instance.rating:
+        return
+    refresh_rating_on_commit(instance)
+
+
+def refresh_rating_on_commit(review):
+    """count up the work's ratings again once the change is saved, and only
+    then forget the user's rating, so it can't be cached again from before"""
+    user_rating_key = f"user-rating-{review.user_id}-{review.book_id}"
+    work_id = review.book.parent_work_id
+
+    def refresh():
+        cache.delete(user_rating_key)
+        if work_id:
+            WorkRating.refresh([work_id])
+
+    transaction.on_commit(refresh)
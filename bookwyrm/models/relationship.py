@@ -233,5 +233,7 @@ def clear_cache(user_subject, user_object):
         [
             f"cached-relationship-{user_subject.id}-{user_object.id}",
             f"cached-relationship-{user_object.id}-{user_subject.id}",
+            f"follower-inboxes-{user_subject.id}",
+            f"follower-inboxes-{user_object.id}",
         ]
     )
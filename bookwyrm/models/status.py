@@ -4,7 +4,6 @@ from typing import Optional, Iterable
 import re
 
 from django.apps import apps
-from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
@@ -434,7 +433,7 @@ class Review(BookStatus):
         max_digits=3,
     )
 
-    field_tracker = FieldTracker(fields=["rating"])
+    field_tracker = FieldTracker(fields=["rating", "deleted"])
 
     @property
     def pure_name(self):
@@ -459,13 +458,6 @@ class Review(BookStatus):
     activity_serializer = activitypub.Review
     pure_type = "Article"
 
-    def save(self, *args, **kwargs):
-        """clear rating caches"""
-        super().save(*args, **kwargs)
-
-        if self.book.parent_work:
-            cache.delete(f"book-rating-{self.book.parent_work.id}")
-
 
 class ReviewRating(Review):
     """a subtype of review that only contains a rating"""
@@ -540,8 +532,6 @@ def preview_image(instance, sender, *args, **kwargs):
     if not ENABLE_PREVIEW_IMAGES or sender not in (Review, ReviewRating):
         return
 
-    changed_fields = instance.field_tracker.changed()
-
-    if len(changed_fields) > 0:
+    if instance.field_tracker.has_changed("rating"):
         edition = instance.book
         generate_edition_preview_image_task.delay(edition.id)
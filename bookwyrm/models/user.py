@@ -11,6 +11,7 @@ from django.apps import apps
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.contrib.postgres.fields import ArrayField as DjangoArrayField
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied, ObjectDoesNotExist
 from django.dispatch import receiver
 from django.db import models, transaction, IntegrityError
@@ -24,7 +25,7 @@ from bookwyrm.models.shelf import Shelf
 from bookwyrm.models.status import Status
 from bookwyrm.preview_images import generate_user_preview_image_task
 from bookwyrm.settings import BASE_URL, ENABLE_PREVIEW_IMAGES, LANGUAGES
-from bookwyrm.signatures import create_key_pair
+from bookwyrm.signatures import create_key_pair, forget_signers
 from bookwyrm.tasks import app, MISC
 from bookwyrm.utils import regex
 from bookwyrm.utils.db import add_update_fields
@@ -191,7 +192,17 @@ class User(OrderedCollectionPageMixin, AbstractUser):
 
     name_field = "username"
     property_fields = [("following_link", "following")]
-    field_tracker = FieldTracker(fields=["name", "avatar"])
+    field_tracker = FieldTracker(
+        fields=[
+            "name",
+            "avatar",
+            "inbox",
+            "shared_inbox",
+            "is_active",
+            "bookwyrm_user",
+            "discoverable",
+        ]
+    )
 
     # two factor authentication
     two_factor_auth = models.BooleanField(default=None, blank=True, null=True)
@@ -243,15 +254,14 @@ class User(OrderedCollectionPageMixin, AbstractUser):
     @property
     def unread_notification_count(self):
         """count of notifications, for the templates"""
-        return self.notification_set.filter(read=False).count()
+        notification_model = apps.get_model("bookwyrm.Notification")
+        return notification_model.get_unread_counts(self.id)[0]
 
     @property
     def has_unread_mentions(self):
         """whether any of the unread notifications are conversations"""
-        return self.notification_set.filter(
-            read=False,
-            notification_type__in=["REPLY", "MENTION", "TAG", "REPORT"],
-        ).exists()
+        notification_model = apps.get_model("bookwyrm.Notification")
+        return notification_model.get_unread_counts(self.id)[1] > 0
 
     activity_serializer = activitypub.Person
 
@@ -263,6 +273,16 @@ class User(OrderedCollectionPageMixin, AbstractUser):
             queryset = queryset.exclude(blocks=viewer)
         return queryset
 
+    @classmethod
+    def clear_follower_inboxes(cls, followers):
+        """forget the cached follower inboxes of local users these users follow"""
+        user_ids = (
+            cls.objects.filter(local=True, followers__in=followers)
+            .values_list("id", flat=True)
+            .distinct()
+        )
+        cache.delete_many([f"follower-inboxes-{user_id}" for user_id in user_ids])
+
     @classmethod
     def admins(cls):
         """Get a queryset of the admins for this instance"""
@@ -561,6 +581,14 @@ class KeyPair(ActivitypubMixin, BookWyrmModel):
         super().save(*args, update_fields=update_fields, **kwargs)
 
 
+# pylint: disable=unused-argument
+@receiver(models.signals.post_save, sender=KeyPair)
+@receiver(models.signals.post_delete, sender=KeyPair)
+def forget_parsed_keys(sender, instance, *args, **kwargs):
+    """stop using cached copies of a key pair that has changed"""
+    forget_signers(instance.id)
+
+
 @app.task(queue=MISC)
 def erase_user_data(user_id):
     """Erase any custom data about this user asynchronously
@@ -660,5 +688,17 @@ def preview_image(instance, *args, **kwargs):
 
     changed_fields = instance.field_tracker.changed()
 
-    if len(changed_fields) > 0:
+    if {"name", "avatar"} & changed_fields.keys():
         generate_user_preview_image_task.delay(instance.id)
+
+
+# pylint: disable=unused-argument
+@receiver(models.signals.post_save, sender=User)
+def clear_follower_inboxes_on_change(instance, created, *args, **kwargs):
+    """the local users this remote user follows have their inbox cached"""
+    if created or instance.local:
+        return
+
+    changed_fields = instance.field_tracker.changed()
+    if {"inbox", "shared_inbox", "is_active", "bookwyrm_user"} & changed_fields.keys():
+        User.clear_follower_inboxes([instance])
@@ -11,28 +11,57 @@ class RedisStore(ABC):
     """sets of ranked, related objects, like statuses for a user's feed"""
 
     max_length = settings.MAX_STREAM_LENGTH
+    # stores are only trimmed once they grow this far past max_length
+    trim_slack = 1.25
+    # how many stores to update in a single pipeline
+    chunk_size = 1000
+    # how long to remember which stores an object was added to, or None to keep
+    # no reverse index at all
+    reverse_index_ttl = None
+    # kept in the reverse index of objects that were fanned out to their whole
+    # audience, so an index that only lists a few stores isn't taken as complete
+    fan_out_marker = "*"
 
     def get_value(self, obj):
         """the object and rank"""
         return {obj.id: self.get_rank(obj)}
 
-    def add_object_to_stores(self, obj, stores, execute=True):
-        """add an object to a given set of stores"""
+    def add_object_to_stores(self, obj, stores, execute=True, fan_out=False):
+        """add an object to a given set of stores; fan_out means these are all of
+        the stores the object is being added to, for the first time"""
         value = self.get_value(obj)
         # we want to do this as a bulk operation, hence "pipeline"
         pipeline = r.pipeline()
         for store in stores:
             # add the status to the feed
             pipeline.zadd(store, value)
-            # trim the store
+            # check the length, to see if the store needs trimming
             if self.max_length:
-                pipeline.zremrangebyrank(store, 0, -1 * self.max_length)
+                pipeline.zcard(store)
+        self.index_objects(pipeline, [obj.id], stores, fan_out=fan_out)
         if not execute:
             return pipeline
         # and go!
-        return pipeline.execute()
+        return self.trim_stores(stores, pipeline.execute())
+
+    def trim_stores(self, stores, results):
+        """given the results of add_object_to_stores, trim any stores that have
+        grown well past their max length"""
+        if not self.max_length:
+            return results
+        lengths = results[1 : 2 * len(stores) : 2]
+        overfull = [
+            store
+            for store, length in zip(stores, lengths)
+            if length > self.max_length * self.trim_slack
+        ]
+        if overfull:
+            pipeline = r.pipeline()
+            for store in overfull:
+                pipeline.zremrangebyrank(store, 0, -1 * self.max_length)
+            pipeline.execute()
+        return results
 
-    # pylint: disable=no-self-use
     def remove_object_from_stores(self, obj, stores):
         """remove an object from all stores"""
         # if the stores are provided, the object can just be an id
@@ -43,13 +72,47 @@ class RedisStore(ABC):
         pipeline = r.pipeline()
         for store in stores:
             pipeline.zrem(store, -1, obj_id)
+        self.unindex_objects(pipeline, [obj_id], stores)
         pipeline.execute()
 
+    def bulk_remove_objects_from_stores(self, obj_ids, stores):
+        """remove a list of objects from every one of a set of stores"""
+        if not obj_ids:
+            return
+        stores = list(stores)
+        # one ZREM per store, sent in a handful of round trips
+        for start in range(0, len(stores), self.chunk_size):
+            pipeline = r.pipeline()
+            chunk = stores[start : start + self.chunk_size]
+            for store in chunk:
+                pipeline.zrem(store, *obj_ids)
+            self.unindex_objects(pipeline, obj_ids, chunk)
+            pipeline.execute()
+
+    def remove_objects_from_holders(self, stores_by_object):
+        """remove objects from the stores that hold them, given a dict of object
+        ids to stores (as from get_stores_for_objects)"""
+        objects_by_store = {}
+        for obj_id, stores in stores_by_object.items():
+            for store in stores:
+                objects_by_store.setdefault(store, []).append(obj_id)
+
+        stores = list(objects_by_store)
+        for start in range(0, len(stores), self.chunk_size):
+            pipeline = r.pipeline()
+            for store in stores[start : start + self.chunk_size]:
+                pipeline.zrem(store, *objects_by_store[store])
+            pipeline.execute()
+        # these objects are no longer anywhere
+        if self.reverse_index_ttl and stores_by_object:
+            r.delete(*[self.reverse_index_id(obj_id) for obj_id in stores_by_object])
+
     def bulk_add_objects_to_store(self, objs, store):
         """add a list of objects to a given store"""
         pipeline = r.pipeline()
         for obj in objs[: self.max_length]:
             pipeline.zadd(store, self.get_value(obj))
+            self.index_objects(pipeline, [obj.id], [store])
         if objs and self.max_length:
             pipeline.zremrangebyrank(store, 0, -1 * self.max_length)
         pipeline.execute()
@@ -59,11 +122,43 @@ class RedisStore(ABC):
         pipeline = r.pipeline()
         for obj in objs[: self.max_length]:
             pipeline.zrem(store, -1, obj.id)
+            self.unindex_objects(pipeline, [obj.id], [store])
         pipeline.execute()
 
-    def get_store(self, store, **kwargs):  # pylint: disable=no-self-use
-        """load the values in a store"""
-        return r.zrevrange(store, 0, -1, **kwargs)
+    # pylint: disable=no-self-use
+    def get_store(self, store, start=0, end=-1, **kwargs):
+        """load the values in a store, or a window of them by rank"""
+        return r.zrevrange(store, start, end, **kwargs)
+
+    # pylint: disable=no-self-use
+    def get_store_by_score(self, store, count, before=None, after=None):
+        """load up to `count` (id, score) pairs past a cursor, the (score, id) of
+        an object on the last page: older than `before` or newer than `after`, in
+        order moving away from it. redis orders objects with the same score by
+        their ids as strings, so ties are never skipped at page boundaries"""
+        cursor = after if after is not None else before
+        if cursor is None:
+            values = r.zrevrangebyscore(
+                store, "+inf", "-inf", start=0, num=count, withscores=True
+            )
+            return [(int(obj_id), score) for obj_id, score in values]
+
+        score, obj_id = cursor
+        # the bounds include the cursor's score, so skip the objects with that
+        # score that were already on the last page
+        last = str(obj_id).encode("utf-8")
+        tied = r.zrangebyscore(store, score, score)
+        if after is not None:
+            seen = sum(1 for member in tied if member <= last)
+            values = r.zrangebyscore(
+                store, score, "+inf", start=seen, num=count, withscores=True
+            )
+        else:
+            seen = sum(1 for member in tied if member >= last)
+            values = r.zrevrangebyscore(
+                store, score, "-inf", start=seen, num=count, withscores=True
+            )
+        return [(int(obj_id), score) for obj_id, score in values]
 
     def populate_store(self, store):
         """go from zero to a store"""
@@ -72,12 +167,51 @@ class RedisStore(ABC):
 
         for obj in queryset[: self.max_length]:
             pipeline.zadd(store, self.get_value(obj))
+            self.index_objects(pipeline, [obj.id], [store])
 
         # only trim the store if objects were added
         if queryset.exists() and self.max_length:
             pipeline.zremrangebyrank(store, 0, -1 * self.max_length)
         pipeline.execute()
 
+    def reverse_index_id(self, obj_id):  # pylint: disable=no-self-use
+        """the redis key for the set of stores an object has been added to"""
+        return f"{obj_id}-stores"
+
+    def index_objects(self, pipeline, obj_ids, stores, fan_out=False):
+        """note in the reverse index that these objects are in these stores, and
+        if this is the fan out to their audience, that the index is complete"""
+        if not self.reverse_index_ttl or not (stores or fan_out):
+            return
+        members = [*stores, self.fan_out_marker] if fan_out else stores
+        for obj_id in obj_ids:
+            index_id = self.reverse_index_id(obj_id)
+            pipeline.sadd(index_id, *members)
+            pipeline.expire(index_id, self.reverse_index_ttl)
+
+    def unindex_objects(self, pipeline, obj_ids, stores):
+        """note in the reverse index that these objects are gone from these stores"""
+        if not self.reverse_index_ttl or not stores:
+            return
+        for obj_id in obj_ids:
+            pipeline.srem(self.reverse_index_id(obj_id), *stores)
+
+    def get_stores_for_objects(self, obj_ids):
+        """the stores that each object has been added to, according to the reverse
+        index; objects whose index may be partial (because they were only added
+        to some stores while populating them, or the index expired) are left out"""
+        if not self.reverse_index_ttl or not obj_ids:
+            return {}
+        pipeline = r.pipeline()
+        for obj_id in obj_ids:
+            pipeline.smembers(self.reverse_index_id(obj_id))
+        marker = self.fan_out_marker.encode("utf-8")
+        return {
+            obj_id: [store.decode("utf-8") for store in stores if store != marker]
+            for obj_id, stores in zip(obj_ids, pipeline.execute())
+            if marker in stores
+        }
+
     @abstractmethod
     def get_objects_for_store(self, store):
         """a queryset of what should go in a store, used for populating it"""
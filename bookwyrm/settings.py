@@ -232,6 +232,9 @@ REDIS_ACTIVITY_URL = env(
     f"redis://:{REDIS_ACTIVITY_PASSWORD}@{REDIS_ACTIVITY_HOST}:{REDIS_ACTIVITY_PORT}/{REDIS_ACTIVITY_DB_INDEX}",
 )
 MAX_STREAM_LENGTH = env.int("MAX_STREAM_LENGTH", 200)
+# how long to remember which feeds a status was added to (in seconds); by then
+# most statuses have been trimmed out of the feeds
+STREAM_INDEX_TTL = env.int("STREAM_INDEX_TTL", 60 * 60 * 24 * 7)
 
 STREAMS = [
     {"key": "home", "name": _("Home Timeline"), "shortname": _("Home")},
@@ -243,6 +246,40 @@ STREAMS = [
 SEARCH_TIMEOUT = env.int("SEARCH_TIMEOUT", 8)
 # timeout for a query to an individual connector
 QUERY_TIMEOUT = env.int("INTERACTIVE_QUERY_TIMEOUT", env.int("QUERY_TIMEOUT", 5))
+# how many searches to send a connector at once when searching in bulk
+SEARCH_CONNECTOR_CONCURRENCY = env.int("SEARCH_CONNECTOR_CONCURRENCY", 4)
+# how long to keep a connector's search results, and searches that found nothing
+SEARCH_CACHE_TIMEOUT = env.int("SEARCH_CACHE_TIMEOUT", 60 * 60 * 6)
+SEARCH_EMPTY_CACHE_TIMEOUT = env.int("SEARCH_EMPTY_CACHE_TIMEOUT", 60 * 10)
+
+# Fetching remote data
+# servers to keep connections open to in each process, and connections to each
+HTTP_POOL_CONNECTIONS = env.int("HTTP_POOL_CONNECTIONS", 20)
+HTTP_POOL_MAXSIZE = env.int("HTTP_POOL_MAXSIZE", 10)
+# retries for requests that couldn't connect or were rate limited
+HTTP_MAX_RETRIES = env.int("HTTP_MAX_RETRIES", 2)
+# how long to keep responses to ask the server if they've changed
+HTTP_RESPONSE_CACHE_TIMEOUT = env.int("HTTP_RESPONSE_CACHE_TIMEOUT", 60 * 60 * 24)
+
+# Federation delivery
+# timeout in seconds for sending an activity to one inbox
+BROADCAST_TIMEOUT = env.int("BROADCAST_TIMEOUT", 10)
+# open connections per celery worker, in total and to any one server
+BROADCAST_MAX_CONNECTIONS = env.int("BROADCAST_MAX_CONNECTIONS", 100)
+BROADCAST_MAX_HOST_CONNECTIONS = env.int("BROADCAST_MAX_HOST_CONNECTIONS", 8)
+# deliveries per celery worker that can be waiting on a response at once
+BROADCAST_MAX_IN_FLIGHT = env.int("BROADCAST_MAX_IN_FLIGHT", 400)
+# failed deliveries are retried with exponential backoff, starting at this many
+# seconds and never waiting longer than the max
+BROADCAST_MAX_RETRIES = env.int("BROADCAST_MAX_RETRIES", 5)
+BROADCAST_RETRY_DELAY = env.int("BROADCAST_RETRY_DELAY", 60)
+BROADCAST_MAX_BACKOFF = env.int("BROADCAST_MAX_BACKOFF", 60 * 60 * 24)
+# stop delivering to a server after this many broadcasts in a row have failed
+BROADCAST_FAILURE_THRESHOLD = env.int("BROADCAST_FAILURE_THRESHOLD", 5)
+# deliveries to one server sent by each task, and how long (in seconds) queued
+# activities are kept before they're dropped
+BROADCAST_BATCH_SIZE = env.int("BROADCAST_BATCH_SIZE", 100)
+BROADCAST_QUEUE_TTL = env.int("BROADCAST_QUEUE_TTL", 60 * 60 * 24 * 2)
 
 # Redis cache backend
 if env.bool("USE_DUMMY_CACHE", False):
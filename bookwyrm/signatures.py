@@ -1,5 +1,7 @@
 """ signs activitypub activities """
+from collections import OrderedDict
 import hashlib
+import threading
 from urllib.parse import urlparse
 import datetime
 from base64 import b64encode, b64decode
@@ -10,6 +12,11 @@ from Crypto.Signature import pkcs1_15
 from Crypto.Hash import SHA256
 
 MAX_SIGNATURE_AGE = 300
+# how many parsed keys to keep around for signing and verifying
+SIGNER_CACHE_SIZE = 1024
+
+_signers = OrderedDict()
+_signers_lock = threading.Lock()
 
 
 def create_key_pair():
@@ -22,6 +29,31 @@ def create_key_pair():
     return private_key, public_key
 
 
+def get_signer(pem, key_pair_id=None):
+    """a signer for a PEM encoded key, reusing the parsed key if we've seen it;
+    the cache key includes the PEM's hash, so a changed key is never reused"""
+    cache_key = (key_pair_id, hashlib.sha256(pem.encode("utf8")).hexdigest())
+    with _signers_lock:
+        signer = _signers.get(cache_key)
+        if signer is not None:
+            _signers.move_to_end(cache_key)
+            return signer
+
+    signer = pkcs1_15.new(RSA.import_key(pem))
+    with _signers_lock:
+        _signers[cache_key] = signer
+        while len(_signers) > SIGNER_CACHE_SIZE:
+            _signers.popitem(last=False)
+    return signer
+
+
+def forget_signers(key_pair_id):
+    """drop the parsed keys for a key pair that has changed or been deleted"""
+    with _signers_lock:
+        for cache_key in [k for k in _signers if k[0] == key_pair_id]:
+            del _signers[cache_key]
+
+
 def make_signature(method, sender, destination, date, **kwargs):
     """uses a private key to sign an outgoing message"""
     inbox_parts = urlparse(destination)
@@ -37,7 +69,9 @@ def make_signature(method, sender, destination, date, **kwargs):
         headers = "(request-target) host date digest"
 
     message_to_sign = "\n".join(signature_headers)
-    signer = pkcs1_15.new(RSA.import_key(sender.key_pair.private_key))
+    signer = get_signer(
+        sender.key_pair.private_key, getattr(sender.key_pair, "id", None)
+    )
     signed_message = signer.sign(SHA256.new(message_to_sign.encode("utf8")))
     # For legacy reasons we need to use an incorrect keyId for older Bookwyrm versions
     key_id = (
@@ -102,11 +136,10 @@ class Signature:
 
         return cls(key_id, headers, signature)
 
-    def verify(self, public_key, request):
+    def verify(self, public_key, request, key_pair_id=None):
         """verify rsa signature"""
         if http_date_age(request.headers["date"]) > MAX_SIGNATURE_AGE:
             raise ValueError(f"Request too old: {request.headers['date']}")
-        public_key = RSA.import_key(public_key)
 
         comparison_string = []
         for signed_header_name in self.headers.split(" "):
@@ -120,7 +153,7 @@ class Signature:
                 )
         comparison_string = "\n".join(comparison_string)
 
-        signer = pkcs1_15.new(public_key)
+        signer = get_signer(public_key, key_pair_id)
         digest = SHA256.new()
         digest.update(comparison_string.encode())
 
@@ -3,7 +3,19 @@ import math
 import logging
 from django.dispatch import receiver
 from django.db import transaction
-from django.db.models import signals, Count, Q, Case, When, IntegerField
+from django.db.models import (
+    signals,
+    Count,
+    Q,
+    Case,
+    When,
+    IntegerField,
+    Exists,
+    OuterRef,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce
 from opentelemetry import trace
 
 from bookwyrm import models
@@ -65,22 +77,52 @@ class SuggestedUsers(RedisStore):
     def rerank_obj(self, obj, update_only=True):
         """update all the instances of this user with new ranks"""
         trace.get_current_span().set_attribute("update_only", update_only)
+        if not obj.discoverable or not obj.is_active:
+            return
+
+        # every viewer's mutuals count with this user comes from one query
+        viewers = get_mutuals_for_viewers(obj, self.get_users_for_object(obj))
         pipeline = r.pipeline()
-        for store_user in self.get_users_for_object(obj):
-            with tracer.start_as_current_span("SuggestedUsers.rerank_obj/user") as _:
-                annotated_user = get_annotated_users(
-                    store_user,
-                    id=obj.id,
-                ).first()
-                if not annotated_user:
-                    continue
+        for count, (viewer_id, mutuals) in enumerate(viewers.iterator(), start=1):
+            pipeline.zadd(self.store_id(viewer_id), {obj.id: mutuals}, xx=update_only)
+            if count % self.chunk_size == 0:
+                pipeline.execute()
+        pipeline.execute()
 
+    def update_mutuals(self, follower, followed, increment):
+        """a follow between two users changes the followed user's mutuals count
+        for everyone who follows the follower, and for no one else"""
+        if not followed.discoverable or not followed.is_active:
+            return
+
+        viewers = (
+            self.get_users_for_object(followed)
+            .filter(following=follower)
+            .exclude(following=followed)
+        )
+        viewer_ids = list(viewers.values_list("id", flat=True))
+        for start in range(0, len(viewer_ids), self.chunk_size):
+            chunk = viewer_ids[start : start + self.chunk_size]
+            pipeline = r.pipeline()
+            for viewer_id in chunk:
                 pipeline.zadd(
-                    self.store_id(store_user),
-                    self.get_value(annotated_user),
-                    xx=update_only,
+                    self.store_id(viewer_id),
+                    {followed.id: increment},
+                    xx=True,
+                    incr=True,
                 )
-        pipeline.execute()
+            scores = pipeline.execute()
+
+            # the user wasn't in these stores yet, so there's no rank to adjust
+            missing = [v for v, score in zip(chunk, scores) if score is None]
+            if increment < 0 or not missing:
+                continue
+            pipeline = r.pipeline()
+            for viewer_id, mutuals in get_mutuals_for_viewers(
+                followed, models.User.objects.filter(id__in=missing)
+            ):
+                pipeline.zadd(self.store_id(viewer_id), {followed.id: mutuals})
+            pipeline.execute()
 
     def rerank_user_suggestions(self, user):
         """update the ranks of the follows suggested to a user"""
@@ -141,6 +183,30 @@ def get_annotated_users(viewer, *args, **kwargs):
     )
 
 
+def get_mutuals_for_viewers(user, viewers):
+    """(viewer id, mutuals) for each viewer, matching what get_annotated_users
+    would count for the user from each viewer's point of view: the people the
+    viewer follows who follow the user, unless the viewer follows them already"""
+    mutuals = (
+        models.UserFollows.objects.filter(
+            user_subject=OuterRef("id"), user_object__following=user
+        )
+        .values("user_subject")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    follows_user = models.UserFollows.objects.filter(
+        user_subject=OuterRef("id"), user_object=user
+    )
+    return viewers.annotate(
+        mutuals=Case(
+            When(Exists(follows_user), then=Value(0)),
+            default=Coalesce(Subquery(mutuals), Value(0)),
+            output_field=IntegerField(),
+        )
+    ).values_list("id", "mutuals")
+
+
 suggested_users = SuggestedUsers()
 
 
@@ -153,7 +219,7 @@ def update_suggestions_on_follow(sender, instance, created, *args, **kwargs):
 
     if instance.user_subject.local:
         remove_suggestion_task.delay(instance.user_subject.id, instance.user_object.id)
-    rerank_user_task.delay(instance.user_object.id, update_only=False)
+    update_mutuals_task.delay(instance.user_subject.id, instance.user_object.id, 1)
 
 
 @receiver(signals.post_save, sender=models.UserFollowRequest)
@@ -182,7 +248,7 @@ def update_suggestions_on_block(sender, instance, *args, **kwargs):
 def update_suggestions_on_unfollow(sender, instance, **kwargs):
     """update rankings, but don't re-suggest because it was probably intentional"""
     if instance.user_object.discoverable:
-        rerank_user_task.delay(instance.user_object.id, update_only=False)
+        update_mutuals_task.delay(instance.user_subject.id, instance.user_object.id, -1)
 
 
 # @receiver(signals.post_save, sender=models.ShelfBook)
@@ -207,9 +273,14 @@ def update_user(sender, instance, created, update_fields=None, **kwargs):
     if created and instance.local:
         transaction.on_commit(lambda: update_new_user_command(instance.id))
 
-    # we know what fields were updated and discoverability didn't change
+    # ranks only depend on who follows whom, so there's nothing to do for an
+    # existing user unless they've become (un)discoverable or (in)active
+    watched_fields = {"discoverable", "is_active"}
+    if update_fields is not None:
+        # a save that leaves these fields out can't have changed them
+        watched_fields &= set(update_fields)
     if not instance.bookwyrm_user or (
-        update_fields and not "discoverable" in update_fields
+        not created and not watched_fields & instance.field_tracker.changed().keys()
     ):
         return
 
@@ -218,7 +289,6 @@ def update_user(sender, instance, created, update_fields=None, **kwargs):
         remove_user_task.delay(instance.id)
         return
 
-    # this happens on every save, not just when discoverability changes, annoyingly
     if instance.discoverable:
         rerank_user_task.delay(instance.id, update_only=False)
     elif not created:
@@ -263,6 +333,14 @@ def rerank_user_task(user_id, update_only=False):
         suggested_users.rerank_obj(user, update_only=update_only)
 
 
+@app.task(queue=SUGGESTED_USERS)
+def update_mutuals_task(follower_id, followed_id, increment):
+    """adjust a user's rank after someone follows or unfollows them"""
+    follower = models.User.objects.get(id=follower_id)
+    followed = models.User.objects.get(id=followed_id)
+    suggested_users.update_mutuals(follower, followed, increment)
+
+
 @app.task(queue=SUGGESTED_USERS)
 def remove_user_task(user_id):
     """do the hard work in celery"""
@@ -1,5 +1,6 @@
 """ template filters for status interaction buttons """
 from django import template
+from django.core.cache import cache
 
 from bookwyrm import models
 from bookwyrm.utils.cache import get_or_set
@@ -7,33 +8,42 @@ from bookwyrm.utils.cache import get_or_set
 
 register = template.Library()
 
+INTERACTION_TIMEOUT = 259200
+RELATIONSHIP_TIMEOUT = 60 * 60
+
 
 @register.filter(name="liked")
 def get_user_liked(user, status):
     """did the given user fav a status?"""
-    return get_or_set(
+    return get_preloaded_or_set(
+        user,
         f"fav-{user.id}-{status.id}",
         lambda u, s: models.Favorite.objects.filter(user=u, status=s).exists(),
         user,
         status,
-        timeout=259200,
+        timeout=INTERACTION_TIMEOUT,
     )
 
 
 @register.filter(name="boosted")
 def get_user_boosted(user, status):
     """did the given user fav a status?"""
-    return get_or_set(
+    return get_preloaded_or_set(
+        user,
         f"boost-{user.id}-{status.id}",
         lambda u: status.boosters.filter(user=u).exists(),
         user,
-        timeout=259200,
+        timeout=INTERACTION_TIMEOUT,
     )
 
 
 @register.filter(name="saved")
 def get_user_saved_lists(user, book_list):
     """did the user save a list"""
+    preloaded = getattr(user, "preloaded_interactions", {})
+    key = f"saved-{user.id}-{book_list.id}"
+    if key in preloaded:
+        return preloaded[key]
     return user.saved_lists.filter(id=book_list.id).exists()
 
 
@@ -41,12 +51,13 @@ def get_user_saved_lists(user, book_list):
 def get_relationship(context, user_object):
     """caches the relationship between the logged in user and another user"""
     user = context["request"].user
-    return get_or_set(
+    return get_preloaded_or_set(
+        user,
         f"cached-relationship-{user.id}-{user_object.id}",
         get_relationship_name,
         user,
         user_object,
-        timeout=60 * 60,
+        timeout=RELATIONSHIP_TIMEOUT,
     )
 
 
@@ -64,3 +75,107 @@ def get_relationship_name(user, user_object):
     elif user in user_object.follower_requests.all():
         types["is_follow_pending"] = True
     return types
+
+
+def get_preloaded_or_set(user, cache_key, function, *args, timeout=None):
+    """use what was looked up for the whole page, if this was on it"""
+    preloaded = getattr(user, "preloaded_interactions", {})
+    if cache_key in preloaded:
+        return preloaded[cache_key]
+    return get_or_set(cache_key, function, *args, timeout=timeout)
+
+
+def preload_interactions(user, statuses=(), book_lists=()):
+    """look up how the viewer has interacted with everything on a page in a
+    handful of queries, instead of a few for each status the page renders.
+    the results are kept on the request's user for the filters above"""
+    if not user.is_authenticated:
+        return
+    status_ids = set()
+    user_ids = set()
+    for status in statuses:
+        status_ids.add(status.id)
+        # boosts show the buttons for the status they boosted
+        if boosted_status_id := getattr(status, "boosted_status_id", None):
+            status_ids.add(boosted_status_id)
+        user_ids.add(status.user_id)
+    user_ids.discard(user.id)
+
+    fav_keys = {f"fav-{user.id}-{i}": i for i in status_ids}
+    boost_keys = {f"boost-{user.id}-{i}": i for i in status_ids}
+    relationship_keys = {f"cached-relationship-{user.id}-{i}": i for i in user_ids}
+    preloaded = cache.get_many([*fav_keys, *boost_keys, *relationship_keys])
+
+    fill_missing(preloaded, fav_keys, user, get_liked_ids, INTERACTION_TIMEOUT)
+    fill_missing(preloaded, boost_keys, user, get_boosted_ids, INTERACTION_TIMEOUT)
+    fill_missing(
+        preloaded,
+        relationship_keys,
+        user,
+        get_relationship_names,
+        RELATIONSHIP_TIMEOUT,
+    )
+
+    # saved lists aren't cached, but they're one query for the page
+    list_ids = [book_list.id for book_list in book_lists]
+    if list_ids:
+        saved = set(
+            user.saved_lists.filter(id__in=list_ids).values_list("id", flat=True)
+        )
+        preloaded.update({f"saved-{user.id}-{i}": i in saved for i in list_ids})
+
+    user.preloaded_interactions = {
+        **getattr(user, "preloaded_interactions", {}),
+        **preloaded,
+    }
+
+
+# pylint: disable=too-many-arguments
+def fill_missing(preloaded, keys, user, lookup, timeout):
+    """look up and cache everything the cache didn't have"""
+    missing = {key: obj_id for key, obj_id in keys.items() if key not in preloaded}
+    if not missing:
+        return
+    values = lookup(user, list(missing.values()))
+    found = {key: values[obj_id] for key, obj_id in missing.items()}
+    cache.set_many(found, timeout=timeout)
+    preloaded.update(found)
+
+
+def get_liked_ids(user, status_ids):
+    """which of these statuses the user has faved"""
+    liked = set(
+        models.Favorite.objects.filter(user=user, status_id__in=status_ids).values_list(
+            "status_id", flat=True
+        )
+    )
+    return {i: i in liked for i in status_ids}
+
+
+def get_boosted_ids(user, status_ids):
+    """which of these statuses the user has boosted"""
+    boosted = set(
+        models.Boost.objects.filter(
+            user=user, boosted_status_id__in=status_ids
+        ).values_list("boosted_status_id", flat=True)
+    )
+    return {i: i in boosted for i in status_ids}
+
+
+def get_relationship_names(user, user_ids):
+    """the relationship to each of these users, like get_relationship_name"""
+    blocked = set(user.blocks.filter(id__in=user_ids).values_list("id", flat=True))
+    following = set(user.following.filter(id__in=user_ids).values_list("id", flat=True))
+    pending = set(
+        user.follow_requests.filter(id__in=user_ids).values_list("id", flat=True)
+    )
+    return {
+        i: {
+            "is_following": i in following and i not in blocked,
+            "is_follow_pending": i in pending
+            and i not in blocked
+            and i not in following,
+            "is_blocked": i in blocked,
+        }
+        for i in user_ids
+    }
@@ -3,6 +3,7 @@ from django import template
 from django.db.models import Avg, StdDev, Count, F, Q
 
 from bookwyrm import models
+from bookwyrm.templatetags.rating_tags import preload_ratings
 
 register = template.Library()
 
@@ -69,10 +70,12 @@ def get_book_superlatives():
 @register.simple_tag(takes_context=False)
 def get_landing_books():
     """list of books for the landing page"""
-    return list(
+    books = list(
         set(
             models.Edition.objects.exclude(cover__exact="")
             .distinct()
             .order_by("-updated_date")[:6]
         )
     )
+    preload_ratings(books)
+    return books
@@ -1,6 +1,5 @@
 """ template filters """
 from django import template
-from django.db.models import Avg
 
 from bookwyrm import models
 from bookwyrm.utils import cache
@@ -9,38 +8,42 @@ from bookwyrm.utils import cache
 register = template.Library()
 
 
+# pylint: disable=unused-argument
 @register.filter(name="rating")
 def get_rating(book, user):
     """get the overall rating of a book"""
+    if hasattr(book, "preloaded_rating"):
+        return book.preloaded_rating
     # this shouldn't happen, but it CAN
     if not book.parent_work:
         return None
-
-    return cache.get_or_set(
-        f"book-rating-{book.parent_work.id}",
-        lambda u, b: models.Review.objects.filter(
-            book__parent_work__editions=b, rating__gt=0
-        ).aggregate(Avg("rating"))["rating__avg"]
-        or 0,
-        user,
-        book,
-        timeout=15552000,
-    )
+    return models.WorkRating.get_ratings([book]).get(book.id, 0)
 
 
 @register.filter(name="user_rating")
 def get_user_rating(book, user):
     """get a user's rating of a book"""
-    rating = (
-        models.Review.objects.filter(
-            user=user,
-            book=book,
+    return cache.get_or_set(
+        f"user-rating-{user.id}-{book.id}",
+        lambda u, b: models.Review.objects.filter(
+            user=u,
+            book=b,
             rating__isnull=False,
             deleted=False,
         )
         .order_by("-published_date")
+        .values_list("rating", flat=True)
         .first()
+        or 0,
+        user,
+        book,
+        timeout=15552000,
     )
-    if rating:
-        return rating.rating
-    return 0
+
+
+def preload_ratings(books):
+    """look up the ratings of a page of books at once"""
+    books = [book for book in books if book]
+    ratings = models.WorkRating.get_ratings(books)
+    for book in books:
+        book.preloaded_rating = ratings.get(book.id, 0)
@@ -1,11 +1,12 @@
 """ testing activitystreams """
 from datetime import datetime, timezone
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from django.test import TestCase
 
 from bookwyrm import activitystreams, models
 
 
+# pylint: disable=too-many-public-methods
 @patch("bookwyrm.models.activitypub_mixin.broadcast_task.apply_async")
 @patch("bookwyrm.activitystreams.add_status_task.delay")
 @patch("bookwyrm.activitystreams.add_book_statuses_task.delay")
@@ -118,6 +119,107 @@ class Activitystreams(TestCase):
         self.assertEqual(result.last(), status)
         self.assertIsInstance(result.first(), models.Comment)
 
+    def test_get_activity_stream_page(self, *_):
+        """load the statuses older than a cursor"""
+        status = models.Status.objects.create(
+            user=self.remote_user,
+            content="hi",
+            privacy="direct",
+        )
+        status2 = models.Comment.objects.create(
+            user=self.remote_user,
+            content="hi",
+            privacy="direct",
+            book=self.book,
+        )
+        with (
+            patch("bookwyrm.activitystreams.r.set"),
+            patch("bookwyrm.activitystreams.r.delete"),
+            patch("bookwyrm.redis_store.r.zrangebyscore") as tied_mock,
+            patch("bookwyrm.redis_store.r.zrevrangebyscore") as redis_mock,
+        ):
+            # the statuses tied with the cursor, only the cursor's already seen
+            tied_mock.return_value = [b"1", b"10"]
+            redis_mock.return_value = [(status2.id, 30.0), (status.id, 20.0)]
+            result = self.test_stream.get_activity_stream_page(
+                self.local_user, before=(40.0, 10), page_length=1
+            )
+        tied_mock.assert_called_once_with(f"{self.local_user.id}-test", 40.0, 40.0)
+        redis_mock.assert_called_once_with(
+            f"{self.local_user.id}-test",
+            40.0,
+            "-inf",
+            start=1,
+            num=2,
+            withscores=True,
+        )
+        self.assertTrue(result.has_next())
+        self.assertTrue(result.has_previous())
+        self.assertEqual(result.next_cursor, f"30.0-{status2.id}")
+        self.assertEqual(result.previous_cursor, f"30.0-{status2.id}")
+        self.assertEqual(list(result), [status2])
+
+    def test_get_activity_stream_page_after(self, *_):
+        """load the statuses newer than a cursor, still newest first"""
+        status = models.Status.objects.create(
+            user=self.remote_user,
+            content="hi",
+            privacy="direct",
+        )
+        status2 = models.Comment.objects.create(
+            user=self.remote_user,
+            content="hi",
+            privacy="direct",
+            book=self.book,
+        )
+        with (
+            patch("bookwyrm.activitystreams.r.set"),
+            patch("bookwyrm.activitystreams.r.delete"),
+            patch("bookwyrm.redis_store.r.zrangebyscore") as redis_mock,
+        ):
+            redis_mock.side_effect = [
+                [b"3"],
+                [(status.id, 20.0), (status2.id, 30.0)],
+            ]
+            result = self.test_stream.get_activity_stream_page(
+                self.local_user, after=(10.0, 3)
+            )
+        # the cursor's own status is skipped
+        self.assertEqual(redis_mock.call_args.kwargs["start"], 1)
+        self.assertEqual(list(result), [status2, status])
+        self.assertTrue(result.has_next())
+        self.assertFalse(result.has_previous())
+        self.assertEqual(result.next_cursor, f"20.0-{status.id}")
+
+    def test_get_activity_stream_page_filtered(self, *_):
+        """filter status types without loading the whole store"""
+        status = models.Status.objects.create(
+            user=self.remote_user,
+            content="hi",
+            privacy="direct",
+        )
+        comment = models.Comment.objects.create(
+            user=self.remote_user,
+            content="hi",
+            privacy="direct",
+            book=self.book,
+        )
+        with (
+            patch("bookwyrm.activitystreams.r.set"),
+            patch("bookwyrm.activitystreams.r.delete"),
+            patch("bookwyrm.redis_store.r.zrangebyscore", return_value=[]),
+            patch("bookwyrm.redis_store.r.zrevrangebyscore") as redis_mock,
+        ):
+            redis_mock.side_effect = [[(comment.id, 30.0), (status.id, 20.0)], []]
+            result = self.test_stream.get_activity_stream_page(
+                self.local_user, allowed_types=["review", "quotation", "everything"]
+            )
+        self.assertEqual(list(result), [status])
+        self.assertFalse(result.has_next())
+        self.assertFalse(result.has_previous())
+        # the second read continues from the end of the first window
+        self.assertEqual(redis_mock.call_args[0][1], 20.0)
+
     def test_abstractstream_get_audience(self, *_):
         """get a list of users that should see a status"""
         status = models.Status.objects.create(
@@ -203,3 +305,108 @@ class Activitystreams(TestCase):
         self.assertFalse(self.local_user.id in users)
         self.assertFalse(self.another_user.id in users)
         self.assertFalse(self.remote_user.id in users)
+
+    def test_get_stream_audiences(self, *_):
+        """one query matches each stream's own audience"""
+        self.local_user.following.add(self.another_user)
+        models.ShelfBook.objects.create(
+            user=self.another_user,
+            shelf=self.another_user.shelf_set.first(),
+            book=self.book,
+        )
+        status = models.Comment.objects.create(
+            user=self.another_user, content="hi", privacy="public", book=self.book
+        )
+        audiences = activitystreams.get_stream_audiences(status)
+        for key, stream in activitystreams.streams.items():
+            self.assertCountEqual(audiences[key], stream.get_audience(status))
+        self.assertCountEqual(
+            audiences["home"], [self.local_user.id, self.another_user.id]
+        )
+        self.assertEqual(audiences["books"], [self.another_user.id])
+
+    def test_get_stream_audiences_followers(self, *_):
+        """non-public statuses stay out of the local and books streams"""
+        self.local_user.following.add(self.remote_user)
+        status = models.Status.objects.create(
+            user=self.remote_user, content="hi", privacy="followers"
+        )
+        audiences = activitystreams.get_stream_audiences(status)
+        self.assertEqual(audiences["home"], [self.local_user.id])
+        self.assertEqual(audiences["local"], [])
+        self.assertEqual(audiences["books"], [])
+
+    def test_get_stream_audiences_direct(self, *_):
+        """direct messages are only in the author's feed"""
+        status = models.Status.objects.create(
+            user=self.local_user, content="hi", privacy="direct"
+        )
+        status.mention_users.add(self.another_user)
+        audiences = activitystreams.get_stream_audiences(status)
+        self.assertEqual(audiences["home"], [self.local_user.id])
+        self.assertEqual(audiences["local"], [])
+
+    def test_trim_stores(self, *_):
+        """stores are only trimmed once they're well past their max length"""
+        with patch("bookwyrm.redis_store.r.pipeline") as pipeline_mock:
+            self.test_stream.trim_stores(
+                ["a-test", "b-test"],
+                [1, self.test_stream.max_length + 1, 1, 10000],
+            )
+        pipeline = pipeline_mock.return_value
+        pipeline.zremrangebyrank.assert_called_once_with(
+            "b-test", 0, -1 * self.test_stream.max_length
+        )
+        self.assertTrue(pipeline.execute.called)
+
+    def test_add_status_chunks(self, *_):
+        """the reverse index is only marked complete with the last chunk"""
+        status = models.Status.objects.create(user=self.local_user, content="hi")
+        self.test_stream.chunk_size = 2
+        with patch("bookwyrm.redis_store.r.pipeline") as pipeline_mock:
+            pipeline_mock.return_value.execute.return_value = []
+            self.test_stream.add_status(status, audience=[1, 2, 3], created=True)
+        pipeline = pipeline_mock.return_value
+        index_id = f"{status.id}-test-stores"
+        self.assertEqual(
+            pipeline.sadd.call_args_list,
+            [
+                ((index_id, "1-test", "2-test"),),
+                ((index_id, "3-test", "*"),),
+            ],
+        )
+
+    def test_reverse_index(self, *_):
+        """keep track of which stores a status has been added to"""
+        self.assertEqual(self.test_stream.reverse_index_id(1), "1-test-stores")
+        pipeline = MagicMock()
+        self.test_stream.index_objects(pipeline, [1], ["2-test", "3-test"])
+        pipeline.sadd.assert_called_once_with("1-test-stores", "2-test", "3-test")
+        pipeline.expire.assert_called_once_with(
+            "1-test-stores", self.test_stream.reverse_index_ttl
+        )
+
+        with patch("bookwyrm.redis_store.r.pipeline") as pipeline_mock:
+            pipeline_mock.return_value.execute.return_value = [
+                {b"2-test", b"*"},
+                set(),
+                {b"3-test"},
+                {b"*"},
+            ]
+            result = self.test_stream.get_stores_for_objects([1, 4, 5, 6])
+        # a partial index, without the fan out marker, isn't used
+        self.assertEqual(result, {1: ["2-test"], 6: []})
+
+        # an object that's fanned out to its audience has a complete index
+        pipeline = MagicMock()
+        self.test_stream.index_objects(pipeline, [1], ["2-test"], fan_out=True)
+        pipeline.sadd.assert_called_once_with("1-test-stores", "2-test", "*")
+
+        # even if nobody is in the audience
+        pipeline = MagicMock()
+        self.test_stream.index_objects(pipeline, [1], [], fan_out=True)
+        pipeline.sadd.assert_called_once_with("1-test-stores", "*")
+
+        pipeline = MagicMock()
+        self.test_stream.index_objects(pipeline, [1], [])
+        self.assertFalse(pipeline.sadd.called)
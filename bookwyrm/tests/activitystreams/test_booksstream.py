@@ -100,3 +100,26 @@ class Activitystreams(TestCase):
         )
         for call in redis_mock_counter.calls:
             self.assertEqual(call[1], f"{self.local_user.id}-books")
+
+    def test_get_audience_for_statuses(self, *_):
+        """everyone who might have one of these statuses in their books feed"""
+        alt_book = models.Edition.objects.create(
+            title="hi", parent_work=self.book.parent_work
+        )
+        status = models.Status.objects.create(
+            user=self.local_user, content="hi", privacy="public"
+        )
+        comment = models.Comment.objects.create(
+            user=self.remote_user, content="hi", privacy="public", book=alt_book
+        )
+        stream = activitystreams.BooksStream()
+        self.assertEqual(stream.get_audience_for_statuses([status, comment]), set())
+
+        models.ShelfBook.objects.create(
+            user=self.local_user,
+            shelf=self.local_user.shelf_set.first(),
+            book=self.book,
+        )
+        self.assertEqual(
+            stream.get_audience_for_statuses([status, comment]), {self.local_user.id}
+        )
@@ -72,15 +72,45 @@ class Activitystreams(TestCase):
         args = mock.call_args[0]
         self.assertEqual(args[0], self.local_user)
 
-    def test_remove_status_task(self):
+    @patch(
+        "bookwyrm.activitystreams.ActivityStream.get_stores_for_objects",
+        return_value={},
+    )
+    def test_remove_status_task(self, *_):
         """remove a status from all streams"""
         with patch(
-            "bookwyrm.activitystreams.ActivityStream.remove_object_from_stores"
+            "bookwyrm.activitystreams.ActivityStream.bulk_remove_objects_from_stores"
         ) as mock:
             activitystreams.remove_status_task(self.status.id)
         self.assertEqual(mock.call_count, 3)
         args = mock.call_args[0]
-        self.assertEqual(args[0], self.status)
+        self.assertEqual(args[0], [self.status.id])
+
+    @patch(
+        "bookwyrm.activitystreams.ActivityStream.get_stores_for_objects",
+        return_value={},
+    )
+    @patch("bookwyrm.models.activitypub_mixin.broadcast_task.apply_async")
+    def test_remove_status_task_batch(self, *_):
+        """remove many statuses with one sweep per stream"""
+        self.another_user.following.add(self.local_user)
+        status = models.Status.objects.create(
+            content="hi", user=self.local_user, privacy="followers"
+        )
+        with patch(
+            "bookwyrm.activitystreams.ActivityStream.bulk_remove_objects_from_stores"
+        ) as mock:
+            activitystreams.remove_status_task([self.status.id, status.id])
+        self.assertEqual(mock.call_count, 3)
+        home, local, books = [call[0] for call in mock.call_args_list]
+        self.assertCountEqual(home[0], [self.status.id, status.id])
+        self.assertCountEqual(
+            home[1], [f"{self.local_user.id}-home", f"{self.another_user.id}-home"]
+        )
+        self.assertCountEqual(
+            local[1], [f"{self.local_user.id}-local", f"{self.another_user.id}-local"]
+        )
+        self.assertEqual(books[1], [])
 
     def test_add_status_task(self):
         """add a status to all streams"""
@@ -89,6 +119,15 @@ class Activitystreams(TestCase):
         self.assertEqual(mock.call_count, 3)
         args = mock.call_args[0]
         self.assertEqual(args[0], self.status)
+        # only a new status's fan out is a complete index of its stores
+        self.assertFalse(mock.call_args[1]["created"])
+
+        with patch(
+            "bookwyrm.activitystreams.ActivityStream.add_object_to_stores"
+        ) as mock:
+            activitystreams.add_status_task(self.status.id, created=True)
+        self.assertTrue(mock.called)
+        self.assertTrue(all(call[1]["fan_out"] for call in mock.call_args_list))
 
     def test_remove_user_statuses_task(self):
         """remove all statuses by a user from another users' feeds"""
@@ -132,6 +171,29 @@ class Activitystreams(TestCase):
         self.assertEqual(args[0], self.local_user)
         self.assertEqual(args[1], self.another_user)
 
+    def test_remove_status_task_indexed(self):
+        """statuses in the reverse index are removed from just their holders"""
+        with (
+            patch(
+                "bookwyrm.activitystreams.ActivityStream.get_stores_for_objects"
+            ) as index_mock,
+            patch(
+                "bookwyrm.activitystreams.ActivityStream.remove_objects_from_holders"
+            ) as remove_mock,
+            patch(
+                "bookwyrm.activitystreams.ActivityStream.get_audience_for_statuses"
+            ) as audience_mock,
+        ):
+            index_mock.return_value = {self.status.id: ["1-home"]}
+            activitystreams.remove_status_task(self.status.id)
+        self.assertEqual(remove_mock.call_count, 3)
+        self.assertEqual(remove_mock.call_args[0][0], {self.status.id: ["1-home"]})
+        self.assertFalse(audience_mock.called)
+
+    @patch(
+        "bookwyrm.activitystreams.ActivityStream.get_stores_for_objects",
+        return_value={},
+    )
     @patch("bookwyrm.activitystreams.LocalStream.remove_object_from_stores")
     @patch("bookwyrm.activitystreams.BooksStream.remove_object_from_stores")
     @patch("bookwyrm.models.activitypub_mixin.broadcast_task.apply_async")
@@ -154,6 +216,10 @@ class Activitystreams(TestCase):
         self.assertEqual(call_args[0][0], status)
         self.assertEqual(call_args[0][1], [f"{self.another_user.id}-home"])
 
+    @patch(
+        "bookwyrm.activitystreams.ActivityStream.get_stores_for_objects",
+        return_value={},
+    )
     @patch("bookwyrm.activitystreams.LocalStream.remove_object_from_stores")
     @patch("bookwyrm.activitystreams.BooksStream.remove_object_from_stores")
     @patch("bookwyrm.models.activitypub_mixin.broadcast_task.apply_async")
@@ -176,6 +242,10 @@ class Activitystreams(TestCase):
         self.assertEqual(call_args[0][0], status)
         self.assertEqual(call_args[0][1], [])
 
+    @patch(
+        "bookwyrm.activitystreams.ActivityStream.get_stores_for_objects",
+        return_value={},
+    )
     @patch("bookwyrm.activitystreams.LocalStream.remove_object_from_stores")
     @patch("bookwyrm.activitystreams.BooksStream.remove_object_from_stores")
     @patch("bookwyrm.models.activitypub_mixin.broadcast_task.apply_async")
@@ -198,6 +268,10 @@ class Activitystreams(TestCase):
         self.assertTrue(f"{self.another_user.id}-home" in call_args[0][1])
         self.assertTrue(f"{self.local_user.id}-home" in call_args[0][1])
 
+    @patch(
+        "bookwyrm.activitystreams.ActivityStream.get_stores_for_objects",
+        return_value={},
+    )
     @patch("bookwyrm.activitystreams.LocalStream.remove_object_from_stores")
     @patch("bookwyrm.activitystreams.BooksStream.remove_object_from_stores")
     @patch("bookwyrm.models.activitypub_mixin.broadcast_task.apply_async")
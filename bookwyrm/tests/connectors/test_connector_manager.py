@@ -1,8 +1,12 @@
 """ interface between the app and various connectors """
-from django.test import TestCase
+import asyncio
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
 import responses
 
 from bookwyrm import models
+from bookwyrm.book_search import SearchResult
 from bookwyrm.connectors import connector_manager
 from bookwyrm.connectors.bookwyrm_connector import Connector as BookWyrmConnector
 
@@ -76,6 +80,98 @@ class ConnectorManager(TestCase):
         result = connector_manager.first_search_result("dkjfhg")
         self.assertIsNone(result)
 
+    def test_search_many(self):
+        """search for lots of things on each connector at once"""
+        connector = connector_manager.load_connector(self.remote_connector)
+
+        # pylint: disable=unused-argument
+        async def get_results(session, url, min_confidence, query):
+            if query == "nothing":
+                return None
+            return {
+                "connector": connector,
+                "results": [
+                    SearchResult(
+                        title=f"{query} {confidence}",
+                        key=f"http://fake.ciom/{query}",
+                        connector=connector,
+                        confidence=confidence,
+                    )
+                    for confidence in (0.5, 0.9, 0.9)
+                ],
+            }
+
+        with patch(
+            "bookwyrm.connectors.bookwyrm_connector.Connector.get_results",
+            side_effect=get_results,
+        ) as mock:
+            results = connector_manager.search_many(["one", "nothing"])
+        self.assertEqual(mock.call_count, 2)
+        self.assertEqual(results["one"].title, "one 0.9")
+        self.assertIsNone(results["nothing"])
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_search_cached(self):
+        """results are kept for the next search, even if there weren't any"""
+        connector = connector_manager.load_connector(self.remote_connector)
+
+        # pylint: disable=unused-argument
+        async def get_results(session, url, min_confidence, query):
+            if query == "nothing":
+                return None
+            return {
+                "connector": connector,
+                "results": [
+                    SearchResult(
+                        title=query, key="http://fake.ciom/1", connector=connector
+                    )
+                ],
+            }
+
+        with patch(
+            "bookwyrm.connectors.bookwyrm_connector.Connector.get_results",
+            side_effect=get_results,
+        ) as mock:
+            connector_manager.search("one")
+            results = connector_manager.search("one")
+            self.assertIsNone(connector_manager.search("nothing", return_first=True))
+            self.assertIsNone(connector_manager.search("nothing", return_first=True))
+            # a different confidence filters differently
+            connector_manager.search("one", min_confidence=0.5)
+        self.assertEqual(mock.call_count, 3)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["results"][0].title, "one")
+        self.assertEqual(
+            results[0]["results"][0].connector.identifier, "test_connector_remote"
+        )
+
+    def test_search_many_in_flight(self):
+        """the same search at the same time is only sent once"""
+        connector = connector_manager.load_connector(self.remote_connector)
+
+        # pylint: disable=unused-argument
+        async def get_results(session, url, min_confidence, query):
+            await asyncio.sleep(0.01)
+            return {
+                "connector": connector,
+                "results": [
+                    SearchResult(
+                        title=query, key="http://fake.ciom/1", connector=connector
+                    )
+                ],
+            }
+
+        with patch(
+            "bookwyrm.connectors.bookwyrm_connector.Connector.get_results",
+            side_effect=get_results,
+        ) as mock:
+            results = connector_manager.search_many(["dune", "Dune"])
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual(results["dune"].key, "http://fake.ciom/1")
+        self.assertEqual(results["Dune"].key, "http://fake.ciom/1")
+
     def test_load_connector(self):
         """load a connector object from the database entry"""
         connector = connector_manager.load_connector(self.remote_connector)
@@ -94,3 +190,22 @@ class ConnectorManager(TestCase):
 
         finna = models.Connector.objects.get(connector_file="finna")
         self.assertEqual("https://www.finna.fi", finna.base_url)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_connector_registry(self):
+        """connectors are loaded once, until one of them changes"""
+        registry = connector_manager.ConnectorRegistry()
+        connectors = registry.get_all()
+        self.assertEqual(len(connectors), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(registry.get_all(), connectors)
+            self.assertEqual(registry.get("test_connector_remote"), connectors[0])
+
+        # another process's registry is told about the change too
+        other_registry = connector_manager.ConnectorRegistry()
+        other_registry.get_all()
+        self.remote_connector.deactivate()
+        self.assertFalse(registry.get_all()[0].connector.active)
+        self.assertFalse(other_registry.get_all()[0].connector.active)
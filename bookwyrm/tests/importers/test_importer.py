@@ -5,12 +5,15 @@ import io
 from unittest.mock import patch
 import datetime
 
+from django.core.files.storage import InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 import responses
 
 from bookwyrm import models
 from bookwyrm.importers import Importer
 from bookwyrm.models.import_job import start_import_task, import_item_task
+from bookwyrm.models.import_job import import_items_task
 from bookwyrm.models.import_job import handle_imported_book
 
 
@@ -19,6 +22,7 @@ def make_date(*args):
     return datetime.datetime(*args, tzinfo=datetime.timezone.utc)
 
 
+# pylint: disable=too-many-public-methods
 @patch("bookwyrm.suggested_users.rerank_suggestions_task.delay")
 @patch("bookwyrm.activitystreams.populate_stream_task.delay")
 @patch("bookwyrm.activitystreams.add_book_statuses_task.delay")
@@ -112,6 +116,74 @@ class GenericImporter(TestCase):
         self.assertEqual(retry_items[1].index, 1)
         self.assertEqual(retry_items[1].normalized_data["id"], "48")
 
+    def test_upload_job(self, *_):
+        """the csv is stored and read when the job starts"""
+        self.importer.chunk_size = 3
+        upload = SimpleUploadedFile(
+            "generic.csv", self.csv.read().encode(), content_type="text/csv"
+        )
+        # pylint: disable-next=protected-access
+        source_file = models.ImportJob._meta.get_field("source_file")
+        with patch.object(source_file, "storage", InMemoryStorage()):
+            import_job = self.importer.upload_job(
+                self.local_user, upload, False, "unlisted"
+            )
+            self.assertEqual(import_job.source, "Import")
+            self.assertEqual(import_job.mappings["title"], "title")
+            self.assertFalse(import_job.items.exists())
+            self.assertTrue(import_job.source_file.name.startswith("imports/"))
+
+            MockTask = namedtuple("Task", ("id"))
+            with patch("bookwyrm.models.import_job.import_items_task.delay") as mock:
+                mock.return_value = MockTask(123)
+                start_import_task(import_job.id)
+            self.assertEqual(mock.call_count, 1)
+            self.assertEqual(len(mock.call_args.args[0]), 4)
+
+            import_job.refresh_from_db()
+            self.assertFalse(import_job.source_file)
+            self.assertFalse(source_file.storage.listdir("imports")[1])
+        self.assertEqual(import_job.item_count, 4)
+        self.assertEqual(import_job.pending_item_count, 4)
+        self.assertIsNone(import_job.fail_reason)
+        import_items = import_job.items.order_by("index")
+        self.assertEqual([item.index for item in import_items], [0, 1, 2, 3])
+        self.assertEqual(import_items[0].normalized_data["id"], "38")
+
+    def test_upload_job_bad_row(self, *_):
+        """the rows before a bad one are imported, and the job says so"""
+        self.importer.chunk_size = 3
+        data = self.csv.read().encode()
+        header, first_row, rest = data.split(b"\n", 2)
+        # blank lines are skipped, and put the bad bytes past the first read
+        upload = SimpleUploadedFile(
+            "generic.csv",
+            b"\n".join((header, first_row, b"\n" * 10000, b"\xff\xfe" + rest)),
+            content_type="text/csv",
+        )
+        # pylint: disable-next=protected-access
+        source_file = models.ImportJob._meta.get_field("source_file")
+        with patch.object(source_file, "storage", InMemoryStorage()):
+            import_job = self.importer.upload_job(
+                self.local_user, upload, False, "unlisted"
+            )
+            MockTask = namedtuple("Task", ("id"))
+            with patch("bookwyrm.models.import_job.import_items_task.delay") as mock:
+                mock.return_value = MockTask(123)
+                start_import_task(import_job.id)
+
+        import_job.refresh_from_db()
+        self.assertFalse(import_job.source_file)
+        self.assertEqual(import_job.item_count, 1)
+        self.assertIn("first row", import_job.fail_reason)
+
+    def test_upload_job_empty(self, *_):
+        """an empty csv is rejected before anything is saved"""
+        upload = SimpleUploadedFile("empty.csv", b"id,title\n", content_type="text/csv")
+        with self.assertRaises(ValueError):
+            self.importer.upload_job(self.local_user, upload, False, "unlisted")
+        self.assertFalse(models.ImportJob.objects.exists())
+
     def test_start_import(self, *_):
         """check that a task was created"""
         import_job = self.importer.create_job(
@@ -133,11 +205,86 @@ class GenericImporter(TestCase):
         )
 
         MockTask = namedtuple("Task", ("id"))
-        with patch("bookwyrm.models.import_job.import_item_task.delay") as mock:
+        with (
+            patch("bookwyrm.models.import_job.IMPORT_BATCH_SIZE", 3),
+            patch("bookwyrm.models.import_job.import_items_task.delay") as mock,
+        ):
             mock.return_value = MockTask(123)
             start_import_task(import_job.id)
 
-        self.assertEqual(mock.call_count, 4)
+        self.assertEqual(mock.call_count, 2)
+        items = import_job.items.order_by("index")
+        self.assertEqual(
+            [call.args[0] for call in mock.call_args_list],
+            [[item.id for item in items[:3]], [items[3].id]],
+        )
+        self.assertEqual(items[0].task_id, "123")
+
+    def test_import_items_task(self, *_):
+        """resolve a batch of items, locally where possible"""
+        self.book.isbn_13 = "9781250313195"
+        self.book.save()
+        import_job = self.importer.create_job(
+            self.local_user, self.csv, False, "unlisted"
+        )
+        item_ids = list(import_job.items.values_list("id", flat=True))
+
+        with (
+            patch(
+                "bookwyrm.connectors.connector_manager.search_many", return_value={}
+            ) as search,
+            patch("bookwyrm.models.activitypub_mixin.broadcast_task.apply_async"),
+        ):
+            import_items_task(item_ids)
+
+        # the isbn that wasn't found locally, then the titles without isbns
+        self.assertEqual(search.call_count, 2)
+        self.assertEqual(search.call_args_list[0].args[0], ["9780062445315"])
+        self.assertEqual(
+            sorted(search.call_args_list[1].args[0]),
+            ["Harrow the Ninth Tamsyn Muir", "Subcutanean Aaron Reed"],
+        )
+        items = import_job.items.order_by("index")
+        self.assertEqual(items[0].book_id, self.book.id)
+        self.assertEqual(
+            [item.fail_reason for item in items[1:]],
+            ["Could not find a match for book"] * 3,
+        )
+        self.assertTrue(
+            models.ShelfBook.objects.filter(
+                book=self.book, user=self.local_user
+            ).exists()
+        )
+        import_job.refresh_from_db()
+        self.assertTrue(import_job.complete)
+
+    def test_import_items_task_error(self, *_):
+        """a failed search fails the batch's unresolved items, not the job"""
+        self.book.isbn_13 = "9781250313195"
+        self.book.save()
+        import_job = self.importer.create_job(
+            self.local_user, self.csv, False, "unlisted"
+        )
+        item_ids = list(import_job.items.values_list("id", flat=True))
+
+        with (
+            patch(
+                "bookwyrm.connectors.connector_manager.search_many",
+                side_effect=ValueError("oh no"),
+            ),
+            patch("bookwyrm.models.activitypub_mixin.broadcast_task.apply_async"),
+            self.assertLogs("bookwyrm.models.import_job", level="ERROR"),
+        ):
+            import_items_task(item_ids)
+
+        items = import_job.items.order_by("index")
+        self.assertEqual(items[0].book_id, self.book.id)
+        self.assertIsNone(items[0].fail_reason)
+        self.assertEqual(
+            [item.fail_reason for item in items[1:]], ["Error loading book"] * 3
+        )
+        import_job.refresh_from_db()
+        self.assertTrue(import_job.complete)
 
     @responses.activate
     def test_import_item_task(self, *_):
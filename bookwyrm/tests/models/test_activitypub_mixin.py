@@ -1,18 +1,23 @@
 """ testing model activitypub utilities """
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock, DEFAULT
 from collections import namedtuple
 from dataclasses import dataclass
+from datetime import timedelta
 import re
+import time
 from django import db
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.utils import timezone
 
 from bookwyrm.activitypub.base_activity import ActivityObject
 from bookwyrm import models
+from bookwyrm.deliveries import Delivery, BULK
 from bookwyrm.models import base_model
 from bookwyrm.models.activitypub_mixin import (
     ActivitypubMixin,
     ActivityMixin,
     broadcast_task,
+    deliver_task,
     ObjectMixin,
     OrderedCollectionMixin,
     to_ordered_collection_page,
@@ -169,6 +174,34 @@ class ActivitypubMixins(TestCase):
         self.assertEqual(len(recipients), 1)
         self.assertEqual(recipients[0], self.remote_user.inbox)
 
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_get_recipients_cached(self, *_):
+        """the follower inboxes are cached until the followers change"""
+        MockSelf = namedtuple("Self", ("privacy", "user"))
+        mock_self = MockSelf("public", self.local_user)
+        models.UserFollows.objects.create(
+            user_subject=self.remote_user, user_object=self.local_user
+        )
+        self.assertEqual(
+            ActivitypubMixin.get_recipients(mock_self), [self.remote_user.inbox]
+        )
+
+        with self.assertNumQueries(0):
+            ActivitypubMixin.get_recipients(mock_self)
+
+        # the follower moved to a shared inbox
+        self.remote_user.shared_inbox = "https://example.com/inbox"
+        self.remote_user.save(broadcast=False, update_fields=["shared_inbox"])
+        self.assertEqual(
+            ActivitypubMixin.get_recipients(mock_self), ["https://example.com/inbox"]
+        )
+
+        # and unfollowed
+        models.UserFollows.objects.get(user_subject=self.remote_user).delete()
+        self.assertEqual(ActivitypubMixin.get_recipients(mock_self), [])
+
     def test_get_recipients_public_user_object_with_mention(self, *_):
         """determines the recipients for a user's object broadcast"""
         MockSelf = namedtuple("Self", ("privacy", "user"))
@@ -454,12 +487,171 @@ class ActivitypubMixins(TestCase):
         self.assertEqual(page_2.orderedItems[-1]["content"], "<p>test status 0</p>")
 
     def test_broadcast_task(self, *_):
-        """Should be calling asyncio"""
+        """Queue the activity, and start delivering to any server that's idle"""
         recipients = [
             "https://instance.example/user/inbox",
             "https://instance.example/okay/inbox",
         ]
-        with patch("bookwyrm.models.activitypub_mixin.asyncio.run") as mock:
-            broadcast_task(self.local_user.id, {}, recipients)
-        self.assertTrue(mock.called)
+        with (
+            patch(
+                "bookwyrm.models.activitypub_mixin.delivery_queue.add",
+                return_value=[("instance.example", "1 abc")],
+            ) as add_mock,
+            patch(
+                "bookwyrm.models.activitypub_mixin.deliver_task.apply_async"
+            ) as deliver_mock,
+        ):
+            broadcast_task(self.local_user.id, "{}", recipients, queue="imports")
+        add_mock.assert_called_once_with(self.local_user.id, "{}", recipients, BULK)
+        self.assertEqual(deliver_mock.call_count, 1)
+        self.assertEqual(
+            deliver_mock.call_args.kwargs["args"], ("instance.example", "1 abc")
+        )
+
+    def test_deliver_task(self, *_):
+        """Send what's waiting on the worker's event loop, and retry failures"""
+        server = models.FederatedServer.objects.create(
+            server_name="instance.example", delivery_failures=2
+        )
+        deliveries = [
+            Delivery(
+                "a", "https://instance.example/a/inbox", 0, 0, self.local_user.id, "{}"
+            ),
+            Delivery(
+                "a", "https://instance.example/b/inbox", 0, 0, self.local_user.id, "{}"
+            ),
+            Delivery(
+                "b", "https://instance.example/c/inbox", 2, 1, self.local_user.id, "{}"
+            ),
+            Delivery(
+                "b", "https://instance.example/d/inbox", 0, 1, self.local_user.id, "{}"
+            ),
+        ]
+        with (
+            patch.multiple(
+                "bookwyrm.models.activitypub_mixin.delivery_queue",
+                pop=MagicMock(return_value=deliveries),
+                next_due=MagicMock(return_value=None),
+                reschedule=DEFAULT,
+                finish=DEFAULT,
+                record=DEFAULT,
+                retry=DEFAULT,
+            ) as queue_mocks,
+            patch("bookwyrm.models.activitypub_mixin.broadcast_pool.run") as mock,
+        ):
+            mock.side_effect = lambda coroutine: coroutine.close() or [
+                202,
+                429,
+                500,
+                410,
+            ]
+            deliver_task("instance.example")
+
         self.assertEqual(mock.call_count, 1)
+        retry = queue_mocks["retry"].call_args.args
+        self.assertEqual(retry[0], "instance.example")
+        self.assertEqual(retry[1], deliveries[1:3])
+        self.assertEqual(queue_mocks["record"].call_args.args[1:3], (1, 3))
+        queue_mocks["finish"].assert_called_once_with("instance.example", deliveries)
+        # nothing left, so the server is released
+        queue_mocks["reschedule"].assert_called_once_with("instance.example", None)
+        # it answered, so it's up
+        server.refresh_from_db()
+        self.assertEqual(server.delivery_failures, 0)
+
+    def test_deliver_task_unreachable(self, *_):
+        """Count it against the server when nothing gets through"""
+        server = models.FederatedServer.objects.create(server_name="down.example")
+        deliveries = [
+            Delivery(
+                "a", "https://down.example/a/inbox", 0, 0, self.local_user.id, "{}"
+            ),
+        ]
+        with (
+            patch.multiple(
+                "bookwyrm.models.activitypub_mixin.delivery_queue",
+                pop=MagicMock(return_value=deliveries),
+                next_due=MagicMock(return_value=time.time()),
+                is_scheduled=MagicMock(return_value=True),
+                reschedule=MagicMock(return_value="2 def"),
+                finish=DEFAULT,
+                record=DEFAULT,
+                retry=DEFAULT,
+            ),
+            patch(
+                "bookwyrm.models.activitypub_mixin.broadcast_pool.run",
+                side_effect=lambda coroutine: coroutine.close() or [None],
+            ),
+            patch(
+                "bookwyrm.models.activitypub_mixin.deliver_task.apply_async"
+            ) as deliver_mock,
+        ):
+            deliver_task("down.example", "1 abc")
+
+        server.refresh_from_db()
+        self.assertEqual(server.delivery_failures, 1)
+        # there's still something waiting
+        self.assertEqual(deliver_mock.call_count, 1)
+        self.assertEqual(
+            deliver_mock.call_args.kwargs["args"], ("down.example", "2 def")
+        )
+
+    def test_deliver_task_replaced(self, *_):
+        """A task that's been taken over by another one doesn't run"""
+        with (
+            patch.multiple(
+                "bookwyrm.models.activitypub_mixin.delivery_queue",
+                is_scheduled=MagicMock(return_value=False),
+                pop=DEFAULT,
+                reschedule=DEFAULT,
+            ) as queue_mocks,
+        ):
+            deliver_task("instance.example", "1 abc")
+        self.assertFalse(queue_mocks["pop"].called)
+        self.assertFalse(queue_mocks["reschedule"].called)
+
+    def test_deliver_task_paused(self, *_):
+        """Don't spend any time on servers that have stopped answering, but keep
+        their deliveries for when they're back"""
+        models.FederatedServer.objects.create(
+            server_name="down.example",
+            delivery_paused_until=timezone.now() + timedelta(hours=1),
+        )
+        with (
+            patch.multiple(
+                "bookwyrm.models.activitypub_mixin.delivery_queue",
+                pop=DEFAULT,
+                clear=DEFAULT,
+                reschedule=MagicMock(return_value="2 def"),
+            ) as queue_mocks,
+            patch("bookwyrm.models.activitypub_mixin.broadcast_pool.run") as mock,
+            patch(
+                "bookwyrm.models.activitypub_mixin.deliver_task.apply_async"
+            ) as deliver_mock,
+        ):
+            deliver_task("down.example")
+        self.assertFalse(mock.called)
+        self.assertFalse(queue_mocks["pop"].called)
+        self.assertFalse(queue_mocks["clear"].called)
+        countdown = deliver_mock.call_args.kwargs["countdown"]
+        self.assertTrue(3590 < countdown <= 3600)
+
+    def test_deliver_task_blocked(self, *_):
+        """Nothing is sent to a blocked server"""
+        models.FederatedServer.objects.create(
+            server_name="blocked.example", status="blocked"
+        )
+        with (
+            patch.multiple(
+                "bookwyrm.models.activitypub_mixin.delivery_queue",
+                pop=DEFAULT,
+                clear=DEFAULT,
+                reschedule=DEFAULT,
+            ) as queue_mocks,
+            patch("bookwyrm.models.activitypub_mixin.broadcast_pool.run") as mock,
+        ):
+            deliver_task("blocked.example")
+        self.assertFalse(mock.called)
+        self.assertFalse(queue_mocks["pop"].called)
+        queue_mocks["clear"].assert_called_once_with("blocked.example")
+        queue_mocks["reschedule"].assert_called_once_with("blocked.example", None)
@@ -1,8 +1,9 @@
 """ testing models """
 from unittest.mock import patch
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-from bookwyrm import models
+from bookwyrm import models, settings
+from bookwyrm.connectors import connector_manager
 
 
 class FederatedServer(TestCase):
@@ -65,3 +66,59 @@ class FederatedServer(TestCase):
         self.inactive_remote_user.refresh_from_db()
         self.assertFalse(self.inactive_remote_user.is_active)
         self.assertEqual(self.inactive_remote_user.deactivation_reason, "self_deletion")
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_block_unblock_connector(self):
+        """the connectors are loaded again when a server's connector is blocked"""
+
+        def get_identifiers():
+            return [c.connector.identifier for c in connector_manager.get_connectors()]
+
+        # saving a bookwyrm server creates its connector
+        self.server.application_type = "bookwyrm"
+        self.server.save(update_fields=["application_type"])
+        self.assertIn("test.server", get_identifiers())
+
+        self.server.block()
+        self.assertNotIn("test.server", get_identifiers())
+
+        self.server.unblock()
+        self.assertIn("test.server", get_identifiers())
+
+    def test_record_deliveries(self):
+        """stop delivering to a server that keeps failing"""
+        for _ in range(settings.BROADCAST_FAILURE_THRESHOLD - 1):
+            models.FederatedServer.record_deliveries(set(), {"test.server"})
+        self.server.refresh_from_db()
+        self.assertIsNone(self.server.delivery_paused_until)
+        self.assertEqual(
+            models.FederatedServer.get_undeliverable_hosts(["test.server"]), {}
+        )
+
+        models.FederatedServer.record_deliveries(set(), {"test.server"})
+        self.server.refresh_from_db()
+        self.assertEqual(
+            self.server.delivery_failures, settings.BROADCAST_FAILURE_THRESHOLD
+        )
+        self.assertIsNotNone(self.server.delivery_paused_until)
+        self.assertEqual(
+            models.FederatedServer.get_undeliverable_hosts(["test.server"]),
+            {"test.server": self.server.delivery_paused_until},
+        )
+
+        # it's back
+        models.FederatedServer.record_deliveries({"test.server"}, set())
+        self.server.refresh_from_db()
+        self.assertEqual(self.server.delivery_failures, 0)
+        self.assertIsNone(self.server.delivery_paused_until)
+
+    def test_get_backoff(self):
+        """wait twice as long each time"""
+        delay = settings.BROADCAST_RETRY_DELAY
+        self.assertEqual(models.FederatedServer.get_backoff(0), delay)
+        self.assertEqual(models.FederatedServer.get_backoff(3), delay * 8)
+        self.assertEqual(
+            models.FederatedServer.get_backoff(100), settings.BROADCAST_MAX_BACKOFF
+        )
@@ -207,3 +207,64 @@ class ImportJob(TestCase):
                 book = item.get_book_from_identifier()
 
         self.assertEqual(book.title, "Sabriel")
+
+    def test_item_counts(self):
+        """the job's totals follow its items as they're saved"""
+        book = models.Edition.objects.create(title="Example Edition")
+        items = [
+            models.ImportItem.objects.create(
+                index=index, job=self.job, data={}, normalized_data={}
+            )
+            for index in range(3)
+        ]
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.item_count, 3)
+        self.assertEqual(self.job.pending_item_count, 3)
+        self.assertEqual(self.job.percent_complete, 0)
+
+        items[0].book = book
+        items[0].save()
+        items[1].fail_reason = "Could not find a match for book"
+        items[1].save()
+        items[1].update_job()
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.pending_item_count, 1)
+        self.assertEqual(self.job.successful_item_count, 1)
+        self.assertEqual(self.job.failed_item_count, 1)
+        self.assertEqual(self.job.percent_complete, 66)
+        self.assertFalse(self.job.complete)
+
+        # a failed item is found on retry
+        items[1].fail_reason = None
+        items[1].book = book
+        items[1].save()
+        # saving without changes doesn't count it again
+        items[1].save()
+        items[2].update_job()
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.successful_item_count, 2)
+        self.assertEqual(self.job.failed_item_count, 0)
+        self.assertFalse(self.job.complete)
+
+        items[2].fail_reason = "Error loading book"
+        items[2].save()
+        items[2].update_job()
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.pending_item_count, 0)
+        self.assertEqual(self.job.failed_item_count, 1)
+        self.assertTrue(self.job.complete)
+
+    def test_stop_job_counts(self):
+        """stopping a job fails what was left"""
+        for index in range(2):
+            models.ImportItem.objects.create(
+                index=index, job=self.job, data={}, normalized_data={}
+            )
+        self.job.refresh_from_db()
+        with patch("bookwyrm.models.import_job.app.control.revoke"):
+            self.job.stop_job()
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.item_count, 2)
+        self.assertEqual(self.job.pending_item_count, 0)
+        self.assertEqual(self.job.failed_item_count, 2)
@@ -196,6 +196,115 @@ class Notification(TestCase):
         )
         self.assertFalse(models.Notification.objects.exists())
 
+    @patch("bookwyrm.models.notification.r")
+    def test_unread_counts_on_save(self, redis_mock):
+        """the counts go up with new notifications and down as they're read"""
+        pipeline = redis_mock.pipeline.return_value
+        pipeline.execute.return_value = [1, 100, 1, 100]
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = models.Notification.objects.create(
+                user=self.local_user, notification_type=models.NotificationType.MENTION
+            )
+        self.assertEqual(
+            [call.args for call in pipeline.incrby.call_args_list],
+            [
+                (f"{self.local_user.id}-unread-notifications", 1),
+                (f"{self.local_user.id}-unread-mentions", 1),
+            ],
+        )
+        self.assertFalse(redis_mock.delete.called)
+
+        pipeline.incrby.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.save()
+        self.assertFalse(pipeline.incrby.called)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.read = True
+            notification.save()
+        self.assertEqual(pipeline.incrby.call_args.args[1], -1)
+
+    @patch("bookwyrm.models.notification.r")
+    def test_unread_counts_on_delete(self, redis_mock):
+        """an unread notification going away lowers the count"""
+        pipeline = redis_mock.pipeline.return_value
+        pipeline.execute.return_value = [0, -1]
+        notification = models.Notification.objects.create(
+            user=self.local_user, notification_type=models.NotificationType.FAVORITE
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.delete()
+        pipeline.incrby.assert_called_once_with(
+            f"{self.local_user.id}-unread-notifications", -1
+        )
+        # the count had expired, so it has to be counted again
+        redis_mock.delete.assert_called_once_with(
+            f"{self.local_user.id}-unread-notifications"
+        )
+
+    @patch("bookwyrm.models.notification.r")
+    def test_mark_read(self, redis_mock):
+        """only the unread notifications given are marked, in one change"""
+        pipeline = redis_mock.pipeline.return_value
+        pipeline.execute.return_value = [1, 100, 0, 100]
+        favorite = models.Notification.objects.create(
+            user=self.local_user, notification_type=models.NotificationType.FAVORITE
+        )
+        mention = models.Notification.objects.create(
+            user=self.local_user, notification_type=models.NotificationType.MENTION
+        )
+        already_read = models.Notification.objects.create(
+            user=self.local_user,
+            notification_type=models.NotificationType.MENTION,
+            read=True,
+        )
+        other = models.Notification.objects.create(
+            user=self.local_user, notification_type=models.NotificationType.FAVORITE
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Notification.mark_read([favorite, mention, already_read])
+
+        self.assertEqual(
+            list(
+                models.Notification.objects.filter(read=True)
+                .order_by("id")
+                .values_list("id", flat=True)
+            ),
+            [favorite.id, mention.id, already_read.id],
+        )
+        other.refresh_from_db()
+        self.assertFalse(other.read)
+        self.assertEqual(
+            [call.args for call in pipeline.incrby.call_args_list],
+            [
+                (f"{self.local_user.id}-unread-notifications", -2),
+                (f"{self.local_user.id}-unread-mentions", -1),
+            ],
+        )
+
+    @patch("bookwyrm.models.notification.r")
+    def test_get_unread_counts(self, redis_mock):
+        """counts come from redis, or from the database the first time"""
+        redis_mock.mget.return_value = [b"3", b"1"]
+        with self.assertNumQueries(0):
+            counts = models.Notification.get_unread_counts(self.local_user.id)
+        self.assertEqual(counts, (3, 1))
+
+        models.Notification.objects.create(
+            user=self.local_user, notification_type=models.NotificationType.REPLY
+        )
+        models.Notification.objects.create(
+            user=self.local_user,
+            notification_type=models.NotificationType.FOLLOW,
+            read=True,
+        )
+        redis_mock.mget.return_value = [None, None]
+        counts = models.Notification.get_unread_counts(self.local_user.id)
+        self.assertEqual(counts, (1, 1))
+        pipeline = redis_mock.pipeline.return_value
+        self.assertEqual(pipeline.set.call_count, 2)
+
 
 class NotifyInviteRequest(TestCase):
     """let admins know of invite requests"""
@@ -0,0 +1,142 @@
+""" testing the aggregate ratings of works """
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from bookwyrm import models
+
+
+@patch("bookwyrm.activitystreams.add_status_task.delay")
+@patch("bookwyrm.activitystreams.remove_status_task.delay")
+@patch("bookwyrm.models.activitypub_mixin.broadcast_task.apply_async")
+class WorkRating(TestCase):
+    """how a work has been rated"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """create some filler objects"""
+        with (
+            patch("bookwyrm.suggested_users.rerank_suggestions_task.delay"),
+            patch("bookwyrm.activitystreams.populate_stream_task.delay"),
+            patch("bookwyrm.lists_stream.populate_lists_task.delay"),
+        ):
+            cls.local_user = models.User.objects.create_user(
+                "mouse@example.com",
+                "mouse@mouse.mouse",
+                "mouseword",
+                local=True,
+                localname="mouse",
+            )
+        cls.work = models.Work.objects.create(title="Work title")
+        cls.book = models.Edition.objects.create(
+            title="Test Book", parent_work=cls.work
+        )
+        cls.other_edition = models.Edition.objects.create(
+            title="Another Test Book", parent_work=cls.work
+        )
+
+    def test_refresh(self, *_):
+        """counting up ratings across editions"""
+        models.ReviewRating.objects.create(
+            user=self.local_user, book=self.book, rating=4.5
+        )
+        models.ReviewRating.objects.create(
+            user=self.local_user, book=self.other_edition, rating=2
+        )
+        models.Review.objects.create(user=self.local_user, book=self.book, rating=0)
+        models.ReviewRating.objects.create(
+            user=self.local_user, book=self.book, rating=5, deleted=True
+        )
+
+        ratings = models.WorkRating.refresh([self.work.id])
+
+        rating = models.WorkRating.objects.get(work=self.work)
+        self.assertEqual(ratings[self.work.id], rating)
+        self.assertEqual(rating.rating_count, 2)
+        self.assertEqual(rating.average, 3.25)
+        self.assertEqual(rating.histogram, [0, 0, 0, 1, 0, 0, 0, 0, 1, 0])
+
+    def test_update_on_save_and_delete(self, *_):
+        """ratings are counted again as they change"""
+        with self.captureOnCommitCallbacks(execute=True):
+            review = models.ReviewRating.objects.create(
+                user=self.local_user, book=self.book, rating=4
+            )
+        self.assertEqual(models.WorkRating.objects.get(work=self.work).average, 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review.rating = 2
+            review.save()
+        self.assertEqual(models.WorkRating.objects.get(work=self.work).average, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review.delete()
+        self.assertEqual(models.WorkRating.objects.get(work=self.work).rating_count, 0)
+
+    def test_update_on_save_unchanged(self, *_):
+        """saving a review without changing its rating doesn't count again"""
+        review = models.ReviewRating.objects.create(
+            user=self.local_user, book=self.book, rating=4
+        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            review.content = "hi"
+            review.save()
+        self.assertEqual(callbacks, [])
+
+    def test_get_ratings(self, *_):
+        """look up a page of books at once"""
+        models.ReviewRating.objects.create(
+            user=self.local_user, book=self.book, rating=4
+        )
+        unrated = models.Edition.objects.create(
+            title="Unrated", parent_work=models.Work.objects.create(title="Work")
+        )
+        models.WorkRating.refresh([self.work.id])
+
+        # the unrated work hasn't been counted yet, so it's counted and stored
+        with self.assertNumQueries(3):
+            ratings = models.WorkRating.get_ratings(
+                [self.book, self.other_edition, unrated]
+            )
+        self.assertEqual(
+            ratings, {self.book.id: 4, self.other_edition.id: 4, unrated.id: 0}
+        )
+        self.assertTrue(
+            models.WorkRating.objects.filter(work=unrated.parent_work).exists()
+        )
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_get_ratings_cached(self, *_):
+        """averages are kept in the cache, and updated when they're counted"""
+        cache.clear()
+        models.WorkRating.refresh([self.work.id])
+        with self.assertNumQueries(0):
+            ratings = models.WorkRating.get_ratings([self.book])
+        self.assertEqual(ratings, {self.book.id: 0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            models.ReviewRating.objects.create(
+                user=self.local_user, book=self.book, rating=4
+            )
+        with self.assertNumQueries(0):
+            ratings = models.WorkRating.get_ratings([self.book, self.other_edition])
+        self.assertEqual(ratings, {self.book.id: 4, self.other_edition.id: 4})
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_user_rating_cleared_on_commit(self, *_):
+        """the user's rating isn't forgotten until the new one is saved"""
+        key = f"user-rating-{self.local_user.id}-{self.book.id}"
+        cache.set(key, 3)
+        with self.captureOnCommitCallbacks() as callbacks:
+            models.ReviewRating.objects.create(
+                user=self.local_user, book=self.book, rating=4
+            )
+            self.assertEqual(cache.get(key), 3)
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(cache.get(key))
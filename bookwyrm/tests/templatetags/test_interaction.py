@@ -1,4 +1,5 @@
 """ style fixes and lookups for templates """
+from types import SimpleNamespace
 from unittest.mock import patch
 
 from django.test import TestCase
@@ -54,3 +55,35 @@ class InteractionTags(TestCase):
         with patch("bookwyrm.models.activitypub_mixin.broadcast_task.apply_async"):
             models.Boost.objects.create(user=self.user, boosted_status=status)
         self.assertTrue(interaction.get_user_boosted(self.user, status))
+
+    def test_preload_interactions(self, *_):
+        """a page of statuses is looked up all at once"""
+        liked = models.Review.objects.create(user=self.remote_user, book=self.book)
+        boosted = models.Review.objects.create(user=self.remote_user, book=self.book)
+        with patch("bookwyrm.models.activitypub_mixin.broadcast_task.apply_async"):
+            models.Favorite.objects.create(user=self.user, status=liked)
+            boost = models.Boost.objects.create(user=self.user, boosted_status=boosted)
+        book_list = models.List.objects.create(user=self.remote_user, name="hi")
+        self.user.saved_lists.add(book_list)
+
+        with self.assertNumQueries(6):
+            interaction.preload_interactions(
+                self.user, [liked, boost], book_lists=[book_list]
+            )
+
+        with self.assertNumQueries(0):
+            self.assertTrue(interaction.get_user_liked(self.user, liked))
+            self.assertFalse(interaction.get_user_liked(self.user, boosted))
+            self.assertTrue(interaction.get_user_boosted(self.user, boosted))
+            self.assertFalse(interaction.get_user_boosted(self.user, liked))
+            self.assertTrue(interaction.get_user_saved_lists(self.user, book_list))
+            self.assertEqual(
+                interaction.get_relationship(
+                    {"request": SimpleNamespace(user=self.user)}, self.remote_user
+                ),
+                {
+                    "is_following": False,
+                    "is_follow_pending": False,
+                    "is_blocked": False,
+                },
+            )
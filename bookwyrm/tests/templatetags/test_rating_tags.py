@@ -89,3 +89,13 @@ class RatingTags(TestCase):
     def test_get_user_rating_doesnt_exist(self, *_):
         """there is no rating available"""
         self.assertEqual(rating_tags.get_user_rating(self.book, self.local_user), 0)
+
+    @patch("bookwyrm.models.activitypub_mixin.broadcast_task.apply_async")
+    def test_preload_ratings(self, *_):
+        """the ratings of a page of books are looked up at once"""
+        models.ReviewRating.objects.create(
+            user=self.remote_user, rating=4, book=self.book
+        )
+        rating_tags.preload_ratings([self.book])
+        with self.assertNumQueries(0):
+            self.assertEqual(rating_tags.get_rating(self.book, self.local_user), 4)
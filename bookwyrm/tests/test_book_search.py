@@ -101,6 +101,21 @@ class BookSearch(TestCase):
         result = book_search.search_identifiers("hello", return_first=True)
         self.assertEqual(result, self.second_edition)
 
+    def test_search_identifiers_many(self):
+        """a batch of identifiers is looked up at once"""
+        with self.assertNumQueries(1):
+            results = book_search.search_identifiers_many(
+                ["hello", "22222222x", "0000000000", "nope"]
+            )
+        self.assertEqual(
+            results,
+            {
+                "hello": self.second_edition,
+                "22222222x": self.third_edition,
+                "0000000000": self.first_edition,
+            },
+        )
+
     def test_search_title_author(self):
         """search by unique identifiers"""
         results = book_search.search_title_author("annoying", min_confidence=0)
@@ -116,7 +131,8 @@ class BookSearch(TestCase):
 
     def test_search_title_author_one_edition_per_work(self):
         """at most one edition per work"""
-        results = book_search.search_title_author("Edition", 0)
+        with self.assertNumQueries(1):
+            results = list(book_search.search_title_author("Edition", 0))
         self.assertEqual(results, [self.first_edition])  # highest edition rank
 
     def test_format_search_result(self):
@@ -0,0 +1,131 @@
+""" testing the outgoing delivery queue """
+import json
+import time
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from bookwyrm.deliveries import delivery_queue, Delivery, BULK
+
+
+@patch("bookwyrm.deliveries.r")
+class DeliveryQueue(TestCase):
+    """activities waiting to go out to other servers"""
+
+    def test_add(self, redis_mock):
+        """the activity is stored once, and queued per server"""
+        pipeline = redis_mock.pipeline.return_value
+        # two.example already has a task on the way
+        pipeline.execute.return_value = [True, 2, True, 1, True, None, b"1 abc"]
+
+        hosts = delivery_queue.add(
+            1,
+            "{}",
+            [
+                "https://one.example/inbox",
+                "https://two.example/inbox",
+                "https://one.example/user/mouse/inbox",
+            ],
+            BULK,
+        )
+
+        self.assertEqual([host for host, _ in hosts], ["one.example"])
+        self.assertEqual(pipeline.get.call_count, 2)
+        # the payload, and the new task's token
+        self.assertEqual(pipeline.set.call_count, 2)
+        self.assertEqual(
+            pipeline.set.call_args.args,
+            ("deliveries-one.example-scheduled", hosts[0][1]),
+        )
+        self.assertEqual(pipeline.zadd.call_count, 2)
+        queue, members = pipeline.zadd.call_args_list[0].args
+        self.assertEqual(queue, "deliveries-one.example-1")
+        self.assertEqual(
+            [json.loads(m)[1:] for m in members],
+            [
+                ["https://one.example/inbox", 0],
+                ["https://one.example/user/mouse/inbox", 0],
+            ],
+        )
+
+    def test_add_takes_over_backoff(self, redis_mock):
+        """new deliveries don't wait for a task that's waiting out a backoff"""
+        pipeline = redis_mock.pipeline.return_value
+        later = delivery_queue.make_token(time.time() + 600)
+        pipeline.execute.return_value = [True, 1, True, later.encode()]
+
+        hosts = delivery_queue.add(1, "{}", ["https://one.example/inbox"])
+
+        self.assertEqual([host for host, _ in hosts], ["one.example"])
+        self.assertNotEqual(hosts[0][1], later)
+        self.assertLess(delivery_queue.get_due(hosts[0][1]), time.time() + 1)
+
+    def test_pop(self, redis_mock):
+        """urgent deliveries first, and expired activities are dropped"""
+        redis_mock.eval.side_effect = [
+            [json.dumps(["a", "https://one.example/inbox", 0]).encode()],
+            [json.dumps(["b", "https://one.example/inbox", 1]).encode()],
+        ]
+        redis_mock.mget.side_effect = lambda keys: [
+            json.dumps({"sender": 1, "activity": "{}"}) if k == "delivery-a" else None
+            for k in keys
+        ]
+
+        deliveries = delivery_queue.pop("one.example", 10)
+
+        self.assertEqual(len(deliveries), 1)
+        self.assertEqual(deliveries[0].key, "a")
+        self.assertEqual(deliveries[0].sender_id, 1)
+        # claimed deliveries stay in the queue until they're finished
+        self.assertEqual(redis_mock.eval.call_count, 2)
+        pipeline = redis_mock.pipeline.return_value
+        pipeline.zrem.assert_called_once_with(
+            "deliveries-one.example-1",
+            json.dumps(["b", "https://one.example/inbox", 1]),
+        )
+
+    def test_finish_and_retry(self, redis_mock):
+        """sent deliveries leave the queue, and failures go back with a delay"""
+        pipeline = redis_mock.pipeline.return_value
+        sent = Delivery("a", "https://one.example/inbox", 0, 0, 1, "{}")
+        failed = Delivery("b", "https://one.example/inbox", 2, 1, 1, "{}")
+
+        delivery_queue.retry("one.example", [failed], [60])
+        pipeline.zrem.assert_called_once_with(
+            "deliveries-one.example-1",
+            json.dumps(["b", "https://one.example/inbox", 2]),
+        )
+        queue, members = pipeline.zadd.call_args.args
+        self.assertEqual(queue, "deliveries-one.example-1")
+        self.assertEqual(
+            list(members), [json.dumps(["b", "https://one.example/inbox", 3])]
+        )
+
+        pipeline.zrem.reset_mock()
+        delivery_queue.finish("one.example", [sent])
+        pipeline.zrem.assert_called_once_with(
+            "deliveries-one.example-0",
+            json.dumps(["a", "https://one.example/inbox", 0]),
+        )
+
+    def test_reschedule(self, redis_mock):
+        """a task hands over to the next one, unless it's been replaced"""
+        redis_mock.eval.return_value = 1
+        token = delivery_queue.reschedule("one.example", "1 abc", 30)
+        self.assertIsNotNone(token)
+        args = redis_mock.eval.call_args.args
+        self.assertEqual(
+            args[2:5], ("deliveries-one.example-scheduled", "1 abc", token)
+        )
+        self.assertEqual(args[5], 30 + delivery_queue.schedule_timeout)
+
+        # releasing the server
+        self.assertIsNone(delivery_queue.reschedule("one.example", "1 abc"))
+        self.assertEqual(redis_mock.eval.call_args.args[4], "")
+
+        redis_mock.eval.return_value = 0
+        self.assertIsNone(delivery_queue.reschedule("one.example", "1 abc", 30))
+
+        redis_mock.get.return_value = b"2 def"
+        self.assertFalse(delivery_queue.is_scheduled("one.example", "1 abc"))
+        self.assertTrue(delivery_queue.is_scheduled("one.example", "2 def"))
@@ -1,6 +1,9 @@
 """ test ISBN hyphenator for books """
+from xml.etree import ElementTree
+
 from django.test import TestCase
 
+from bookwyrm.isbn.isbn import IsbnHyphenator, compile_ranges
 from bookwyrm.isbn.isbn import hyphenator_singleton as hyphenator
 
 
@@ -36,3 +39,22 @@ class TestISBN(TestCase):
         self.assertEqual(hyphenator.hyphenate("978-0-4633461-1-2"), "978-0-4633461-1-2")
         self.assertEqual(hyphenator.hyphenate("9-0-4633461-1-2"), "9-0-4633461-1-2")
         self.assertEqual(hyphenator.hyphenate("90463346112"), "90463346112")
+
+    def test_compiled_ranges(self):
+        """the ranges are read back from the compiled file the same"""
+        self.assertEqual(hyphenator.hyphenate("9780439554930"), "978-0-439-55493-0")
+        reloaded = IsbnHyphenator()
+        self.assertEqual(reloaded.hyphenate("9780439554930"), "978-0-439-55493-0")
+        self.assertEqual(reloaded.hyphenate("9786268533251"), "9786268533251")
+
+        ranges = compile_ranges(
+            ElementTree.fromstring(
+                """<ISBNRangeMessage><RegistrationGroups><Group>
+                <Prefix>978-0</Prefix><Rules>
+                <Rule><Range>2000000-2279999</Range><Length>3</Length></Rule>
+                <Rule><Range>0000000-1999999</Range><Length>2</Length></Rule>
+                <Rule><Range>2280000-2289999</Range><Length>0</Length></Rule>
+                </Rules></Group></RegistrationGroups></ISBNRangeMessage>"""
+            )
+        )
+        self.assertEqual(ranges, {"978-0": [(0, 1999999, 2), (2000000, 2279999, 3)]})
@@ -10,13 +10,20 @@ import responses
 
 import pytest
 
+from Crypto.PublicKey import RSA
 from django.test import TestCase, Client
 from django.utils.http import http_date
 
 from bookwyrm import models
 from bookwyrm.activitypub import Follow
 from bookwyrm.settings import DOMAIN, NETLOC
-from bookwyrm.signatures import create_key_pair, make_signature, make_digest
+from bookwyrm.signatures import (
+    create_key_pair,
+    forget_signers,
+    get_signer,
+    make_signature,
+    make_digest,
+)
 
 
 def get_follow_activity(follower, followee):
@@ -225,3 +232,24 @@ class Signature(TestCase):
                 self.mouse, date=http_date(time.time() - 301)
             )
             self.assertEqual(response.status_code, 401)
+
+    def test_get_signer_cached(self):
+        """parsed keys are reused until the key pair changes"""
+        key_pair = self.mouse.key_pair
+        forget_signers(key_pair.id)
+        with patch(
+            "bookwyrm.signatures.RSA.import_key", wraps=RSA.import_key
+        ) as import_mock:
+            signer = get_signer(key_pair.private_key, key_pair.id)
+            self.assertEqual(get_signer(key_pair.private_key, key_pair.id), signer)
+            self.assertEqual(import_mock.call_count, 1)
+
+            # a new key is parsed fresh
+            private_key, _ = create_key_pair()
+            self.assertNotEqual(get_signer(private_key, key_pair.id), signer)
+            self.assertEqual(import_mock.call_count, 2)
+
+            # saving the key pair clears it out
+            key_pair.save()
+            get_signer(key_pair.private_key, key_pair.id)
+            self.assertEqual(import_mock.call_count, 3)
@@ -140,6 +140,137 @@ class SuggestedUsers(TestCase):
         args = store_mock.call_args[0]
         self.assertEqual(args[0], f"{self.local_user.id}-suggestions")
 
+    def test_rerank_obj(self, *_):
+        """every viewer's rank for a user is counted in one go"""
+        suggested = models.User.objects.create_user(
+            "nutria@local.com",
+            "nutria@nutria.com",
+            "nutriaword",
+            local=True,
+            localname="nutria",
+            discoverable=True,
+        )
+        viewer = models.User.objects.create_user(
+            "fish@local.com", "fish@fish.com", "fishword", local=True, localname="fish"
+        )
+        for i in range(3):
+            user = models.User.objects.create_user(
+                f"{i}@local.com",
+                f"{i}@nutria.com",
+                "password",
+                local=True,
+                localname=i,
+            )
+            user.following.add(suggested)
+            # the first two are followed by the mouse, the last by the fish
+            user.followers.add(self.local_user if i < 2 else viewer)
+
+        with patch("bookwyrm.suggested_users.r") as redis_mock:
+            pipeline = redis_mock.pipeline.return_value
+            suggested_users.rerank_obj(suggested, update_only=False)
+
+        ranks = {
+            call.args[0]: call.args[1][suggested.id]
+            for call in pipeline.zadd.call_args_list
+        }
+        self.assertEqual(ranks[suggested_users.store_id(self.local_user)], 2)
+        self.assertEqual(ranks[suggested_users.store_id(viewer)], 1)
+        for store, rank in ranks.items():
+            annotated = get_annotated_users(
+                models.User.objects.get(id=store.split("-")[0]), id=suggested.id
+            ).first()
+            self.assertEqual(rank, annotated.mutuals)
+
+    def test_rerank_obj_undiscoverable(self, *_):
+        """don't suggest people who don't want to be found"""
+        with patch("bookwyrm.suggested_users.r") as redis_mock:
+            suggested_users.rerank_obj(self.local_user)
+        self.assertFalse(redis_mock.pipeline.called)
+
+    def test_update_mutuals(self, *_):
+        """a new follow only touches the stores of the follower's followers"""
+        followed = models.User.objects.create_user(
+            "nutria@local.com",
+            "nutria@nutria.com",
+            "nutriaword",
+            local=True,
+            localname="nutria",
+            discoverable=True,
+        )
+        follower = models.User.objects.create_user(
+            "fish@local.com", "fish@fish.com", "fishword", local=True, localname="fish"
+        )
+        bystander = models.User.objects.create_user(
+            "rat@local.com", "rat@rat.com", "ratword", local=True, localname="rat"
+        )
+        self.local_user.following.add(follower)
+        follower.following.add(followed)
+
+        with patch("bookwyrm.suggested_users.r") as redis_mock:
+            pipeline = redis_mock.pipeline.return_value
+            pipeline.execute.return_value = [3.0]
+            suggested_users.update_mutuals(follower, followed, 1)
+
+        pipeline.zadd.assert_called_once_with(
+            suggested_users.store_id(self.local_user),
+            {followed.id: 1},
+            xx=True,
+            incr=True,
+        )
+        self.assertNotIn(
+            suggested_users.store_id(bystander),
+            [call.args[0] for call in pipeline.zadd.call_args_list],
+        )
+
+    def test_update_mutuals_not_in_store(self, *_):
+        """the full count is used when there's no rank to increment"""
+        followed = models.User.objects.create_user(
+            "nutria@local.com",
+            "nutria@nutria.com",
+            "nutriaword",
+            local=True,
+            localname="nutria",
+            discoverable=True,
+        )
+        follower = models.User.objects.create_user(
+            "fish@local.com", "fish@fish.com", "fishword", local=True, localname="fish"
+        )
+        self.local_user.following.add(follower)
+        follower.following.add(followed)
+
+        with patch("bookwyrm.suggested_users.r") as redis_mock:
+            pipeline = redis_mock.pipeline.return_value
+            pipeline.execute.return_value = [None]
+            suggested_users.update_mutuals(follower, followed, 1)
+
+        self.assertEqual(pipeline.zadd.call_count, 2)
+        self.assertEqual(
+            pipeline.zadd.call_args.args,
+            (suggested_users.store_id(self.local_user), {followed.id: 1}),
+        )
+
+    def test_update_user_unchanged(self, *_):
+        """saving a user without touching discoverability doesn't rerank them"""
+        self.local_user.discoverable = True
+        with patch("bookwyrm.suggested_users.rerank_user_task.delay") as mock:
+            self.local_user.save(broadcast=False)
+        self.assertEqual(mock.call_count, 1)
+
+        self.local_user.name = "Mouse"
+        with patch("bookwyrm.suggested_users.rerank_user_task.delay") as mock:
+            self.local_user.save(broadcast=False)
+        self.assertFalse(mock.called)
+
+        # the change isn't saved unless the field is
+        self.local_user.discoverable = False
+        with patch("bookwyrm.suggested_users.remove_user_task.delay") as mock:
+            self.local_user.save(broadcast=False, update_fields=["name"])
+        self.assertFalse(mock.called)
+
+        with patch("bookwyrm.suggested_users.remove_user_task.delay") as mock:
+            self.local_user.save(broadcast=False, update_fields=["discoverable"])
+        self.assertEqual(mock.call_count, 1)
+
     def test_get_suggestions(self, *_):
         """load from store"""
         with patch("bookwyrm.suggested_users.SuggestedUsers.get_store") as mock:
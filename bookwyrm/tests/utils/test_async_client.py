@@ -0,0 +1,33 @@
+""" the shared event loop and session for outgoing requests """
+import asyncio
+
+from bookwyrm.utils.async_client import ClientPool
+
+
+async def get_session_and_loop(pool):
+    """what the pool gives a coroutine"""
+    return await pool.get_session(), asyncio.get_running_loop()
+
+
+def test_session_is_reused():
+    """every call runs on the same loop with the same session"""
+    pool = ClientPool(limit=2, limit_per_host=1, max_in_flight=2)
+    session, loop = pool.run(get_session_and_loop(pool))
+    assert pool.run(get_session_and_loop(pool)) == (session, loop)
+    assert loop is pool.loop
+    assert session.connector.limit == 2
+    assert session.connector.limit_per_host == 1
+
+
+def test_limited():
+    """in flight requests are capped"""
+    pool = ClientPool(max_in_flight=1)
+
+    async def run_two():
+        async def task():
+            await asyncio.sleep(0)
+            return pool.semaphore.locked()
+
+        return await asyncio.gather(pool.limited(task()), pool.limited(task()))
+
+    assert pool.run(run_two()) == [True, True]
@@ -0,0 +1,57 @@
+""" the pooled session for fetching remote data """
+from django.test import TestCase, override_settings
+import responses
+
+from bookwyrm.utils.http_client import HttpClient
+
+
+class HttpClientTest(TestCase):
+    """keep-alive sessions and conditional requests"""
+
+    def test_session_is_reused(self):
+        """each thread keeps using the same session"""
+        client = HttpClient(pool_maxsize=3, max_retries=1)
+        session = client.get_session()
+        self.assertIs(client.get_session(), session)
+
+        adapter = session.get_adapter("https://example.com")
+        self.assertEqual(adapter._pool_maxsize, 3)  # pylint: disable=protected-access
+        self.assertEqual(adapter.max_retries.total, 1)
+        self.assertEqual(adapter.max_retries.read, 0)
+        self.assertFalse(adapter.max_retries.respect_retry_after_header)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    @responses.activate
+    def test_get_conditional(self):
+        """a response that hasn't changed is used again"""
+        client = HttpClient()
+        responses.get(
+            "https://example.com/book/1",
+            json={"title": "Example"},
+            headers={"ETag": '"abc"'},
+        )
+        response = client.get_conditional("https://example.com/book/1")
+        self.assertEqual(response.json(), {"title": "Example"})
+        self.assertNotIn("If-None-Match", responses.calls[0].request.headers)
+
+        responses.replace(
+            responses.GET, "https://example.com/book/1", status=304, body=""
+        )
+        response = client.get_conditional("https://example.com/book/1")
+        self.assertEqual(responses.calls[1].request.headers["If-None-Match"], '"abc"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"title": "Example"})
+
+        # different parameters are a different response
+        responses.get("https://example.com/book/1?page=2", json={}, status=200)
+        client.get_conditional("https://example.com/book/1", params={"page": 2})
+        self.assertNotIn("If-None-Match", responses.calls[2].request.headers)
+
+        # and so are different content types
+        responses.get("https://example.com/book/1", json={}, status=200)
+        client.get_conditional(
+            "https://example.com/book/1", headers={"Accept": "application/ld+json"}
+        )
+        self.assertNotIn("If-None-Match", responses.calls[3].request.headers)
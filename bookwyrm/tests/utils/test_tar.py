@@ -1,4 +1,5 @@
 import os
+from tempfile import TemporaryFile
 import pytest
 from bookwyrm.utils.tar import BookwyrmTarFile
 
@@ -23,3 +24,11 @@ def write_tar():
 
 def test_write_bytes(write_tar):
     write_tar.write_bytes(b"ABCDEF")
+
+
+def test_write_file(write_tar):
+    with TemporaryFile() as json_file:
+        json_file.write(b'{"books": []}')
+        write_tar.write_file(json_file)
+    info = write_tar.getmember("archive.json")
+    assert info.size == 13
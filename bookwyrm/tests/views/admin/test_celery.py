@@ -49,3 +49,27 @@ class CeleryStatusViews(TestCase):
         self.assertIsInstance(result, TemplateResponse)
         validate_html(result.render())
         self.assertEqual(result.status_code, 200)
+
+    def test_celery_status_get_deliveries(self):
+        """show where broadcasts are spending their time"""
+        view = views.CeleryStatus.as_view()
+        request = self.factory.get("")
+        request.user = self.local_user
+
+        stats = [
+            {
+                "host": "slow.example",
+                "delivered": 10,
+                "failed": 2,
+                "seconds": 30.5,
+                "average": 2.54,
+            }
+        ]
+        with patch(
+            "bookwyrm.views.admin.celery_status.delivery_queue.get_stats"
+        ) as mock:
+            mock.return_value = stats
+            result = view(request)
+        self.assertIsInstance(result, TemplateResponse)
+        validate_html(result.render())
+        self.assertEqual(result.context_data["deliveries"], stats)
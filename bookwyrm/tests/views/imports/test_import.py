@@ -3,6 +3,7 @@ import datetime
 import pathlib
 from unittest.mock import patch
 
+from django.core.files.storage import InMemoryStorage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.template.response import TemplateResponse
 from django.test import TestCase
@@ -92,11 +93,19 @@ class ImportViews(TestCase):
         request = self.factory.post("", form.data)
         request.user = self.local_user
 
-        with patch("bookwyrm.models.import_job.ImportJob.start_job"):
+        # pylint: disable-next=protected-access
+        source_file = models.ImportJob._meta.get_field("source_file")
+        with (
+            patch("bookwyrm.models.import_job.ImportJob.start_job"),
+            patch.object(source_file, "storage", InMemoryStorage()),
+        ):
             view(request)
         job = models.ImportJob.objects.get()
         self.assertFalse(job.include_reviews)
         self.assertEqual(job.privacy, "public")
+        # the rows are read once the job starts
+        self.assertTrue(job.source_file.name.startswith("imports/"))
+        self.assertFalse(job.items.exists())
 
     def test_retry_item(self):
         """try again on a single row"""
@@ -8,6 +8,7 @@ from django.test.client import RequestFactory
 
 from bookwyrm import models
 from bookwyrm import views
+from bookwyrm.activitystreams import StreamPage
 from bookwyrm.tests.validate_html import validate_html
 
 
@@ -43,7 +44,10 @@ class LandingViews(TestCase):
         view = views.Home.as_view()
         request = self.factory.get("")
         request.user = self.local_user
-        with patch("bookwyrm.activitystreams.ActivityStream.get_activity_stream"):
+        with patch(
+            "bookwyrm.activitystreams.ActivityStream.get_activity_stream_page",
+            return_value=StreamPage([]),
+        ):
             result = view(request)
         self.assertEqual(result.status_code, 200)
         validate_html(result.render())
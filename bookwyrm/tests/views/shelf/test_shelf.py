@@ -248,6 +248,9 @@ class ShelfViews(TestCase):
             result.context_data["books"].object_list[0].title,
             shelf_book.book.title,
         )
+        self.assertEqual(
+            result.context_data["books"].object_list[0].preloaded_rating, 0
+        )
 
     def test_filter_shelf_none(self, *_):
         """display a message when no books match a filter keyword"""
@@ -9,10 +9,17 @@ from django.test.client import RequestFactory
 
 from bookwyrm import forms, models, views
 from bookwyrm.activitypub import ActivitypubResponse
+from bookwyrm.activitystreams import ActivityStream, StreamPage
 from bookwyrm.tests.validate_html import validate_html
 
+# the test class replaces this, but some tests need the real pages
+get_activity_stream_page = ActivityStream.get_activity_stream_page
 
-@patch("bookwyrm.activitystreams.ActivityStream.get_activity_stream")
+
+@patch(
+    "bookwyrm.activitystreams.ActivityStream.get_activity_stream_page",
+    return_value=StreamPage([]),
+)
 @patch("bookwyrm.activitystreams.add_status_task.delay")
 @patch("bookwyrm.suggested_users.rerank_suggestions_task.delay")
 @patch("bookwyrm.activitystreams.populate_stream_task.delay")
@@ -65,6 +72,60 @@ class FeedViews(TestCase):
         validate_html(result.render())
         self.assertEqual(result.status_code, 200)
 
+    @patch("bookwyrm.suggested_users.SuggestedUsers.get_suggestions")
+    def test_feed_cursor(self, *_):
+        """pass the pagination cursor through to the stream"""
+        view = views.Feed.as_view()
+        with patch("bookwyrm.models.activitypub_mixin.broadcast_task.apply_async"):
+            status = models.Status.objects.create(content="hi", user=self.local_user)
+        request = self.factory.get("", {"before": "1643328000.5-12"})
+        request.user = self.local_user
+        with patch(
+            "bookwyrm.activitystreams.ActivityStream.get_activity_stream_page"
+        ) as stream_mock:
+            stream_mock.return_value = StreamPage(
+                [status], has_next=True, next_cursor="1643327000.0-5"
+            )
+            result = view(request, "home")
+        self.assertEqual(stream_mock.call_args[1]["before"], (1643328000.5, 12))
+        self.assertIsNone(stream_mock.call_args[1]["after"])
+        html = result.render()
+        validate_html(html)
+        self.assertIn("before=1643327000.0-5", html.content.decode())
+        self.assertEqual(result.status_code, 200)
+
+    @patch("bookwyrm.suggested_users.SuggestedUsers.get_suggestions")
+    def test_feed_cursor_empty_page(self, *_):
+        """a page past the end of the feed doesn't link to a newer page"""
+        view = views.Feed.as_view()
+        request = self.factory.get("", {"before": "1643328000.5-12"})
+        request.user = self.local_user
+        with (
+            patch.object(
+                ActivityStream, "get_activity_stream_page", get_activity_stream_page
+            ),
+            patch("bookwyrm.activitystreams.r.set"),
+            patch("bookwyrm.activitystreams.r.delete"),
+            patch("bookwyrm.redis_store.r.zrangebyscore", return_value=[]),
+            patch("bookwyrm.redis_store.r.zrevrangebyscore", return_value=[]),
+        ):
+            result = view(request, "home")
+        validate_html(result.render())
+        page = result.context_data["activities"]
+        self.assertFalse(page.has_previous())
+        self.assertIsNone(page.previous_cursor)
+        self.assertEqual(result.status_code, 200)
+
+    def test_get_stream_cursor(self, *_):
+        """only real positions in a stream are used"""
+        self.assertEqual(views.feed.get_stream_cursor("1.5-3"), (1.5, 3))
+        self.assertEqual(views.feed.get_stream_cursor("1e-05-3"), (1e-05, 3))
+        self.assertIsNone(views.feed.get_stream_cursor(None))
+        self.assertIsNone(views.feed.get_stream_cursor("1.5"))
+        self.assertIsNone(views.feed.get_stream_cursor("nan-3"))
+        self.assertIsNone(views.feed.get_stream_cursor("inf-3"))
+        self.assertIsNone(views.feed.get_stream_cursor("1.5-x"))
+
     @patch("bookwyrm.suggested_users.SuggestedUsers.get_suggestions")
     def test_save_feed_settings(self, *_):
         """update display preferences"""
@@ -294,3 +294,54 @@ class NotificationViews(TestCase):
         result = view(request)
         self.assertEqual(result.status_code, 302)
         self.assertEqual(models.Notification.objects.count(), 1)
+
+    def test_notifications_page_pagination(self):
+        """notifications are paged, and only the ones shown are marked read"""
+        notifications = [
+            models.Notification.objects.create(
+                user=self.local_user, notification_type="FAVORITE"
+            )
+            for _ in range(3)
+        ]
+        view = views.Notifications.as_view()
+        with patch("bookwyrm.views.notifications.NOTIFICATIONS_PAGE_LENGTH", 2):
+            request = self.factory.get("")
+            request.user = self.local_user
+            result = view(request)
+            validate_html(result.render())
+            page = result.context_data["notifications"]
+            self.assertEqual(list(page), notifications[:0:-1])
+            self.assertTrue(page.has_next())
+            self.assertFalse(page.has_previous())
+            self.assertEqual(
+                result.context_data["unread"], [n.id for n in notifications[:0:-1]]
+            )
+            self.assertEqual(
+                models.Notification.objects.filter(read=False).get(),
+                notifications[0],
+            )
+
+            request = self.factory.get("", {"before": page.next_cursor})
+            request.user = self.local_user
+            result = view(request)
+            older = result.context_data["notifications"]
+            self.assertEqual(list(older), notifications[:1])
+            self.assertFalse(older.has_next())
+            self.assertTrue(older.has_previous())
+            self.assertFalse(models.Notification.objects.filter(read=False).exists())
+
+            request = self.factory.get("", {"after": older.previous_cursor})
+            request.user = self.local_user
+            result = view(request)
+            newer = result.context_data["notifications"]
+            self.assertEqual(list(newer), notifications[:0:-1])
+            self.assertFalse(newer.has_previous())
+
+    def test_notifications_page_bad_cursor(self):
+        """a cursor that isn't a real position just starts at the top"""
+        view = views.Notifications.as_view()
+        for cursor in ("99999999999999999999-1", "abc", "1-2-3"):
+            request = self.factory.get("", {"before": cursor})
+            request.user = self.local_user
+            result = view(request)
+            self.assertEqual(result.status_code, 200)
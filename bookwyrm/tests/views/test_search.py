@@ -99,6 +99,7 @@ class Views(TestCase):
 
         local_results = response.context_data["results"]
         self.assertEqual(local_results[0].title, "Test Book")
+        self.assertEqual(local_results[0].preloaded_rating, 0)
 
         connector_results = response.context_data["remote_results"]
         self.assertEqual(connector_results[0]["results"][0].title, "Mock Book")
@@ -0,0 +1,77 @@
+""" a long-lived event loop and http session for outgoing requests """
+import asyncio
+import os
+import threading
+from typing import Any, Coroutine, Optional
+
+import aiohttp
+
+from bookwyrm import settings
+
+
+class ClientPool:
+    """runs coroutines on an event loop in a background thread, sharing one
+    keep-alive aiohttp session, so each celery task doesn't pay for new
+    TCP and TLS handshakes to servers we talk to all the time"""
+
+    def __init__(
+        self,
+        limit: Optional[int] = None,
+        limit_per_host: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        timeout: Optional[int] = None,
+    ):
+        self.limit: int = limit or settings.BROADCAST_MAX_CONNECTIONS
+        self.limit_per_host: int = (
+            limit_per_host or settings.BROADCAST_MAX_HOST_CONNECTIONS
+        )
+        self.max_in_flight: int = max_in_flight or settings.BROADCAST_MAX_IN_FLIGHT
+        self.timeout: int = timeout or settings.BROADCAST_TIMEOUT
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """start the loop, once per process (celery forks its workers)"""
+        with self._lock:
+            if self.loop is None or self._pid != os.getpid():
+                self.loop = asyncio.new_event_loop()
+                self.session = None
+                threading.Thread(
+                    target=self.loop.run_forever, name="client-pool", daemon=True
+                ).start()
+                self._pid = os.getpid()
+            return self.loop
+
+    def run(self, coroutine: Coroutine[Any, Any, Any]) -> Any:
+        """run a coroutine on the pool's loop and wait for the result"""
+        loop = self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """the shared session, which must be used from the pool's loop"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=60,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self.session
+
+    async def limited(self, coroutine: Coroutine[Any, Any, Any]) -> Any:
+        """await a coroutine, waiting first if too many are already in flight"""
+        if self.semaphore is None:
+            await self.get_session()
+        async with self.semaphore:  # type: ignore[union-attr]
+            return await coroutine
+
+
+broadcast_pool = ClientPool()
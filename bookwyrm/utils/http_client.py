@@ -0,0 +1,118 @@
+""" a pooled http session for fetching remote data """
+import hashlib
+import os
+import threading
+from typing import Any, Optional
+
+from django.core.cache import cache
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from bookwyrm import settings
+
+# responses bigger than this aren't kept for conditional requests
+MAX_CACHED_SIZE = 1024 * 1024
+# request headers that change what the server sends back
+VARY_HEADERS = ("Accept", "Accept-Language")
+
+
+class HttpClient:
+    """a requests session for each thread, with keep-alive connections to the
+    servers we fetch books, authors, and actors from, so every fetch doesn't
+    pay for new TCP and TLS handshakes"""
+
+    def __init__(
+        self,
+        pool_connections: Optional[int] = None,
+        pool_maxsize: Optional[int] = None,
+        max_retries: Optional[int] = None,
+    ):
+        self.pool_connections: int = pool_connections or settings.HTTP_POOL_CONNECTIONS
+        self.pool_maxsize: int = pool_maxsize or settings.HTTP_POOL_MAXSIZE
+        self.max_retries: int = (
+            settings.HTTP_MAX_RETRIES if max_retries is None else max_retries
+        )
+        self.local = threading.local()
+
+    def get_session(self) -> requests.Session:
+        """the thread's session, made again in a new process (celery forks its
+        workers) so connections aren't shared between processes"""
+        session: Optional[requests.Session] = getattr(self.local, "session", None)
+        if session is None or self.local.pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=self.pool_connections,
+                pool_maxsize=self.pool_maxsize,
+                max_retries=Retry(
+                    total=self.max_retries,
+                    # a timed out read may have been slow to process, so
+                    # trying again straight away won't help
+                    read=0,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 502, 503, 504),
+                    allowed_methods=("GET",),
+                    raise_on_status=False,
+                    # a server can ask for any wait at all, which would tie up
+                    # the worker, so the backoff is used instead
+                    respect_retry_after_header=False,
+                ),
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self.local.session = session
+            self.local.pid = os.getpid()
+        return session
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        """a GET request using the pooled connections"""
+        return self.get_session().get(url, **kwargs)
+
+    def get_conditional(self, url: str, **kwargs: Any) -> requests.Response:
+        """a GET request that asks the server if the response has changed since
+        we last fetched it, and uses the response we kept if it hasn't"""
+        headers = dict(kwargs.pop("headers", None) or {})
+        full_url = str(
+            requests.Request("GET", url, params=kwargs.get("params")).prepare().url
+        )
+        # the same url can have different responses for different headers
+        request_key = "\n".join(
+            [full_url, *(str(headers.get(header, "")) for header in VARY_HEADERS)]
+        )
+        cache_key = f"http-response-{hashlib.sha256(request_key.encode()).hexdigest()}"
+        cached = cache.get(cache_key)
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = self.get(url, headers=headers, **kwargs)
+        if cached and response.status_code == 304:
+            response.status_code = 200
+            # pylint: disable=protected-access
+            response._content = cached["content"]
+            response.headers["Content-Type"] = cached["content_type"]
+            return response
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if (
+            response.status_code == 200
+            and (etag or last_modified)
+            and len(response.content) <= MAX_CACHED_SIZE
+        ):
+            cache.set(
+                cache_key,
+                {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "content": response.content,
+                    "content_type": response.headers.get("Content-Type", ""),
+                },
+                timeout=settings.HTTP_RESPONSE_CACHE_TIMEOUT,
+            )
+        return response
+
+
+http_client = HttpClient()
@@ -2,7 +2,7 @@
 import io
 import os
 import tarfile
-from typing import Any, Optional
+from typing import IO, Any, Optional
 from uuid import uuid4
 from django.core.files import File
 
@@ -12,10 +12,15 @@ class BookwyrmTarFile(tarfile.TarFile):
 
     def write_bytes(self, data: bytes) -> None:
         """Add a file containing bytes to the archive"""
-        buffer = io.BytesIO(data)
-        info = tarfile.TarInfo("archive.json")
-        info.size = len(data)
-        self.addfile(info, fileobj=buffer)
+        self.write_file(io.BytesIO(data))
+
+    def write_file(self, file: IO[bytes], filename: str = "archive.json") -> None:
+        """Add the contents of an open file to the archive, copying it across
+        in chunks rather than reading it all into memory"""
+        info = tarfile.TarInfo(filename)
+        info.size = file.seek(0, os.SEEK_END)
+        file.seek(0)
+        self.addfile(info, fileobj=file)
 
     def add_image(
         self, image: Any, filename: Optional[str] = None, directory: str = ""
@@ -11,6 +11,7 @@ from django import forms
 import redis
 
 from celerywyrm import settings
+from bookwyrm.deliveries import delivery_queue
 from bookwyrm.tasks import (
     app as celery,
     LOW,
@@ -74,12 +75,20 @@ class CeleryStatus(View):
             queues = None
             errors.append(err)
 
+        try:
+            deliveries = delivery_queue.get_stats()
+        # pylint: disable=broad-except
+        except Exception as err:
+            deliveries = None
+            errors.append(err)
+
         form = ClearCeleryForm()
 
         data = {
             "stats": stats,
             "active_tasks": active_tasks,
             "queues": queues,
+            "deliveries": deliveries,
             "form": form,
             "errors": errors,
         }
@@ -7,6 +7,8 @@ from django.utils.decorators import method_decorator
 from django.views import View
 
 from bookwyrm import activitystreams
+from bookwyrm.templatetags.interaction import preload_interactions
+from bookwyrm.templatetags.rating_tags import preload_ratings
 
 
 # pylint: disable= no-self-use
@@ -48,8 +50,12 @@ class Discover(View):
         )
 
         page = request.GET.get("page")
+        large_activities = large_activities.get_page(page)
+        small_activities = small_activities.get_page(page)
+        preload_interactions(request.user, [*large_activities, *small_activities])
+        preload_ratings([getattr(status, "book", None) for status in large_activities])
         data = {
-            "large_activities": large_activities.get_page(page),
-            "small_activities": small_activities.get_page(page),
+            "large_activities": large_activities,
+            "small_activities": small_activities,
         }
         return TemplateResponse(request, "discover/discover.html", data)
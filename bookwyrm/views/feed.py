@@ -1,5 +1,6 @@
 """ non-interactive pages """
 from datetime import date
+import math
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.db.models import Q
@@ -16,7 +17,9 @@ from bookwyrm.models.user import FeedFilterChoices
 from bookwyrm.activitypub import ActivitypubResponse
 from bookwyrm.settings import PAGE_LENGTH, STREAMS
 from bookwyrm.suggested_users import suggested_users
-from .helpers import filter_stream_by_status_type, get_user_from_username
+from bookwyrm.templatetags.interaction import preload_interactions
+from bookwyrm.templatetags.rating_tags import preload_ratings
+from .helpers import get_user_from_username
 from .helpers import is_api_request, is_bookwyrm_request, maybe_redirect_local_path
 from .annual_summary import get_annual_summary_year
 
@@ -43,14 +46,15 @@ class Feed(View):
         tab = [s for s in STREAMS if s["key"] == tab]
         tab = tab[0] if tab else STREAMS[0]
 
-        activities = activitystreams.streams[tab["key"]].get_activity_stream(
-            request.user
-        )
-        filtered_activities = filter_stream_by_status_type(
-            activities,
+        activities = activitystreams.streams[tab["key"]].get_activity_stream_page(
+            request.user,
+            before=get_stream_cursor(request.GET.get("before")),
+            after=get_stream_cursor(request.GET.get("after")),
+            page_length=PAGE_LENGTH,
             allowed_types=request.user.feed_status_types,
         )
-        paginated = Paginator(filtered_activities, PAGE_LENGTH)
+        preload_interactions(request.user, activities)
+        preload_ratings([getattr(status, "book", None) for status in activities])
 
         suggestions = suggested_users.get_suggestions(request.user)
 
@@ -71,7 +75,7 @@ class Feed(View):
             **feed_page_data(request.user),
             **{
                 "user": request.user,
-                "activities": paginated.get_page(request.GET.get("page")),
+                "activities": activities,
                 "suggested_users": suggestions,
                 "tab": tab,
                 "streams": STREAMS,
@@ -114,13 +118,16 @@ class DirectMessage(View):
         if user:
             activities = activities.filter(Q(user=user) | Q(mention_users=user))
 
-        paginated = Paginator(activities, PAGE_LENGTH)
+        activities = Paginator(activities, PAGE_LENGTH).get_page(
+            request.GET.get("page")
+        )
+        preload_interactions(request.user, activities)
         data = {
             **feed_page_data(request.user),
             **{
                 "user": request.user,
                 "partner": user,
-                "activities": paginated.get_page(request.GET.get("page")),
+                "activities": activities,
                 "path": "/direct-messages",
             },
         }
@@ -201,6 +208,10 @@ class Status(View):
         """,
             params=[status.id, visible_thread, visible_thread],
         )
+        # raw querysets aren't cached, so only run each query once
+        ancestors = list(ancestors)
+        children = list(children)
+        preload_interactions(request.user, [status, *ancestors, *children])
 
         data = {
             **feed_page_data(request.user),
@@ -248,6 +259,20 @@ def feed_page_data(user):
     }
 
 
+def get_stream_cursor(value):
+    """parse a feed pagination cursor (a published timestamp and a status id)
+    from the url"""
+    try:
+        score, status_id = value.rsplit("-", 1)
+        score, status_id = float(score), int(status_id)
+    except (AttributeError, ValueError):
+        return None
+    # nan and inf aren't scores redis can page by
+    if not math.isfinite(score):
+        return None
+    return score, status_id
+
+
 def get_suggested_books(user, max_books=5):
     """helper to get a user's recent books"""
     book_count = 0
@@ -1,10 +1,9 @@
 """ import books from another app """
-from io import TextIOWrapper
 import datetime
 from typing import Optional
 
 from django.contrib.auth.decorators import login_required
-from django.db.models import Avg, ExpressionWrapper, F, fields
+from django.db.models import Avg, ExpressionWrapper, F, Sum, fields
 from django.core.exceptions import PermissionDenied
 from django.core.paginator import Paginator
 from django.http import HttpResponseBadRequest
@@ -63,8 +62,9 @@ class Import(View):
         import_jobs = models.ImportJob.objects.filter(
             user=request.user, created_date__gte=time_range
         )
-        # pylint: disable=consider-using-generator
-        imported_books = sum([job.successful_item_count for job in import_jobs])
+        imported_books = (
+            import_jobs.aggregate(total=Sum("items_succeeded"))["total"] or 0
+        )
         data["import_size_limit"] = site_settings.import_size_limit
         data["import_limit_reset"] = site_settings.import_limit_reset
         data["allowed_imports"] = site_settings.import_size_limit - imported_books
@@ -106,9 +106,9 @@ class Import(View):
             importer = GoodreadsImporter()
 
         try:
-            job = importer.create_job(
+            job = importer.upload_job(
                 request.user,
-                TextIOWrapper(request.FILES["csv_file"], encoding=importer.encoding),
+                request.FILES["csv_file"],
                 include_reviews,
                 privacy,
                 create_shelves,
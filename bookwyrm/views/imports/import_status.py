@@ -26,7 +26,7 @@ class ImportStatus(View):
             raise PermissionDenied()
 
         items = job.items.order_by("index")
-        item_count = items.count() or 1
+        item_count = job.item_count or 1
 
         paginated = Paginator(items, PAGE_LENGTH)
         page = paginated.get_page(request.GET.get("page"))
@@ -36,7 +36,6 @@ class ImportStatus(View):
         fail_count = items.filter(
             fail_reason__isnull=False, book_guess__isnull=True
         ).count()
-        pending_item_count = job.pending_item_count
         data = {
             "job": job,
             "items": page,
@@ -47,7 +46,7 @@ class ImportStatus(View):
             ),
             "show_progress": True,
             "item_count": item_count,
-            "complete_count": item_count - pending_item_count,
+            "complete_count": item_count - job.pending_item_count,
             "percent": job.percent_complete,
             # hours since last import item update
             "inactive_time": (job.updated_date - timezone.now()).seconds / 60 / 60,
@@ -147,7 +147,9 @@ def has_valid_signature(request, activity):
                 raise ValueError("Wrong actor created signature.")
 
         try:
-            signature.verify(remote_user.key_pair.public_key, request)
+            signature.verify(
+                remote_user.key_pair.public_key, request, remote_user.key_pair.id
+            )
         except ValueError:
             old_key = remote_user.key_pair.public_key
             remote_user = activitypub.resolve_remote_id(
@@ -155,7 +157,9 @@ def has_valid_signature(request, activity):
             )
             if remote_user.key_pair.public_key == old_key:
                 raise  # Key unchanged.
-            signature.verify(remote_user.key_pair.public_key, request)
+            signature.verify(
+                remote_user.key_pair.public_key, request, remote_user.key_pair.id
+            )
     except (ValueError, requests.exceptions.HTTPError):
         return False
     return True
@@ -10,6 +10,7 @@ from django.views.decorators.clickjacking import xframe_options_exempt
 
 from bookwyrm import models
 from bookwyrm.settings import PAGE_LENGTH
+from bookwyrm.templatetags.rating_tags import preload_ratings
 
 
 # pylint: disable=no-self-use
@@ -56,6 +57,7 @@ class EmbedList(View):
         paginated = Paginator(items, PAGE_LENGTH)
 
         page = paginated.get_page(request.GET.get("page"))
+        preload_ratings([item.book for item in page])
 
         data = {
             "list": book_list,
@@ -19,6 +19,7 @@ from django.views.decorators.vary import vary_on_headers
 from bookwyrm import book_search, forms, models
 from bookwyrm.activitypub import ActivitypubResponse
 from bookwyrm.settings import PAGE_LENGTH
+from bookwyrm.templatetags.rating_tags import preload_ratings
 from bookwyrm.views.helpers import (
     is_api_request,
     maybe_redirect_local_path,
@@ -53,6 +54,7 @@ class List(View):
         paginated = Paginator(items, PAGE_LENGTH)
 
         page = paginated.get_page(request.GET.get("page"))
+        preload_ratings([item.book for item in page])
 
         embed_key = str(book_list.embed_key.hex)
         embed_url = reverse("embed-list", args=[book_list.id, embed_key])
@@ -8,6 +8,7 @@ from django.views import View
 
 from bookwyrm import forms, models
 from bookwyrm.lists_stream import ListsStream
+from bookwyrm.templatetags.interaction import preload_interactions
 from bookwyrm.views.helpers import get_user_from_username
 
 import logging
@@ -24,9 +25,10 @@ class Lists(View):
             lists = ListsStream().get_list_stream(request.user)
         else:
             lists = models.List.objects.filter(privacy="public")
-        paginated = Paginator(lists, 12)
+        lists = Paginator(lists, 12).get_page(request.GET.get("page"))
+        preload_interactions(request.user, book_lists=lists)
         data = {
-            "lists": paginated.get_page(request.GET.get("page")),
+            "lists": lists,
             "list_form": forms.ListForm(),
             "path": "/list",
         }
@@ -58,9 +60,10 @@ class SavedLists(View):
         # hide lists with no approved books
         lists = request.user.saved_lists.order_by("-updated_date")
 
-        paginated = Paginator(lists, 12)
+        lists = Paginator(lists, 12).get_page(request.GET.get("page"))
+        preload_interactions(request.user, book_lists=lists)
         data = {
-            "lists": paginated.get_page(request.GET.get("page")),
+            "lists": lists,
             "list_form": forms.ListForm(),
             "path": "/list/saved",
         }
@@ -75,12 +78,13 @@ class UserLists(View):
 
         user = get_user_from_username(request.user, username)
         lists = models.List.privacy_filter(request.user).filter(user=user)
-        paginated = Paginator(lists, 12)
+        lists = Paginator(lists, 12).get_page(request.GET.get("page"))
+        preload_interactions(request.user, book_lists=lists)
 
         data = {
             "user": user,
             "is_self": request.user.id == user.id,
-            "lists": paginated.get_page(request.GET.get("page")),
+            "lists": lists,
             "list_form": forms.ListForm(),
             "path": user.local_path + "/lists",
         }
@@ -1,10 +1,19 @@
 """ non-interactive pages """
+from datetime import datetime, timedelta, timezone
+
 from django.contrib.auth.decorators import login_required
+from django.db.models import Q
 from django.template.response import TemplateResponse
 from django.utils.decorators import method_decorator
 from django.shortcuts import redirect
 from django.views import View
 
+from bookwyrm import models
+from bookwyrm.activitystreams import StreamPage
+
+NOTIFICATIONS_PAGE_LENGTH = 50
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
 
 # pylint: disable= no-self-use
 @method_decorator(login_required, name="dispatch")
@@ -13,34 +22,86 @@ class Notifications(View):
 
     def get(self, request, notification_type=None):
         """people are interacting with you, get hyped"""
-        notifications = (
-            request.user.notification_set.all()
-            .order_by("-updated_date")
-            .select_related(
-                "related_status",
-                "related_status__reply_parent",
-                "related_group",
-                "related_import",
-            )
-            .prefetch_related(
-                "related_reports",
-                "related_users",
-                "related_list_items",
-            )
+        notifications = request.user.notification_set.select_related(
+            "related_status",
+            "related_status__reply_parent",
+            "related_group",
+            "related_import",
+        ).prefetch_related(
+            "related_reports",
+            "related_users",
+            "related_list_items",
         )
         if notification_type == "mentions":
             notifications = notifications.filter(
                 notification_type__in=["REPLY", "MENTION", "TAG"]
             )
-        unread = [n.id for n in notifications.filter(read=False)[:50]]
+
+        page = get_notifications_page(
+            notifications,
+            before=get_notification_cursor(request.GET.get("before")),
+            after=get_notification_cursor(request.GET.get("after")),
+        )
         data = {
-            "notifications": notifications[:50],
-            "unread": unread,
+            "notifications": page,
+            "unread": [n.id for n in page if not n.read],
+            "path": request.path,
         }
-        notifications.update(read=True)
+        # only what's on the page has been seen
+        models.Notification.mark_read(page)
         return TemplateResponse(request, "notifications/notifications_page.html", data)
 
     def post(self, request):
         """permanently delete notification for user"""
         request.user.notification_set.filter(read=True).delete()
         return redirect("notifications")
+
+
+def get_notifications_page(notifications, before=None, after=None):
+    """a page of notifications older than `before` or newer than `after`, using
+    the (updated date, id) of the notifications on either end as the cursors"""
+    page_length = NOTIFICATIONS_PAGE_LENGTH
+    if after is not None:
+        updated_date, notification_id = after
+        window = notifications.filter(
+            Q(updated_date__gt=updated_date)
+            | Q(updated_date=updated_date, id__gt=notification_id)
+        ).order_by("updated_date", "id")
+    else:
+        window = notifications.order_by("-updated_date", "-id")
+        if before is not None:
+            updated_date, notification_id = before
+            window = window.filter(
+                Q(updated_date__lt=updated_date)
+                | Q(updated_date=updated_date, id__lt=notification_id)
+            )
+
+    # read one extra so we know if there's another page
+    page = list(window[: page_length + 1])
+    has_more = len(page) > page_length
+    page = page[:page_length]
+    if after is not None:
+        page.reverse()
+
+    return StreamPage(
+        page,
+        has_next=has_more if after is None else bool(page),
+        has_previous=before is not None if after is None else has_more,
+        next_cursor=format_notification_cursor(page[-1]) if page else None,
+        previous_cursor=format_notification_cursor(page[0]) if page else None,
+    )
+
+
+def format_notification_cursor(notification):
+    """the notification's position, as exact microseconds and the id"""
+    timestamp = (notification.updated_date - EPOCH) // timedelta(microseconds=1)
+    return f"{timestamp}-{notification.id}"
+
+
+def get_notification_cursor(value):
+    """parse a notifications pagination cursor from the url"""
+    try:
+        timestamp, notification_id = (int(part) for part in value.split("-"))
+        return EPOCH + timedelta(microseconds=timestamp), notification_id
+    except (AttributeError, ValueError, OverflowError):
+        return None
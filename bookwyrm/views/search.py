@@ -17,6 +17,7 @@ from bookwyrm import models
 from bookwyrm.connectors import connector_manager
 from bookwyrm.book_search import search, format_search_result
 from bookwyrm.settings import PAGE_LENGTH, INSTANCE_ACTOR_USERNAME
+from bookwyrm.templatetags.rating_tags import preload_ratings
 from bookwyrm.utils import regex
 from .helpers import is_api_request
 from .helpers import handle_remote_webfinger
@@ -77,6 +78,7 @@ def book_search(request):
     local_results = search(query, min_confidence=min_confidence)
     paginated = Paginator(local_results, PAGE_LENGTH)
     page = paginated.get_page(request.GET.get("page"))
+    preload_ratings(page.object_list)
     data = {
         "query": query,
         "results": page,
@@ -87,7 +89,7 @@ def book_search(request):
         ),
     }
     # if a logged in user requested remote results or got no local results, try remote
-    if request.user.is_authenticated and (not local_results or search_remote):
+    if request.user.is_authenticated and (not paginated.count or search_remote):
         data["remote_results"] = connector_manager.search(
             query, min_confidence=min_confidence
         )
@@ -15,6 +15,7 @@ from django.views.decorators.vary import vary_on_headers
 from bookwyrm import forms, models
 from bookwyrm.activitypub import ActivitypubResponse
 from bookwyrm.settings import PAGE_LENGTH
+from bookwyrm.templatetags.rating_tags import preload_ratings
 from bookwyrm.views.helpers import is_api_request, get_user_from_username
 from bookwyrm.book_search import search
 
@@ -102,6 +103,7 @@ class Shelf(View):
             PAGE_LENGTH,
         )
         page = paginated.get_page(request.GET.get("page"))
+        preload_ratings(page.object_list)
         data = {
             "user": user,
             "is_self": is_self,
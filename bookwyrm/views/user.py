@@ -13,6 +13,7 @@ from django.views.decorators.vary import vary_on_headers
 from bookwyrm import models
 from bookwyrm.activitypub import ActivitypubResponse
 from bookwyrm.settings import PAGE_LENGTH, INSTANCE_ACTOR_USERNAME
+from bookwyrm.templatetags.interaction import preload_interactions
 from .helpers import get_user_from_username, is_api_request
 
 
@@ -90,7 +91,10 @@ class User(View):
             )
         )
 
-        paginated = Paginator(activities, PAGE_LENGTH)
+        activities = Paginator(activities, PAGE_LENGTH).get_page(
+            request.GET.get("page", 1)
+        )
+        preload_interactions(request.user, activities)
         goal = models.AnnualGoal.objects.filter(
             user=user, year=timezone.now().year
         ).first()
@@ -105,7 +109,7 @@ class User(View):
             "is_self": is_self,
             "shelves": shelf_preview,
             "shelf_count": shelves.count(),
-            "activities": paginated.get_page(request.GET.get("page", 1)),
+            "activities": activities,
             "goal": goal,
         }
 
@@ -145,12 +149,15 @@ class UserReviewsComments(View):
             )
         )
 
-        paginated = Paginator(activities, PAGE_LENGTH)
+        activities = Paginator(activities, PAGE_LENGTH).get_page(
+            request.GET.get("page", 1)
+        )
+        preload_interactions(request.user, activities)
 
         data = {
             "user": user,
             "is_self": is_self,
-            "activities": paginated.get_page(request.GET.get("page", 1)),
+            "activities": activities,
         }
         return TemplateResponse(request, "user/reviews_comments.html", data)
 